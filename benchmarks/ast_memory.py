@@ -0,0 +1,73 @@
+"""Memory held by the AST of a large generated SlayScript program.
+
+Generates a synthetic script of about 100,000 lines (spells with loops,
+branches, tomes and calls), parses it and reports the memory the parsed
+Program keeps alive, as measured by tracemalloc, and per AST node.
+
+    python benchmarks/ast_memory.py [LINES]
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import fields
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slayscript.ast_nodes import ASTNode  # noqa: E402
+from slayscript.lexer import Lexer  # noqa: E402
+from slayscript.parser import Parser  # noqa: E402
+
+BLOCK = '''spell step_{n}(a, b) {{
+    conjure total as a + b * {n}
+    conjure seen as tome [a, b, {n}]
+    patrol until total exceeds 100 {{
+        transmute total as total + 7
+    }}
+    prophecy reveals total exceeds {n} {{
+        scribe_line("step {n}: " + transform_to_scroll(total))
+    }}
+    cast total - a
+}}
+conjure result_{n} as step_{n}({n}, 2)
+'''
+
+
+def generate(lines: int) -> str:
+    block_lines = BLOCK.count("\n")
+    return "".join(BLOCK.format(n=n) for n in range(max(1, lines // block_lines)))
+
+
+def count_nodes(node) -> int:
+    count, stack = 0, [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, ASTNode):
+            count += 1
+            stack.extend(getattr(value, item.name) for item in fields(value))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return count
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    source = generate(lines)
+    tokens = Lexer(source).tokenize()
+
+    gc.collect()
+    tracemalloc.start()
+    program = Parser(tokens).parse()
+    del tokens
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    nodes = count_nodes(program)
+    print(f"{source.count(chr(10))} lines, {nodes} nodes")
+    print(f"AST: {size / 2 ** 20:.1f} MiB, {size / nodes:.1f} bytes per node")
+
+
+if __name__ == "__main__":
+    main()
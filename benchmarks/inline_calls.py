@@ -0,0 +1,77 @@
+"""Calls per second to small spells, with and without inlining.
+
+A 50,000-iteration patrol loop calls square, area and sumsq (which calls
+square twice): 250,000 spell calls. Each engine runs it with --optimize,
+once with --inline-size 0 and once with the default, and the time of the
+same loop without the calls is subtracted. Best of 3, parsing excluded.
+
+    python benchmarks/inline_calls.py [ITERATIONS]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slayscript.builtins import register_builtins  # noqa: E402
+from slayscript.interpreter import Interpreter  # noqa: E402
+from slayscript.lexer import Lexer  # noqa: E402
+from slayscript.optimizer import DEFAULT_INLINE_SIZE  # noqa: E402
+from slayscript.parser import Parser  # noqa: E402
+
+SPELLS = '''spell square(x) {
+    cast x * x
+}
+spell area(w, h) {
+    cast w * h
+}
+spell sumsq(a, b) {
+    cast square(a) + square(b)
+}
+'''
+
+LOOP = '''conjure i as 0
+conjure total as 0
+patrol until i atleast {iterations} {{
+    transmute total as total + {body}
+    transmute i as i + 1
+}}
+total
+'''
+
+CALLS = "square(i) + area(i, 3) + sumsq(i, 2)"
+CALLS_PER_ITERATION = 5
+NO_CALLS = "i + i + i"
+
+ENGINES = ("tree", "compiled", "vm")
+
+
+def best_time(source: str, engine: str, inline_size: int, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        program = Parser(Lexer(source).tokenize()).parse()
+        interpreter = Interpreter(mode=engine, optimize=True, inline_size=inline_size)
+        register_builtins(interpreter.globals)
+        start = time.perf_counter()
+        interpreter.interpret(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    calls = SPELLS + LOOP.format(iterations=iterations, body=CALLS)
+    overhead = SPELLS + LOOP.format(iterations=iterations, body=NO_CALLS)
+    count = iterations * CALLS_PER_ITERATION
+    for engine in ENGINES:
+        rates = []
+        for inline_size in (0, DEFAULT_INLINE_SIZE):
+            elapsed = best_time(calls, engine, inline_size) - best_time(overhead, engine, inline_size)
+            rates.append(count / elapsed)
+        print(f"{engine:9} {count} calls: {rates[0] / 1000:.0f}k/s -> {rates[1] / 1000:.0f}k/s inlined")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Recursive spells on the tree engine, where every cast, break and continue
+used to raise an exception.
+
+fib has a cast in each prophecy branch and a non-tail recursive cast;
+count_down recurses once per level and leaves a hunt loop early with a
+cast on the way back. Best of 7, parsing excluded.
+
+    python benchmarks/recursion.py [ROOT]
+
+ROOT is the SlayScript checkout to measure (default: this one), so the
+same script times a checkout from before the change.
+"""
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else os.path.join(HERE, ".."))
+
+from slayscript.builtins import register_builtins  # noqa: E402
+from slayscript.interpreter import Interpreter  # noqa: E402
+from slayscript.lexer import Lexer  # noqa: E402
+from slayscript.parser import Parser  # noqa: E402
+
+FIB = '''spell fib(n) {
+    prophecy reveals n under 2 {
+        cast n
+    }
+    cast fib(n - 1) + fib(n - 2)
+}
+fib(22)
+'''
+
+COUNT_DOWN = '''spell first_over(items, limit) {
+    hunt each item in items {
+        prophecy reveals item exceeds limit {
+            cast item
+        }
+    }
+    cast void
+}
+spell count_down(n) {
+    prophecy reveals n is 0 {
+        cast 0
+    }
+    conjure found as first_over(tome [1, 5, 9, 13], 4)
+    cast count_down(n - 1) + found - 4
+}
+conjure total as 0
+conjure round as 0
+patrol until round atleast 50 {
+    transmute total as total + count_down(400)
+    transmute round as round + 1
+}
+total
+'''
+
+
+def best_time(source: str, repeat: int = 7):
+    best, result = None, None
+    for _ in range(repeat):
+        program = Parser(Lexer(source).tokenize()).parse()
+        interpreter = Interpreter()
+        register_builtins(interpreter.globals)
+        start = time.perf_counter()
+        result = interpreter.interpret(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20_000))
+    for name, source in (("fib(22)", FIB), ("count_down", COUNT_DOWN)):
+        elapsed, result = best_time(source)
+        print(f"{name:11} {elapsed:.2f}s  (result {result})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Memory held by block scopes, measured with tracemalloc.
+
+First, 100,000 live scopes holding one local each, built directly as the
+Environment every scope used to be and as the slot Frame block and spell
+scopes use now. Then a tree-engine hunt loop whose body declares a spell,
+so a closure keeps every iteration's scope alive, reporting the bytes
+still allocated per iteration when the loop ends.
+
+    python benchmarks/scope_memory.py [ITERATIONS] [ROOT]
+
+ROOT is the SlayScript checkout to measure (default: this one). Pointing
+it at a checkout from before slot frames measures the loop the old way;
+the first part needs Frame and is skipped there.
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else os.path.join(HERE, ".."))
+
+from slayscript.builtins import register_builtins  # noqa: E402
+from slayscript.environment import Environment  # noqa: E402
+from slayscript.interpreter import Interpreter  # noqa: E402
+from slayscript.lexer import Lexer  # noqa: E402
+from slayscript.parser import Parser  # noqa: E402
+
+try:
+    from slayscript.environment import Frame  # noqa: E402
+except ImportError:
+    Frame = None
+
+SCOPES = 100_000
+
+LOOP = '''conjure keep as tome []
+hunt each i in range({iterations}) {{
+    conjure x as i
+    spell hold() {{
+        cast x
+    }}
+    append(keep, hold)
+}}
+'''
+
+
+def traced(build):
+    """Bytes and allocations still held by what build() returns."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+    del kept
+    return size, count
+
+
+# Values and parent are allocated up front so only the scopes are counted
+VALUES = list(range(SCOPES))
+PARENT = Environment()
+
+
+def environments():
+    scopes = [None] * SCOPES
+    for i, value in enumerate(VALUES):
+        scope = Environment(PARENT)
+        scope.define("x", value)
+        scopes[i] = scope
+    return scopes
+
+
+def frames():
+    scopes = [None] * SCOPES
+    for i, value in enumerate(VALUES):
+        scope = Frame(PARENT, 1)
+        scope.slots[0] = value
+        scopes[i] = scope
+    return scopes
+
+
+def loop_memory(iterations: int) -> int:
+    program = Parser(Lexer(LOOP.format(iterations=iterations)).tokenize()).parse()
+    interpreter = Interpreter()
+    register_builtins(interpreter.globals)
+
+    def run():
+        interpreter.interpret(program)
+        return interpreter
+
+    return traced(run)[0]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    if Frame is not None:
+        for name, build in (("Environment", environments), ("Frame", frames)):
+            size, count = traced(build)
+            # The list holding the scopes is not part of a scope
+            size -= sys.getsizeof([None] * SCOPES)
+            count -= 1
+            print(f"{name:12} {size / SCOPES:6.0f} B and {count / SCOPES:.1f} allocations per scope")
+
+    empty = loop_memory(0)
+    full = loop_memory(iterations)
+    print(f"hunt loop, {iterations} iterations kept alive by closures: "
+          f"{(full - empty) / iterations:.0f} B per iteration")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Guard-heavy filter over a large tome, with and without short-circuiting.
+
+Counts the entries of a 200,000-rune tome that pass
+`x exceeds 150000 and x % 7 is 0 and type_of(x) is "rune"` on every
+engine. The same filter is then run with all three conditions evaluated
+up front, as every `and` did before it short-circuited, to show what
+skipping the right operands saves. Best of 3, parsing excluded.
+
+    python benchmarks/short_circuit.py [SIZE]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from slayscript.builtins import register_builtins  # noqa: E402
+from slayscript.interpreter import Interpreter  # noqa: E402
+from slayscript.lexer import Lexer  # noqa: E402
+from slayscript.parser import Parser  # noqa: E402
+
+GUARDED = '''conjure items as range({size})
+conjure kept as 0
+hunt each x in items {{
+    prophecy reveals x exceeds {threshold} and x % 7 is 0 and type_of(x) is "rune" {{
+        transmute kept as kept + 1
+    }}
+}}
+kept
+'''
+
+EAGER = '''conjure items as range({size})
+conjure kept as 0
+hunt each x in items {{
+    conjure big as x exceeds {threshold}
+    conjure seventh as x % 7 is 0
+    conjure whole as type_of(x) is "rune"
+    prophecy reveals big and seventh and whole {{
+        transmute kept as kept + 1
+    }}
+}}
+kept
+'''
+
+ENGINES = ("tree", "compiled", "vm")
+
+
+def best_time(source: str, engine: str, repeat: int = 3):
+    best, result = None, None
+    for _ in range(repeat):
+        program = Parser(Lexer(source).tokenize()).parse()
+        interpreter = Interpreter(mode=engine)
+        register_builtins(interpreter.globals)
+        start = time.perf_counter()
+        result = interpreter.interpret(program)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    values = {"size": size, "threshold": size * 3 // 4}
+    for engine in ENGINES:
+        guarded, kept = best_time(GUARDED.format(**values), engine)
+        eager, _ = best_time(EAGER.format(**values), engine)
+        print(f"{engine:9} short-circuit {guarded:.2f}s  all conditions {eager:.2f}s  ({kept} kept)")
+
+
+if __name__ == "__main__":
+    main()
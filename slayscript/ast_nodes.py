@@ -1,10 +1,28 @@
 """AST node definitions for SlayScript."""
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Any, Optional
 
 
-@dataclass
+def _slotted(cls):
+    """@dataclass, then rebuild cls with __slots__ for the fields it adds.
+
+    Nodes keep their fields in slots instead of a per-instance __dict__,
+    about a third less memory each. (dataclass(slots=True) does the same
+    but needs Python 3.10.) Code walking nodes generically uses
+    dataclasses.fields().
+    """
+    cls = dataclass(cls)
+    inherited = {name for base in cls.__mro__[1:] for name in getattr(base, "__slots__", ())}
+    names = tuple(item.name for item in fields(cls) if item.name not in inherited)
+    namespace = dict(cls.__dict__)
+    for name in names + ("__dict__", "__weakref__"):
+        namespace.pop(name, None)  # Class level defaults would shadow the slots
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+@_slotted
 class ASTNode:
     """Base class for all AST nodes."""
     line: int = 0
@@ -13,91 +31,149 @@ class ASTNode:
 
 # ============ Expressions ============
 
-@dataclass
+@_slotted
 class Literal(ASTNode):
     """Literal value (int, float, string, bool, void)."""
     value: Any = None
 
 
-@dataclass
+@_slotted
 class Identifier(ASTNode):
     """Variable reference."""
     name: str = ""
+    # Filled in by the Resolver: scopes to walk up (-1 = global), slot index,
+    # and (depth, slot) of shadowed outer bindings to try if the slot is empty
+    depth: int = -1
+    slot: int = 0
+    fallbacks: tuple = ()
 
 
-@dataclass
+@_slotted
 class BinaryOp(ASTNode):
     """Binary operation (arithmetic, comparison, logical)."""
     left: ASTNode = None
     operator: str = ""
     right: ASTNode = None
+    typed: bool = False  # Both operands are statically runes or potions, set by TypeInference
+    # Tree interpreter inline cache: (left type, right type, operation) once
+    # both operands were plain numbers, None until then or after a type change
+    spec: tuple = None
+
+
+@_slotted
+class LogicalOp(ASTNode):
+    """Short-circuit logic: left and/or right, evaluating right only if needed."""
+    left: ASTNode = None
+    operator: str = ""  # "and" or "or"
+    right: ASTNode = None
 
 
-@dataclass
+@_slotted
 class UnaryOp(ASTNode):
     """Unary operation (not, negation)."""
     operator: str = ""
     operand: ASTNode = None
 
 
-@dataclass
+@_slotted
 class TomeExpr(ASTNode):
     """List literal: tome [1, 2, 3]."""
     elements: list = field(default_factory=list)
 
 
-@dataclass
+@_slotted
 class GrimoireExpr(ASTNode):
     """Dict literal: grimoire {"key": "value"}."""
     pairs: list = field(default_factory=list)  # List of (key, value) tuples
 
 
-@dataclass
+@_slotted
 class IndexExpr(ASTNode):
     """Index access: collection[index]."""
     collection: ASTNode = None
     index: ASTNode = None
 
 
-@dataclass
+@_slotted
 class CallExpr(ASTNode):
     """Function call: funcname(args)."""
     callee: ASTNode = None
     arguments: list = field(default_factory=list)
+    # Tree interpreter inline cache for a global callee:
+    # (globals, globals.version, callee, is spell, speaks result)
+    callee_cache: tuple = None
 
 
-@dataclass
+@_slotted
 class MemberExpr(ASTNode):
     """Member access: object.member."""
     object: ASTNode = None
     member: str = ""
 
 
+@_slotted
+class InvariantExpr(ASTNode):
+    """Loop-invariant expression, evaluated once per loop entry (inserted by the Optimizer).
+
+    The value is cached in the hidden variable `name`, which the Optimizer
+    declares (empty) right before the loop.
+    """
+    expression: ASTNode = None
+    name: str = ""
+    # Filled in by the Resolver, as for Identifier
+    depth: int = -1
+    slot: int = 0
+    fallbacks: tuple = ()
+
+
+@_slotted
+class InlineExpr(ASTNode):
+    """Spell call replaced by the spell's body expression (inserted by the Optimizer).
+
+    The arguments are evaluated in order into a fresh scope holding one slot
+    per parameter, then body is evaluated in that scope. Errors escaping
+    body get a traceback frame for the spell, as a real call would add.
+    """
+    arguments: list = field(default_factory=list)
+    params: list = field(default_factory=list)
+    body: ASTNode = None
+    spell: str = ""  # Name of the inlined spell
+
+
 # ============ Statements ============
 
-@dataclass
+@_slotted
 class Program(ASTNode):
     """Root node containing all statements."""
     statements: list = field(default_factory=list)
+    resolved: bool = False  # Set once the Resolver has annotated the tree
+    optimized: bool = False  # Set once the Optimizer has rewritten the tree
+    inferred: bool = False  # Set once TypeInference has marked typed operations
 
 
-@dataclass
+@_slotted
 class VarDecl(ASTNode):
     """Variable declaration: conjure/summon x as value."""
     name: str = ""
     value: ASTNode = None
     type_hint: Optional[str] = None  # scroll, rune, potion, etc.
     is_const: bool = False
+    slot: int = -1  # Slot in the enclosing scope (-1 = global), set by the Resolver
 
 
-@dataclass
+@_slotted
 class VarAssign(ASTNode):
     """Variable reassignment: transmute x as value."""
     name: str = ""
     value: ASTNode = None
+    # Filled in by the Resolver (see Identifier)
+    depth: int = -1
+    slot: int = 0
+    fallbacks: tuple = ()
+    is_const_target: bool = False  # Resolves to a local prophecy
 
 
-@dataclass
+@_slotted
 class IndexAssign(ASTNode):
     """Index assignment: transmute collection[index] as value."""
     collection: ASTNode = None
@@ -105,64 +181,86 @@ class IndexAssign(ASTNode):
     value: ASTNode = None
 
 
-@dataclass
+@_slotted
 class VarDelete(ASTNode):
     """Variable deletion: vanquish x."""
     name: str = ""
+    # Filled in by the Resolver (see Identifier)
+    depth: int = -1
+    slot: int = 0
+    fallbacks: tuple = ()
+    is_const_target: bool = False  # Resolves to a local prophecy
 
 
-@dataclass
+@_slotted
 class SpellDecl(ASTNode):
     """Function declaration: spell funcname(params):."""
     name: str = ""
     params: list = field(default_factory=list)
     body: list = field(default_factory=list)
     is_incantation: bool = False  # Auto-speaks when called
+    is_pure: bool = False  # `pure spell`: results are remembered per arguments
+    is_generator: bool = False  # Body yields: calling the spell returns a stream
+    slot: int = -1  # Slot in the enclosing scope (-1 = global), set by the Resolver
+    frame_size: int = 0  # Parameters plus body locals (0 = no frame), set by the Resolver
 
 
-@dataclass
+@_slotted
 class CastStmt(ASTNode):
     """Return statement: cast value."""
     value: Optional[ASTNode] = None
+    # Set by the Resolver for `cast f(...)` in a spell outside any of its
+    # loops: the call can replace the current spell instead of nesting
+    tail_call: bool = False
+
+
+@_slotted
+class YieldStmt(ASTNode):
+    """Yield statement: yield value (hands one item to the spell's consumer)."""
+    value: ASTNode = None
 
 
-@dataclass
+@_slotted
 class IfStmt(ASTNode):
     """If statement: prophecy reveals condition:."""
     condition: ASTNode = None
     then_branch: list = field(default_factory=list)
     elif_branches: list = field(default_factory=list)  # List of (condition, body) tuples
     else_branch: Optional[list] = None
+    branch_sizes: list = field(default_factory=list)  # Scope size per branch (0 = no scope), set by the Resolver
 
 
-@dataclass
+@_slotted
 class WhileStmt(ASTNode):
     """While loop: patrol until condition:."""
     condition: ASTNode = None
     body: list = field(default_factory=list)
+    scope_size: int = 0  # Set by the Resolver; 0 means the body runs in the enclosing scope
 
 
-@dataclass
+@_slotted
 class ForStmt(ASTNode):
     """For loop: hunt each item in collection:."""
     variable: str = ""
     iterable: ASTNode = None
     body: list = field(default_factory=list)
+    scope_size: int = 0  # Loop variable is slot 0; set by the Resolver
+    reuse_frame: bool = False  # One frame for all iterations (no spells in the body)
 
 
-@dataclass
+@_slotted
 class BreakStmt(ASTNode):
     """Break statement."""
     pass
 
 
-@dataclass
+@_slotted
 class ContinueStmt(ASTNode):
     """Continue statement."""
     pass
 
 
-@dataclass
+@_slotted
 class ExprStmt(ASTNode):
     """Expression statement (function call, etc.)."""
     expression: ASTNode = None
@@ -6,8 +6,10 @@ import time
 import webbrowser
 import os
 import json
+import weakref
 from typing import Any, List
-from .environment import BuiltinFunction
+from .environment import BuiltinFunction, PURE, READ_ONLY
+from .streams import Stream, RangeStream, IterStream
 from .errors import ForbiddenMagic, PortalFailure, VoiceSilenced, ScrollDamaged, OracleSilent, QuestFailed
 
 # Global TTS engine (lazy initialized)
@@ -455,6 +457,29 @@ def builtin_range(interpreter, args: List[Any]) -> list:
         return list(range(int(args[0]), int(args[1]), int(args[2])))
 
 
+def builtin_stream_range(interpreter, args: List[Any]) -> RangeStream:
+    """stream_range(start, end, [step]) - Like range, but a lazy stream of numbers.
+
+    Nothing is built up front: hunt each takes one number at a time, and
+    measure and indexing work without a tome. append, remove and + need a
+    tome; gather() makes one.
+    """
+    if len(args) < 1 or len(args) > 3:
+        raise ForbiddenMagic("stream_range requires 1-3 arguments")
+    if len(args) == 3 and int(args[2]) == 0:
+        raise ForbiddenMagic("stream_range step cannot be 0")
+    return RangeStream(range(*(int(arg) for arg in args)))
+
+
+def builtin_gather(interpreter, args: List[Any]) -> list:
+    """gather(stream) - Collect a stream (or copy a tome) into a new tome."""
+    if len(args) != 1:
+        raise ForbiddenMagic("gather requires 1 argument (stream)")
+    if not isinstance(args[0], (Stream, list)):
+        raise ForbiddenMagic("Can only gather a stream or tome")
+    return list(args[0])
+
+
 def builtin_append(interpreter, args: List[Any]) -> None:
     """append(list, item) - Add item to list."""
     if len(args) != 2:
@@ -496,6 +521,8 @@ def builtin_type_of(interpreter, args: List[Any]) -> str:
     if len(args) != 1:
         raise ForbiddenMagic("type_of requires 1 argument")
     val = args[0]
+    if isinstance(val, Stream):
+        return "stream"
     type_map = {
         str: "scroll",
         int: "rune",
@@ -508,6 +535,59 @@ def builtin_type_of(interpreter, args: List[Any]) -> str:
     return type_map.get(type(val), "unknown")
 
 
+def builtin_divine_memos(interpreter, args: List[Any]) -> dict:
+    """divine_memos([spell_name]) - Cache counters of pure spells.
+
+    With a name, returns that spell's grimoire of hits, misses, bypasses,
+    size and max_size; without one, a grimoire of those per pure spell.
+    """
+    if len(args) > 1:
+        raise ForbiddenMagic("divine_memos takes at most 1 argument (spell_name)")
+    caches = interpreter.spell_caches
+    if args:
+        name = str(args[0])
+        if name not in caches:
+            raise ForbiddenMagic(f"'{name}' is not a pure spell")
+        return caches[name].stats()
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def builtin_divine_metrics(interpreter, args: List[Any]) -> dict:
+    """divine_metrics([builtin_name]) - Call metrics of builtins.
+
+    With a name, returns that builtin's grimoire of calls, errors, seconds
+    and histogram (calls that took at most each bound in seconds); without
+    one, a grimoire of those per builtin called so far. Empty unless the
+    script runs with --metrics or --metrics-file.
+    """
+    if len(args) > 1:
+        raise ForbiddenMagic("divine_metrics takes at most 1 argument (builtin_name)")
+    metrics = interpreter.metrics.stats() if interpreter.metrics is not None else {}
+    if args:
+        name = str(args[0])
+        if name not in metrics:
+            raise ForbiddenMagic(f"'{name}' has not been called")
+        return metrics[name]
+    return metrics
+
+
+def builtin_memory_snapshot(interpreter, args: List[Any]) -> str:
+    """memory_snapshot([label]) - Mark a point for the --memprofile report.
+
+    The report lists how the memory left alive by each line changed
+    between the first and the last snapshot. Returns the label (default
+    "#1", "#2", ...); does nothing else without --memprofile.
+    """
+    if len(args) > 1:
+        raise ForbiddenMagic("memory_snapshot takes at most 1 argument (label)")
+    profiler = interpreter.memory_profiler
+    count = len(profiler.snapshots) if profiler is not None else 0
+    label = str(args[0]) if args else f"#{count + 1}"
+    if profiler is not None:
+        profiler.snapshot(label)
+    return label
+
+
 # ============ File I/O Functions (Ancient Scrolls Theme) ============
 
 def builtin_unroll_scroll(interpreter, args: List[Any]):
@@ -628,6 +708,29 @@ def builtin_divine_lines(interpreter, args: List[Any]) -> list:
         raise ScrollDamaged(f"Failed to divine lines: {e}")
 
 
+def builtin_stream_lines(interpreter, args: List[Any]) -> IterStream:
+    """stream_lines(path) - Read a file lazily, one line per hunt iteration.
+
+    The scroll is opened when the first line is needed and closed once the
+    last one is read or the stream is dropped.
+    """
+    if len(args) != 1:
+        raise ForbiddenMagic("stream_lines requires 1 argument (path)")
+    path = str(args[0])
+    if not os.path.exists(path):
+        raise ScrollDamaged(f"Scroll not found: {path}")
+
+    def lines():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield line.rstrip('\r\n')
+        except (OSError, UnicodeDecodeError) as e:
+            raise ScrollDamaged(f"Failed to stream lines: {e}")
+
+    return IterStream(lines())
+
+
 def builtin_scroll_exists(interpreter, args: List[Any]) -> bool:
     """scroll_exists(path) - Check if a file exists."""
     if len(args) != 1:
@@ -657,6 +760,9 @@ def builtin_banish_scroll(interpreter, args: List[Any]) -> bool:
 # Global MySQL connection cache
 _mysql_connection = None
 
+# Rows stream_oracle fetches per round trip
+_ORACLE_BATCH = 100
+
 
 def _get_mysql():
     """Lazy-load MySQL connector."""
@@ -729,6 +835,49 @@ def builtin_consult_oracle(interpreter, args: List[Any]) -> list:
         raise OracleSilent(f"Oracle consultation failed: {e}")
 
 
+def builtin_stream_oracle(interpreter, args: List[Any]) -> IterStream:
+    """stream_oracle(connection, query, [params]) - Execute SELECT query and stream the rows.
+
+    Like consult_oracle, but rows are fetched in batches as hunt each asks
+    for them instead of all at once.
+    """
+    if len(args) < 2 or len(args) > 3:
+        raise ForbiddenMagic("stream_oracle requires 2-3 arguments (connection, query, [params])")
+    connection = args[0]
+    query = str(args[1])
+    params = tuple(args[2]) if len(args) > 2 and args[2] else None
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+    except Exception as e:
+        if cursor is not None:
+            cursor.close()
+        raise OracleSilent(f"Oracle consultation failed: {e}")
+
+    def rows():
+        try:
+            while True:
+                batch = cursor.fetchmany(_ORACLE_BATCH)
+                if not batch:
+                    return
+                yield from batch
+        except Exception as e:
+            raise OracleSilent(f"Oracle consultation failed: {e}")
+        finally:
+            release()
+
+    # A generator that never started skips its finally, so a stream dropped
+    # before its first row closes the cursor when it is collected instead
+    generator = rows()
+    release = weakref.finalize(generator, cursor.close)
+    return IterStream(generator)
+
+
 def builtin_divine_one(interpreter, args: List[Any]):
     """divine_one(connection, query, [params]) - Execute SELECT and return first row.
 
@@ -1107,7 +1256,7 @@ def builtin_choose_fate(interpreter, args: List[Any]):
         raise ForbiddenMagic("choose_fate requires 1 argument (options)")
     options = args[0]
 
-    if not isinstance(options, list) or len(options) == 0:
+    if not isinstance(options, (list, RangeStream)) or len(options) == 0:
         raise QuestFailed("Options must be a non-empty tome (list)")
 
     return random.choice(options)
@@ -1117,11 +1266,12 @@ def builtin_choose_fate(interpreter, args: List[Any]):
 
 def register_builtins(environment):
     """Register all built-in functions in the given environment."""
+    # (name, function, arity[, traits]) - see environment.PURE and READ_ONLY
     builtins = [
         # TTS
-        ("speak_spell", builtin_speak_spell, 1),
-        ("whisper_spell", builtin_whisper_spell, 1),
-        ("shout_spell", builtin_shout_spell, 1),
+        ("speak_spell", builtin_speak_spell, 1, READ_ONLY),
+        ("whisper_spell", builtin_whisper_spell, 1, READ_ONLY),
+        ("shout_spell", builtin_shout_spell, 1, READ_ONLY),
         ("change_voice", builtin_change_voice, 1),
         ("set_speech_rate", builtin_set_speech_rate, 1),
 
@@ -1144,23 +1294,28 @@ def register_builtins(environment):
         ("summon_browser", builtin_summon_browser, 1),
 
         # I/O
-        ("scribe_line", builtin_scribe_line, -1),
-        ("scribe", builtin_scribe, -1),
-        ("prophecy_input", builtin_prophecy_input, -1),
+        ("scribe_line", builtin_scribe_line, -1, READ_ONLY),
+        ("scribe", builtin_scribe, -1, READ_ONLY),
+        ("prophecy_input", builtin_prophecy_input, -1, READ_ONLY),
 
         # Utilities
-        ("measure", builtin_measure, 1),
-        ("transform_to_rune", builtin_transform_to_rune, 1),
-        ("transform_to_scroll", builtin_transform_to_scroll, 1),
-        ("transform_to_potion", builtin_transform_to_potion, 1),
-        ("random_fate", builtin_random_fate, 2),
-        ("slumber", builtin_slumber, 1),
-        ("range", builtin_range, -1),
+        ("measure", builtin_measure, 1, PURE),
+        ("transform_to_rune", builtin_transform_to_rune, 1, PURE),
+        ("transform_to_scroll", builtin_transform_to_scroll, 1, PURE),
+        ("transform_to_potion", builtin_transform_to_potion, 1, PURE),
+        ("random_fate", builtin_random_fate, 2, READ_ONLY),
+        ("slumber", builtin_slumber, 1, READ_ONLY),
+        ("range", builtin_range, -1, READ_ONLY),
+        ("stream_range", builtin_stream_range, -1, READ_ONLY),
+        ("gather", builtin_gather, 1),
         ("append", builtin_append, 2),
         ("remove", builtin_remove, 2),
-        ("keys", builtin_keys, 1),
-        ("values", builtin_values, 1),
-        ("type_of", builtin_type_of, 1),
+        ("keys", builtin_keys, 1, READ_ONLY),
+        ("values", builtin_values, 1, READ_ONLY),
+        ("type_of", builtin_type_of, 1, PURE),
+        ("divine_memos", builtin_divine_memos, -1, READ_ONLY),
+        ("divine_metrics", builtin_divine_metrics, -1, READ_ONLY),
+        ("memory_snapshot", builtin_memory_snapshot, -1, READ_ONLY),
 
         # File I/O (Ancient Scrolls Theme)
         ("unroll_scroll", builtin_unroll_scroll, -1),
@@ -1171,6 +1326,7 @@ def register_builtins(environment):
         ("read_runes", builtin_read_runes, -1),
         ("etch_runes", builtin_etch_runes, 2),
         ("divine_lines", builtin_divine_lines, 1),
+        ("stream_lines", builtin_stream_lines, 1, READ_ONLY),
         ("scroll_exists", builtin_scroll_exists, 1),
         ("banish_scroll", builtin_banish_scroll, 1),
 
@@ -1178,6 +1334,7 @@ def register_builtins(environment):
         ("awaken_oracle", builtin_awaken_oracle, -1),
         ("dismiss_oracle", builtin_dismiss_oracle, 1),
         ("consult_oracle", builtin_consult_oracle, -1),
+        ("stream_oracle", builtin_stream_oracle, -1),
         ("divine_one", builtin_divine_one, -1),
         ("decree_oracle", builtin_decree_oracle, -1),
         ("last_prophecy_id", builtin_last_prophecy_id, 1),
@@ -1201,8 +1358,8 @@ def register_builtins(environment):
         ("choose_fate", builtin_choose_fate, 1),
     ]
 
-    for name, func, arity in builtins:
-        environment.define(name, BuiltinFunction(name, func, arity))
+    for name, func, arity, *traits in builtins:
+        environment.define(name, BuiltinFunction(name, func, arity, traits))
 
     # Register M365/Entra ID built-ins
     from .m365 import register_m365_builtins
@@ -0,0 +1,656 @@
+"""Bytecode format and compiler for SlayScript.
+
+Programs and spells compile to CodeObjects: a flat instruction array of
+(opcode, argument) integer pairs, a constants pool, a name table and a
+source position for every instruction.
+
+Variables declared inside blocks and spells live in numbered slots of
+runtime scopes and are addressed by the (depth, slot) pairs the Resolver
+assigns, where depth counts the scopes between the use and the
+declaration. Top-level variables and builtins stay in the global
+Environment and are addressed by name.
+"""
+
+from typing import List, Optional
+from .ast_nodes import (
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
+    BreakStmt, ContinueStmt, ExprStmt
+)
+from .resolver import Resolver
+from .errors import ForbiddenMagic
+
+
+# ============ Opcodes ============
+
+# Variables
+LOAD_CONST = 0        # push consts[arg]
+LOAD_LOCAL = 1        # push slot (arg = depth << 16 | slot)
+LOAD_GLOBAL = 2       # push global names[arg]
+STORE_LOCAL = 3       # pop into slot arg of the current scope (declaration)
+ASSIGN_LOCAL = 4      # pop into an existing slot (arg = depth << 16 | slot)
+DEFINE_GLOBAL = 5     # pop and define global names[arg]
+DEFINE_CONST = 6      # pop and define constant global names[arg]
+ASSIGN_GLOBAL = 7     # pop and assign existing global names[arg]
+DELETE_LOCAL = 8      # vanquish slot (arg = depth << 16 | slot)
+DELETE_GLOBAL = 9     # vanquish global names[arg]
+CONST_VIOLATION = 10  # raise ProphecyViolation with message consts[arg]
+
+# Arithmetic and comparison (pop right, pop left, push result)
+ADD = 11
+SUB = 12
+MUL = 13
+DIV = 14
+MOD = 15
+POW = 16
+EQ = 17
+NE = 18
+GT = 19
+LT = 20
+GE = 21
+LE = 22
+NEG = 23              # unary: pop operand, push result
+NOT = 24
+TO_CHARM = 25         # unary: pop operand, push its truthiness (ends `and` / `or`)
+
+# Collections
+BUILD_TOME = 26       # pop arg elements, push list
+BUILD_GRIMOIRE = 27   # pop arg key/value pairs, push dict
+INDEX = 28            # pop index, pop collection, push element
+STORE_INDEX = 29      # pop value, pop index, pop collection, push value
+MEMBER = 30           # pop grimoire, push member names[arg]
+
+# Control flow
+JUMP = 31             # pc = arg
+JUMP_IF_TRUE = 32     # pop, pc = arg if truthy
+JUMP_IF_FALSE = 33    # pop, pc = arg if falsy
+GET_ITER = 34         # pop iterable, push iterator
+FOR_ITER = 35         # push next item, or pop iterator and pc = arg
+ENTER_SCOPE = 36      # open a new scope with arg slots
+EXIT_SCOPE = 37       # close arg scopes
+RESET_SCOPE = 38      # empty every slot of the current scope (reused hunt frame)
+BREAK = 39            # raise SlayerInterrupt (break outside a loop)
+CONTINUE = 40         # raise PatrolContinue (continue outside a loop)
+
+# Spells
+MAKE_SPELL = 41       # push spell for code object consts[arg]
+CALL = 42             # pop arg arguments and the callee, push result
+RETURN = 43           # return top of stack from the current code object
+CAST = 44             # raise SpellReturn (cast outside a spell)
+
+# Statement results
+POP = 45              # discard top of stack
+DUP = 46              # duplicate top of stack
+STORE_RESULT = 47     # pop into the block result register
+LOAD_RESULT = 48      # push the block result register
+
+# Loop invariants cached by the Optimizer (see ast_nodes.InvariantExpr)
+PEEK_LOCAL = 49       # push slot (arg = depth << 16 | slot), UNSET if empty
+PEEK_GLOBAL = 50      # push global names[arg], UNSET if undefined
+JUMP_IF_SET = 51      # pc = arg if the top of stack is not UNSET, else pop it
+CACHE_LOCAL = 52      # copy top of stack into slot (arg = depth << 16 | slot)
+CACHE_GLOBAL = 53     # copy top of stack into global names[arg]
+
+# Tail calls (`cast f(...)` in a spell): emitted as TAIL_CALL n; CALL n; RETURN
+TAIL_CALL = 54        # replace the current spell with a plain spell callee, else no-op
+
+# Strict mode (emitted only by BytecodeCompiler(strict=True))
+CHECK_HINT = 55       # raise unless top of stack matches the declaration's type hint
+
+# Generator spells and streams
+YIELD = 56            # pop a value and suspend the generator spell, handing it out
+CLOSE_ITER = 57       # pop a hunt iterator left by break and close its stream
+
+# Tracing hooks (emitted only by BytecodeCompiler(traced=True))
+TRACE_LINE = 58       # fire the line event for source line arg
+CALL_TRACED = 59      # CALL through Interpreter.traced_invoke, firing call events
+
+OPCODE_NAMES = {
+    value: name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, int)
+}
+
+# Opcodes whose argument is a jump target, an index into names, or a
+# packed (depth, slot) pair; used by the disassembler
+JUMP_OPS = {JUMP, JUMP_IF_TRUE, JUMP_IF_FALSE, FOR_ITER, JUMP_IF_SET}
+NAME_OPS = {LOAD_GLOBAL, DEFINE_GLOBAL, DEFINE_CONST, ASSIGN_GLOBAL,
+            DELETE_GLOBAL, MEMBER, PEEK_GLOBAL, CACHE_GLOBAL}
+LOCAL_OPS = {LOAD_LOCAL, ASSIGN_LOCAL, DELETE_LOCAL, PEEK_LOCAL, CACHE_LOCAL}
+
+BINARY_OPS = {
+    "+": ADD, "-": SUB, "*": MUL, "/": DIV, "%": MOD, "**": POW,
+    "is": EQ, "isnt": NE, "exceeds": GT, "under": LT, "atleast": GE, "atmost": LE,
+}
+
+SLOT_BITS = 16
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+
+class CodeObject:
+    """Compiled bytecode for a program or a single spell.
+
+    Every instruction records the AST node it was compiled from, which
+    supplies line and column information for runtime errors.
+    """
+
+    def __init__(self, name: str, declaration: Optional[SpellDecl] = None):
+        self.name = name
+        self.declaration = declaration  # SpellDecl for spells, None for programs
+        self.params = tuple(declaration.params) if declaration is not None else ()
+        self.nlocals = 0  # Slots in the spell's outermost scope
+        self.code: List[int] = []
+        self.consts: list = []
+        self.names: List[str] = []
+        self.nodes: list = []  # Source AST node per instruction
+        # A spell can break or continue outside any of its own loops, which
+        # ends the iteration of the loop its call sits in. For each CALL in a
+        # loop body: {index: ((exits, stack height, pc) for break, ... for continue)}
+        self.loop_handlers: dict = {}
+        # Spells inlined by the optimizer, innermost first: (first, last
+        # instruction index of the body, InlineExpr), so tracebacks name them
+        self.inlined: list = []
+
+    def node_at(self, pc: int):
+        """Return the AST node of the instruction preceding pc."""
+        return self.nodes[(pc >> 1) - 1]
+
+    def __repr__(self):
+        return f"<code {self.name}>"
+
+
+# ============ Compiler ============
+
+class _Loop:
+    """Jump bookkeeping for the innermost patrol/hunt loop."""
+
+    def __init__(self, continue_target: int, scope_depth: int, has_iterator: bool,
+                 continue_depth: Optional[int] = None):
+        self.continue_target = continue_target
+        self.scope_depth = scope_depth  # Scopes open outside the loop
+        # Scopes still open at the continue target (a reused hunt frame stays open)
+        self.continue_depth = scope_depth if continue_depth is None else continue_depth
+        self.has_iterator = has_iterator
+        self.break_jumps: List[int] = []
+        self.calls = []  # (CALL index, scope depth, stack height) in the body
+
+
+class BytecodeCompiler:
+    """Compiles a resolved Program AST into CodeObjects.
+
+    Variable addresses and scope sizes come from the Resolver annotations.
+    """
+
+    def __init__(self, strict: bool = False, traced: bool = False):
+        self.strict = strict  # Check declarations against their type hints
+        self.traced = traced  # Emit tracing hook instructions (see tracing.py)
+        self.code: Optional[CodeObject] = None
+        self.const_index = {}
+        self.name_index = {}
+        self.scope_depth = 0  # Runtime scopes open in the current code object
+        self.loops: List[_Loop] = []
+        self.pending: List[CodeObject] = []  # Spell bodies compiled after the program
+        self.node = None  # Node whose position is recorded for emitted instructions
+
+    def compile_program(self, program: Program) -> CodeObject:
+        """Compile a whole program."""
+        if not program.resolved:
+            Resolver().resolve(program)
+        self.start(CodeObject("<program>"))
+        self.node = program
+
+        self.sequence(program.statements, keep=True)
+        self.emit(LOAD_RESULT)
+        self.emit(RETURN)
+        program_code = self.code
+
+        while self.pending:
+            self.compile_spell(self.pending.pop(0))
+
+        return program_code
+
+    def compile_spell(self, code: CodeObject):
+        """Compile a spell body."""
+        self.start(code)
+        self.node = code.declaration
+        code.nlocals = code.declaration.frame_size
+
+        self.sequence(code.declaration.body, keep=True)
+        self.emit(LOAD_RESULT)
+        self.emit(RETURN)
+
+    # ============ Emission Helpers ============
+
+    def start(self, code: CodeObject):
+        """Direct emission into a fresh code object."""
+        self.code = code
+        self.const_index = {}
+        self.name_index = {}
+        self.scope_depth = 0
+        self.loops = []
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        """Append an instruction and return its index in the code array."""
+        code = self.code
+        code.code.append(op)
+        code.code.append(arg)
+        code.nodes.append(self.node)
+        return len(code.code) - 2
+
+    def patch(self, index: int, target: Optional[int] = None):
+        """Point the jump at index to target (default: the next instruction)."""
+        self.code.code[index + 1] = len(self.code.code) if target is None else target
+
+    def constant(self, value) -> int:
+        """Return the constants pool index of value, adding it if needed."""
+        # repr keeps 0.0 and -0.0 apart, which compare equal
+        key = (float, repr(value)) if type(value) is float else (type(value), value)
+        index = self.const_index.get(key)
+        if index is None:
+            index = len(self.code.consts)
+            self.code.consts.append(value)
+            self.const_index[key] = index
+        return index
+
+    def name(self, name: str) -> int:
+        """Return the name table index of name, adding it if needed."""
+        index = self.name_index.get(name)
+        if index is None:
+            index = len(self.code.names)
+            self.code.names.append(name)
+            self.name_index[name] = index
+        return index
+
+    def emit_local(self, op: int, node):
+        """Emit a resolved local access; its fallbacks stay on the node."""
+        if node.slot > SLOT_MASK:
+            # The slot would spill into the depth bits of the operand
+            raise ForbiddenMagic(f"Too many variables in one scope for the vm "
+                                 f"(at most {SLOT_MASK + 1})", node.line, node.column)
+        self.emit(op, (node.depth << SLOT_BITS) | node.slot)
+
+    # ============ Statements ============
+
+    def sequence(self, statements: list, keep: bool = False):
+        """Compile statements; if keep, the last value goes to the result register."""
+        if not statements:
+            if keep:
+                self.emit(LOAD_CONST, self.constant(None))
+                self.emit(STORE_RESULT)
+            return
+        last = len(statements) - 1
+        for index, stmt in enumerate(statements):
+            self.statement(stmt, keep and index == last)
+
+    def block(self, statements: list, size: int, keep: bool = False):
+        """Compile statements in their own runtime scope (none if size is 0)."""
+        if not size:
+            self.sequence(statements, keep)
+            return
+        self.emit(ENTER_SCOPE, size)
+        self.scope_depth += 1
+        self.sequence(statements, keep)
+        self.scope_depth -= 1
+        self.emit(EXIT_SCOPE, 1)
+
+    def statement(self, node, keep: bool):
+        previous, self.node = self.node, node
+        if self.traced:
+            self.emit(TRACE_LINE, node.line)
+        method = getattr(self, f"stmt_{type(node).__name__}", None)
+        if method is not None:
+            method(node, keep)
+        else:
+            self.expression(node)
+            self.emit(STORE_RESULT if keep else POP)
+        self.node = previous
+
+    def stmt_ExprStmt(self, node: ExprStmt, keep: bool):
+        self.expression(node.expression)
+        self.emit(STORE_RESULT if keep else POP)
+
+    def stmt_VarDecl(self, node: VarDecl, keep: bool):
+        self.expression(node.value)
+        if self.strict and node.type_hint is not None:
+            self.emit(CHECK_HINT)
+        if keep:
+            self.emit(DUP)
+            self.emit(STORE_RESULT)
+        if node.slot >= 0:
+            self.emit(STORE_LOCAL, node.slot)
+        else:
+            self.emit(DEFINE_CONST if node.is_const else DEFINE_GLOBAL, self.name(node.name))
+
+    def stmt_VarAssign(self, node: VarAssign, keep: bool):
+        self.expression(node.value)
+        if keep:
+            self.emit(DUP)
+            self.emit(STORE_RESULT)
+        if node.depth < 0:
+            self.emit(ASSIGN_GLOBAL, self.name(node.name))
+        elif node.is_const_target:
+            message = f"Cannot modify the prophecy '{node.name}' - it is constant"
+            self.emit(CONST_VIOLATION, self.constant(message))
+        else:
+            self.emit_local(ASSIGN_LOCAL, node)
+
+    def stmt_IndexAssign(self, node: IndexAssign, keep: bool):
+        self.expression(node.collection)
+        self.expression(node.index)
+        self.expression(node.value)
+        self.emit(STORE_INDEX)
+        self.emit(STORE_RESULT if keep else POP)
+
+    def stmt_VarDelete(self, node: VarDelete, keep: bool):
+        if node.depth < 0:
+            self.emit(DELETE_GLOBAL, self.name(node.name))
+        elif node.is_const_target:
+            message = f"Cannot vanquish the prophecy '{node.name}' - it is constant"
+            self.emit(CONST_VIOLATION, self.constant(message))
+        else:
+            self.emit_local(DELETE_LOCAL, node)
+        if keep:
+            self.emit(LOAD_CONST, self.constant(None))
+            self.emit(STORE_RESULT)
+
+    def stmt_SpellDecl(self, node: SpellDecl, keep: bool):
+        code = CodeObject(node.name, node)
+        self.pending.append(code)
+        self.emit(MAKE_SPELL, self.constant(code))
+        if keep:
+            self.emit(DUP)
+            self.emit(STORE_RESULT)
+        if node.slot >= 0:
+            self.emit(STORE_LOCAL, node.slot)
+        else:
+            self.emit(DEFINE_GLOBAL, self.name(node.name))
+
+    def stmt_CastStmt(self, node: CastStmt, keep: bool):
+        if node.tail_call and not self.traced:
+            call = node.value
+            previous, self.node = self.node, call
+            self.expression(call.callee)
+            for arg in call.arguments:
+                self.expression(arg)
+            self.emit(TAIL_CALL, len(call.arguments))
+            # Reached only when the callee cannot replace this spell
+            self.emit(CALL, len(call.arguments))
+            self.node = previous
+            self.emit(RETURN)
+            return
+        if node.value is None:
+            self.emit(LOAD_CONST, self.constant(None))
+        else:
+            self.expression(node.value)
+        self.emit(CAST if self.code.declaration is None else RETURN)
+
+    def stmt_YieldStmt(self, node: YieldStmt, keep: bool):
+        self.expression(node.value)
+        self.emit(YIELD)
+        if keep:
+            self.emit(LOAD_CONST, self.constant(None))
+            self.emit(STORE_RESULT)
+
+    def stmt_IfStmt(self, node: IfStmt, keep: bool):
+        end_jumps = []
+        branches = [(node.condition, node.then_branch)] + list(node.elif_branches)
+        for (condition, body), size in zip(branches, node.branch_sizes):
+            self.expression(condition)
+            skip = self.emit(JUMP_IF_FALSE)
+            self.block(body, size, keep)
+            end_jumps.append(self.emit(JUMP))
+            self.patch(skip)
+
+        if node.else_branch is not None:
+            self.block(node.else_branch, node.branch_sizes[-1], keep)
+        elif keep:
+            self.emit(LOAD_CONST, self.constant(None))
+            self.emit(STORE_RESULT)
+
+        for jump in end_jumps:
+            self.patch(jump)
+
+    def stmt_WhileStmt(self, node: WhileStmt, keep: bool):
+        if keep:
+            self.emit(LOAD_CONST, self.constant(None))
+            self.emit(STORE_RESULT)
+        start = len(self.code.code)
+        self.expression(node.condition)
+        # "patrol until" loops while the condition is false
+        exit_jump = self.emit(JUMP_IF_TRUE)
+
+        loop = _Loop(start, self.scope_depth, has_iterator=False)
+        self.loops.append(loop)
+        self.block(node.body, node.scope_size, keep)
+        self.loops.pop()
+
+        self.emit(JUMP, start)
+        self.patch(exit_jump)
+        self.finish_loop(loop)
+
+    def stmt_ForStmt(self, node: ForStmt, keep: bool):
+        if keep:
+            self.emit(LOAD_CONST, self.constant(None))
+            self.emit(STORE_RESULT)
+        self.expression(node.iterable)
+        self.emit(GET_ITER)
+
+        if node.reuse_frame:
+            # One frame for the whole loop, emptied at the top of each iteration
+            outer_depth = self.scope_depth
+            self.emit(ENTER_SCOPE, node.scope_size)
+            self.scope_depth += 1
+            start = self.emit(FOR_ITER)
+            loop = _Loop(start, outer_depth, has_iterator=True, continue_depth=self.scope_depth)
+            self.loops.append(loop)
+            if node.scope_size > 1:
+                self.emit(RESET_SCOPE)
+            self.emit(STORE_LOCAL, 0)  # The loop variable
+            self.sequence(node.body, keep)
+            self.loops.pop()
+            self.emit(JUMP, start)
+            self.patch(start)
+            self.scope_depth -= 1
+            self.emit(EXIT_SCOPE, 1)
+        else:
+            start = self.emit(FOR_ITER)
+            loop = _Loop(start, self.scope_depth, has_iterator=True)
+            self.loops.append(loop)
+            self.emit(ENTER_SCOPE, node.scope_size)
+            self.scope_depth += 1
+            self.emit(STORE_LOCAL, 0)  # The loop variable
+            self.sequence(node.body, keep)
+            self.scope_depth -= 1
+            self.emit(EXIT_SCOPE, 1)
+            self.loops.pop()
+            self.emit(JUMP, start)
+            self.patch(start)
+
+        self.finish_loop(loop)
+
+    def finish_loop(self, loop: _Loop):
+        """Point break jumps and the loop's call handlers past the loop."""
+        for jump in loop.break_jumps:
+            self.patch(jump)
+        end = len(self.code.code)
+        for index, depth, height in loop.calls:
+            self.code.loop_handlers[index] = (
+                (depth - loop.scope_depth, height - loop.has_iterator, end),
+                (depth - loop.continue_depth, height, loop.continue_target),
+            )
+
+    def stmt_BreakStmt(self, node: BreakStmt, keep: bool):
+        if not self.loops:
+            self.emit(BREAK)
+            return
+        loop = self.loops[-1]
+        if self.scope_depth > loop.scope_depth:
+            self.emit(EXIT_SCOPE, self.scope_depth - loop.scope_depth)
+        if loop.has_iterator:
+            self.emit(CLOSE_ITER)
+        loop.break_jumps.append(self.emit(JUMP))
+
+    def stmt_ContinueStmt(self, node: ContinueStmt, keep: bool):
+        if not self.loops:
+            self.emit(CONTINUE)
+            return
+        loop = self.loops[-1]
+        if self.scope_depth > loop.continue_depth:
+            self.emit(EXIT_SCOPE, self.scope_depth - loop.continue_depth)
+        self.emit(JUMP, loop.continue_target)
+
+    # ============ Expressions ============
+
+    def expression(self, node):
+        previous, self.node = self.node, node
+        method = getattr(self, f"expr_{type(node).__name__}", None)
+        if method is None:
+            raise ForbiddenMagic(f"No compiler for {type(node).__name__}", node.line, node.column)
+        method(node)
+        self.node = previous
+
+    def expr_Literal(self, node: Literal):
+        self.emit(LOAD_CONST, self.constant(node.value))
+
+    def expr_Identifier(self, node: Identifier):
+        if node.depth < 0:
+            self.emit(LOAD_GLOBAL, self.name(node.name))
+        else:
+            self.emit_local(LOAD_LOCAL, node)
+
+    def expr_BinaryOp(self, node: BinaryOp):
+        op = BINARY_OPS.get(node.operator)
+        if op is None:
+            raise ForbiddenMagic(f"Unknown operator '{node.operator}'", node.line, node.column)
+        self.expression(node.left)
+        self.expression(node.right)
+        self.emit(op)
+
+    def expr_LogicalOp(self, node: LogicalOp):
+        # and: left; JUMP_IF_FALSE short; right; TO_CHARM; JUMP end; short: false
+        # (or: the same with JUMP_IF_TRUE and true)
+        is_and = node.operator == "and"
+        self.expression(node.left)
+        short = self.emit(JUMP_IF_FALSE if is_and else JUMP_IF_TRUE)
+        self.expression(node.right)
+        self.emit(TO_CHARM)
+        end = self.emit(JUMP)
+        self.patch(short)
+        self.emit(LOAD_CONST, self.constant(not is_and))
+        self.patch(end)
+
+    def expr_UnaryOp(self, node: UnaryOp):
+        if node.operator == "-":
+            op = NEG
+        elif node.operator == "not":
+            op = NOT
+        else:
+            raise ForbiddenMagic(f"Unknown unary operator '{node.operator}'", node.line, node.column)
+        self.expression(node.operand)
+        self.emit(op)
+
+    def expr_TomeExpr(self, node: TomeExpr):
+        for elem in node.elements:
+            self.expression(elem)
+        self.emit(BUILD_TOME, len(node.elements))
+
+    def expr_GrimoireExpr(self, node: GrimoireExpr):
+        for key, value in node.pairs:
+            self.expression(key)
+            self.expression(value)
+        self.emit(BUILD_GRIMOIRE, len(node.pairs))
+
+    def expr_IndexExpr(self, node: IndexExpr):
+        self.expression(node.collection)
+        self.expression(node.index)
+        self.emit(INDEX)
+
+    def expr_CallExpr(self, node: CallExpr):
+        self.expression(node.callee)
+        for arg in node.arguments:
+            self.expression(arg)
+        index = self.emit(CALL_TRACED if self.traced else CALL, len(node.arguments))
+        if self.loops:
+            # Between statements the stack holds only the hunt iterators
+            height = sum(loop.has_iterator for loop in self.loops)
+            self.loops[-1].calls.append((index, self.scope_depth, height))
+
+    def expr_MemberExpr(self, node: MemberExpr):
+        self.expression(node.object)
+        self.emit(MEMBER, self.name(node.member))
+
+    def expr_InvariantExpr(self, node: InvariantExpr):
+        if node.depth < 0:
+            self.emit(PEEK_GLOBAL, self.name(node.name))
+        else:
+            self.emit_local(PEEK_LOCAL, node)
+        cached = self.emit(JUMP_IF_SET)
+        self.expression(node.expression)
+        if node.depth < 0:
+            self.emit(CACHE_GLOBAL, self.name(node.name))
+        else:
+            self.emit_local(CACHE_LOCAL, node)
+        self.patch(cached)
+
+    def expr_InlineExpr(self, node: InlineExpr):
+        for arg in node.arguments:
+            self.expression(arg)
+        self.emit(ENTER_SCOPE, len(node.params))
+        self.scope_depth += 1
+        for slot in reversed(range(len(node.params))):
+            self.emit(STORE_LOCAL, slot)
+        first = len(self.code.nodes)
+        self.expression(node.body)
+        self.code.inlined.append((first, len(self.code.nodes) - 1, node))
+        self.scope_depth -= 1
+        self.emit(EXIT_SCOPE, 1)
+
+
+# ============ Disassembler ============
+
+def disassemble(code: CodeObject) -> str:
+    """Render a code object (and the spells it creates) as readable text."""
+    lines = []
+    _disassemble_into(code, lines, set())
+    return "\n".join(lines)
+
+
+def _disassemble_into(code: CodeObject, lines: list, seen: set):
+    seen.add(id(code))
+    header = f"== {code.name}"
+    if code.declaration is not None:
+        header += f"({', '.join(code.params)}) locals={code.nlocals}"
+    lines.append(header + " ==")
+
+    nested = []
+    last_line = None
+    for pc in range(0, len(code.code), 2):
+        op, arg = code.code[pc], code.code[pc + 1]
+        line = code.nodes[pc >> 1].line
+        line_col = f"{line:>4}" if line != last_line else "    "
+        last_line = line
+
+        detail = ""
+        if op in (LOAD_CONST, CONST_VIOLATION):
+            value = code.consts[arg]
+            detail = f"({value!r})"
+        elif op == MAKE_SPELL:
+            spell = code.consts[arg]
+            detail = f"({spell.name})"
+            nested.append(spell)
+        elif op in NAME_OPS:
+            detail = f"({code.names[arg]})"
+        elif op in LOCAL_OPS:
+            depth, slot = arg >> SLOT_BITS, arg & SLOT_MASK
+            name = code.nodes[pc >> 1].name
+            detail = f"({name} @ depth {depth}, slot {slot})"
+        elif op in JUMP_OPS:
+            detail = f"(to {arg})"
+
+        lines.append(f"{line_col} {pc:>6}  {OPCODE_NAMES[op]:<16}{arg:>6} {detail}".rstrip())
+
+    for spell in nested:
+        if id(spell) not in seen:
+            lines.append("")
+            _disassemble_into(spell, lines, seen)
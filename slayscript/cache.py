@@ -0,0 +1,76 @@
+"""On-disk cache of parsed SlayScript programs.
+
+run_file keeps the AST of each script it parses in a .slayc file, by
+default in a __slaycache__ directory next to the script (like Python's
+__pycache__), and reuses it while the source is unchanged, skipping the
+lexer and parser. The AST is stored as parsed, before the Optimizer,
+Resolver and TypeInference annotate it, since their results depend on
+the run's options. The AST itself is in the binary format of serialize.py.
+
+A .slayc file starts with a header naming the cache format, the
+SlayScript version and the SHA-256 of the source it was parsed from; a
+file whose header does not match (or that fails to load) is ignored and
+rewritten. Writing is best effort: an unwritable cache directory only
+means the next run parses again.
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+from . import __version__
+from .ast_nodes import Program
+from .serialize import dump_ast, load_ast
+
+CACHE_DIR = "__slaycache__"
+SUFFIX = ".slayc"
+
+_MAGIC = b"SLAYC\x02"  # File type and cache format version
+
+
+def cache_path(filename: str, cache_dir: str = None) -> str:
+    """The .slayc file for a script: in cache_dir, or in __slaycache__ beside it.
+
+    Scripts sharing a cache_dir are told apart by a digest of their path.
+    """
+    directory, base = os.path.split(os.path.abspath(filename))
+    stem = os.path.splitext(base)[0]
+    if cache_dir is None:
+        return os.path.join(directory, CACHE_DIR, stem + SUFFIX)
+    digest = hashlib.sha256(os.path.join(directory, base).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{stem}-{digest}{SUFFIX}")
+
+
+def _header(source: str) -> bytes:
+    digest = hashlib.sha256(source.encode("utf-8")).digest()
+    return _MAGIC + __version__.encode("ascii") + b"\0" + digest
+
+
+def load_program(path: str, source: str) -> Optional[Program]:
+    """The cached AST of source, or None if path holds none for this exact source."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = _header(source)
+    if not data.startswith(header):
+        return None
+    try:
+        program = load_ast(data[len(header):])
+    except (ValueError, RecursionError):
+        return None
+    return program if isinstance(program, Program) else None
+
+
+def store_program(path: str, source: str, program: Program):
+    """Cache the freshly parsed program of source at path, if the directory is writable."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(_header(source))
+            f.write(dump_ast(program))
+        os.replace(temporary, path)
+    except OSError:
+        pass
@@ -0,0 +1,999 @@
+"""Closure compiler for SlayScript.
+
+Translates a Program AST into a tree of pre-bound Python closures, one per
+AST node. Child closures, operator implementations and error locations are
+resolved once at compile time, so running the program no longer pays for
+per-node visitor lookup or operator string comparisons.
+"""
+
+from typing import Any, Callable as PyCallable
+from .ast_nodes import (
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
+    BreakStmt, ContinueStmt, ExprStmt
+)
+from .environment import (
+    Environment, Frame, SlayFunction, Callable, TailCall, UNSET, MISSING,
+    SIGNAL_CAST, SIGNAL_BREAK, SIGNAL_CONTINUE, end_spell_signal
+)
+from .inference import TYPED_OPS
+from .streams import RangeStream, IterStream, close_iterator
+from .tracing import STATEMENT_TYPES
+from .errors import (
+    SlayScriptError, ForbiddenMagic, SlayerInterrupt, PatrolContinue,
+    UnknownIncantation, ProphecyViolation, SpellOverflow
+)
+
+# Exact types that take the arithmetic fast paths (bool deliberately excluded)
+_NUMBER_TYPES = (int, float)
+
+# Arithmetic compiled without type checks when TypeInference marked it typed
+_TYPED_ARITHMETIC = ("+", "-", "*", "/", "**")
+
+
+def _casts(statements: list) -> bool:
+    """Check whether a cast appears in statements, outside nested spells."""
+    for stmt in statements:
+        if isinstance(stmt, CastStmt):
+            return True
+        if isinstance(stmt, IfStmt):
+            if _casts(stmt.then_branch) or any(_casts(body) for _, body in stmt.elif_branches):
+                return True
+            if stmt.else_branch is not None and _casts(stmt.else_branch):
+                return True
+        elif isinstance(stmt, (WhileStmt, ForStmt)) and _casts(stmt.body):
+            return True
+    return False
+
+
+def _yields(stmt) -> bool:
+    """Check whether a yield appears in stmt, outside nested spells."""
+    if isinstance(stmt, YieldStmt):
+        return True
+    if isinstance(stmt, IfStmt):
+        bodies = [stmt.then_branch] + [body for _, body in stmt.elif_branches]
+        if stmt.else_branch is not None:
+            bodies.append(stmt.else_branch)
+        return any(_yields(inner) for body in bodies for inner in body)
+    if isinstance(stmt, (WhileStmt, ForStmt)):
+        return any(_yields(inner) for inner in stmt.body)
+    return False
+
+
+def _signals(stmt) -> bool:
+    """Check whether running stmt can leave a completion signal for its block.
+
+    Loops consume their own break and continue, so only a cast escapes them.
+    """
+    if isinstance(stmt, (CastStmt, BreakStmt, ContinueStmt)):
+        return True
+    if isinstance(stmt, IfStmt):
+        bodies = [stmt.then_branch] + [body for _, body in stmt.elif_branches]
+        if stmt.else_branch is not None:
+            bodies.append(stmt.else_branch)
+        return any(_signals(inner) for body in bodies for inner in body)
+    if isinstance(stmt, (WhileStmt, ForStmt)):
+        return _casts(stmt.body)
+    return False
+
+
+class CompiledSpell(SlayFunction):
+    """A spell whose body has been compiled to a closure."""
+
+    def __init__(self, declaration, closure, body, is_incantation: bool = False, cache=None):
+        super().__init__(declaration, closure, is_incantation, cache)
+        self.body = body
+        self.frame_size = declaration.frame_size
+
+    def call(self, interpreter, arguments: list):
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(arguments)
+            if key is not None:
+                result = self.cache.get(key)
+                if result is not MISSING:
+                    return result
+        spell, site = self, None
+        while True:
+            if spell.frame_size:
+                env = Frame(spell.closure, spell.frame_size)
+                env.slots[:len(arguments)] = arguments
+            else:
+                env = spell.closure  # No parameters or locals
+            try:
+                result = spell.body(env)
+            except SlayScriptError as error:
+                if site is not None:
+                    error.add_frame(spell.declaration.name, site.line, site.column)
+                raise
+            if interpreter.signal is not None:
+                end_spell_signal(interpreter)
+            if type(result) is not TailCall:
+                if key is not None:
+                    self.cache.put(key, result)
+                return result
+            # `cast other(...)`: run the next spell in this same call
+            spell, arguments, site = result.spell, result.arguments, result.node
+
+
+class CompiledGenerator(CompiledSpell):
+    """A compiled spell that yields; body returns a Python generator (see Compiler.compile_generator)."""
+
+    def call(self, interpreter, arguments: list):
+        if self.frame_size:
+            env = Frame(self.closure, self.frame_size)
+            env.slots[:len(arguments)] = arguments
+        else:
+            env = self.closure  # No parameters or locals
+        return IterStream(self.run(interpreter, env))
+
+    def run(self, interpreter, env):
+        yield from self.body(env)
+        if interpreter.signal is not None:
+            end_spell_signal(interpreter)
+
+    def __repr__(self):
+        return f"<generator spell {self.declaration.name}>"
+
+
+class Compiler:
+    """Compiles SlayScript AST nodes into Python closures.
+
+    Every compiled closure takes the current scope (the global Environment
+    or a block/spell Frame) and returns the node's value, mirroring the
+    tree-walking Interpreter's semantics.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def compile(self, node) -> PyCallable[[Environment], Any]:
+        """Compile an AST node into a closure."""
+        method_name = f"compile_{type(node).__name__}"
+        compiler = getattr(self, method_name, self.generic_compile)
+        return compiler(node)
+
+    def generic_compile(self, node):
+        raise ForbiddenMagic(f"No compiler for {type(node).__name__}", node.line, node.column)
+
+    def compile_tail(self, node):
+        """Compile a statement in tail position of a spell body.
+
+        A `cast` in tail position is the last thing its spell executes, so
+        its value can simply be returned as the block result without
+        signalling the enclosing blocks to stop.
+        """
+        if isinstance(node, CastStmt):
+            if node.tail_call:
+                return self.compile_tail_call(node.value)
+            if node.value is None:
+                return lambda env: None
+            return self.compile(node.value)
+        if isinstance(node, IfStmt):
+            return self.compile_IfStmt(node, tail=True)
+        return self.compile(node)
+
+    def compile_sequence(self, statements: list, tail: bool = False):
+        """Compile a list of statements into a closure returning the last value."""
+        compiled = [self.compile(stmt) for stmt in statements[:-1]]
+        if statements:
+            last = statements[-1]
+            compiled.append(self.compile_tail(last) if tail else self.compile(last))
+        compiled = tuple(compiled)
+
+        if not compiled:
+            return lambda env: None
+        if len(compiled) == 1:
+            return compiled[0]
+
+        # Only statements that can cast, break or continue need a signal
+        # check afterwards; straight-line code runs without one
+        checks = tuple(_signals(stmt) for stmt in statements)
+        if any(checks):
+            interp = self.interpreter
+            steps = tuple(zip(compiled, checks))
+
+            def checked_sequence(env):
+                result = None
+                for stmt, check in steps:
+                    result = stmt(env)
+                    if check and interp.signal is not None:
+                        return result
+                return result
+            return checked_sequence
+
+        def sequence(env):
+            result = None
+            for stmt in compiled:
+                result = stmt(env)
+            return result
+        return sequence
+
+    def compile_block(self, statements: list, size: int, tail: bool = False):
+        """Compile a list of statements that runs in its own child scope.
+
+        Blocks the Resolver elided (size 0) run in the enclosing scope.
+        """
+        body = self.compile_sequence(statements, tail)
+        if not size:
+            return body
+
+        def block(env):
+            return body(Frame(env, size))
+        return block
+
+    # ============ Statements ============
+
+    def compile_Program(self, node: Program):
+        return self.compile_sequence(node.statements)
+
+    def compile_VarDecl(self, node: VarDecl):
+        value = self.compile(node.value)
+        name, is_const, slot = node.name, node.is_const, node.slot
+
+        if self.interpreter.strict and node.type_hint is not None:
+            value = self.compile_hint_check(value, node)
+
+        if slot < 0:
+            def global_decl(env):
+                result = value(env)
+                env.define(name, result, is_const)
+                return result
+            return global_decl
+
+        def var_decl(env):
+            result = env.slots[slot] = value(env)
+            return result
+        return var_decl
+
+    def compile_hint_check(self, value, node: VarDecl):
+        """Wrap a declaration's value closure with the strict-mode type hint check."""
+        check_hint = self.interpreter.check_hint
+
+        def checked_value(env):
+            result = value(env)
+            check_hint(result, node)
+            return result
+        return checked_value
+
+    def compile_VarAssign(self, node: VarAssign):
+        value = self.compile(node.value)
+        name, line, column = node.name, node.line, node.column
+        depth, slot, fallbacks = node.depth, node.slot, node.fallbacks
+
+        if depth < 0:
+            global_env = self.interpreter.globals
+
+            def global_assign(env):
+                result = value(env)
+                global_env.assign(name, result, line, column)
+                return result
+            return global_assign
+
+        if node.is_const_target:
+            def const_assign(env):
+                value(env)
+                raise ProphecyViolation(
+                    f"Cannot modify the prophecy '{name}' - it is constant", line, column
+                )
+            return const_assign
+
+        def var_assign(env):
+            result = value(env)
+            scope = env
+            for _ in range(depth):
+                scope = scope.parent
+            if scope.slots[slot] is UNSET:
+                env.assign_at(depth, slot, result, name, fallbacks, line, column)
+            else:
+                scope.slots[slot] = result
+            return result
+        return var_assign
+
+    def compile_IndexAssign(self, node: IndexAssign):
+        collection = self.compile(node.collection)
+        index = self.compile(node.index)
+        value = self.compile(node.value)
+
+        def index_assign(env):
+            target = collection(env)
+            key = index(env)
+            result = value(env)
+            if isinstance(target, list):
+                if not isinstance(key, int):
+                    raise ForbiddenMagic("Tome index must be a rune (integer)", node.line, node.column)
+                target[key] = result
+            elif isinstance(target, dict):
+                target[key] = result
+            else:
+                raise ForbiddenMagic("Cannot index into this type", node.line, node.column)
+            return result
+        return index_assign
+
+    def compile_VarDelete(self, node: VarDelete):
+        name, line, column = node.name, node.line, node.column
+        depth, slot, fallbacks = node.depth, node.slot, node.fallbacks
+
+        if depth < 0:
+            global_env = self.interpreter.globals
+
+            def global_delete(env):
+                global_env.delete(name, line, column)
+                return None
+            return global_delete
+
+        if node.is_const_target:
+            def const_delete(env):
+                raise ProphecyViolation(
+                    f"Cannot vanquish the prophecy '{name}' - it is constant", line, column
+                )
+            return const_delete
+
+        def var_delete(env):
+            env.delete_at(depth, slot, name, fallbacks, line, column)
+            return None
+        return var_delete
+
+    def compile_SpellDecl(self, node: SpellDecl):
+        if node.is_generator:
+            body = self.compile_generator(node.body)
+            kind = CompiledGenerator
+        else:
+            body = self.compile_sequence(node.body, tail=True)
+            kind = CompiledSpell
+        name, is_incantation, slot = node.name, node.is_incantation, node.slot
+        new_cache = self.interpreter.new_cache
+
+        def spell_decl(env):
+            func = kind(node, env, body, is_incantation, new_cache(node))
+            if slot < 0:
+                env.define(name, func)
+            else:
+                env.slots[slot] = func
+            return func
+        return spell_decl
+
+    def compile_CastStmt(self, node: CastStmt):
+        interp = self.interpreter
+        if node.value is None:
+            def cast_void(env):
+                interp.signal = SIGNAL_CAST
+                return None
+            return cast_void
+
+        if node.tail_call:
+            value = self.compile_tail_call(node.value)
+        else:
+            value = self.compile(node.value)
+
+        def cast(env):
+            result = value(env)
+            interp.signal = SIGNAL_CAST
+            return result
+        return cast
+
+    def compile_IfStmt(self, node: IfStmt, tail: bool = False):
+        truthy = self.interpreter.is_truthy
+        sizes = node.branch_sizes
+        branches = [(self.compile(node.condition), self.compile_block(node.then_branch, sizes[0], tail))]
+        for i, (elif_cond, elif_body) in enumerate(node.elif_branches, 1):
+            branches.append((self.compile(elif_cond), self.compile_block(elif_body, sizes[i], tail)))
+        branches = tuple(branches)
+        else_branch = None
+        if node.else_branch is not None:
+            else_branch = self.compile_block(node.else_branch, sizes[-1], tail)
+
+        if len(branches) == 1:
+            condition, then_branch = branches[0]
+
+            def if_stmt(env):
+                test = condition(env)
+                if test is True or (test is not False and truthy(test)):
+                    return then_branch(env)
+                if else_branch is not None:
+                    return else_branch(env)
+                return None
+            return if_stmt
+
+        def if_chain(env):
+            for condition, branch in branches:
+                test = condition(env)
+                if test is True or (test is not False and truthy(test)):
+                    return branch(env)
+            if else_branch is not None:
+                return else_branch(env)
+            return None
+        return if_chain
+
+    def compile_WhileStmt(self, node: WhileStmt):
+        truthy = self.interpreter.is_truthy
+        condition = self.compile(node.condition)
+        body = self.compile_block(node.body, node.scope_size)
+        interp = self.interpreter
+        checks = any(_signals(stmt) for stmt in node.body)
+
+        def while_stmt(env):
+            result = None
+            # "patrol until" loops while the condition is false
+            while True:
+                test = condition(env)
+                if test is True or (test is not False and truthy(test)):
+                    break
+                try:
+                    value = body(env)
+                except SlayerInterrupt:
+                    break
+                except PatrolContinue:
+                    continue
+                if checks and interp.signal is not None:
+                    signal = interp.signal
+                    if signal == SIGNAL_CAST:
+                        return value
+                    interp.signal = None
+                    if signal == SIGNAL_BREAK:
+                        break
+                    continue
+                result = value
+            return result
+        return while_stmt
+
+    def compile_ForStmt(self, node: ForStmt):
+        iterable = self.compile(node.iterable)
+        body = self.compile_sequence(node.body)
+        size = node.scope_size
+        reuse_frame = node.reuse_frame
+        interp = self.interpreter
+        checks = any(_signals(stmt) for stmt in node.body)
+
+        def for_stmt(env):
+            items = iterable(env)
+            result = None
+
+            if not hasattr(items, '__iter__'):
+                raise ForbiddenMagic("Cannot hunt through non-iterable", node.line, node.column)
+
+            # See Interpreter.visit_ForStmt for when one frame can be reused
+            frame = Frame(env, size) if reuse_frame else None
+            iterator = iter(items)
+            try:
+                for item in iterator:
+                    if frame is None:
+                        loop_env = Frame(env, size)
+                    else:
+                        loop_env = frame
+                        if size > 1:
+                            loop_env.reset()
+                    loop_env.slots[0] = item
+                    try:
+                        value = body(loop_env)
+                    except SlayerInterrupt:
+                        break
+                    except PatrolContinue:
+                        continue
+                    if checks and interp.signal is not None:
+                        signal = interp.signal
+                        if signal == SIGNAL_CAST:
+                            return value
+                        interp.signal = None
+                        if signal == SIGNAL_BREAK:
+                            break
+                        continue
+                    result = value
+            finally:
+                close_iterator(iterator)
+            return result
+        return for_stmt
+
+    def compile_BreakStmt(self, node: BreakStmt):
+        interp = self.interpreter
+
+        def break_stmt(env):
+            interp.signal = SIGNAL_BREAK
+            return None
+        return break_stmt
+
+    def compile_ContinueStmt(self, node: ContinueStmt):
+        interp = self.interpreter
+
+        def continue_stmt(env):
+            interp.signal = SIGNAL_CONTINUE
+            return None
+        return continue_stmt
+
+    def compile_YieldStmt(self, node: YieldStmt):
+        # Generator bodies compile their yields with generate_YieldStmt
+        raise ForbiddenMagic("'yield' outside a generator spell", node.line, node.column)
+
+    def compile_ExprStmt(self, node: ExprStmt):
+        return self.compile(node.expression)
+
+    # ============ Expressions ============
+
+    def compile_Literal(self, node: Literal):
+        value = node.value
+        return lambda env: value
+
+    def compile_Identifier(self, node: Identifier):
+        name, line, column = node.name, node.line, node.column
+        depth, slot, fallbacks = node.depth, node.slot, node.fallbacks
+
+        if depth < 0:
+            values = self.interpreter.globals.values
+
+            def global_identifier(env):
+                if name in values:
+                    return values[name]
+                raise UnknownIncantation(f"Undefined variable '{name}'", line, column)
+            return global_identifier
+
+        # Specialize the common shallow depths so the scope walk is unrolled
+        if depth == 0:
+            def local_identifier(env):
+                value = env.slots[slot]
+                if value is UNSET:
+                    return env.get_at(0, slot, name, fallbacks, line, column)
+                return value
+            return local_identifier
+
+        if depth == 1:
+            def enclosing_identifier(env):
+                value = env.parent.slots[slot]
+                if value is UNSET:
+                    return env.get_at(1, slot, name, fallbacks, line, column)
+                return value
+            return enclosing_identifier
+
+        def identifier(env):
+            scope = env
+            for _ in range(depth):
+                scope = scope.parent
+            value = scope.slots[slot]
+            if value is UNSET:
+                return env.get_at(depth, slot, name, fallbacks, line, column)
+            return value
+        return identifier
+
+    def compile_BinaryOp(self, node: BinaryOp):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        op = node.operator
+        interp = self.interpreter
+        line, column = node.line, node.column
+
+        if node.typed and op in _TYPED_ARITHMETIC:
+            operation = TYPED_OPS[op]
+            apply_operator = interp.apply_operator
+
+            def typed_arithmetic(env):
+                a = left(env)
+                b = right(env)
+                try:
+                    return operation(a, b)
+                except (TypeError, ZeroDivisionError):
+                    # Not numbers after all (see inference): the generic rules decide
+                    return apply_operator(node, a, b)
+            return typed_arithmetic
+
+        # Arithmetic
+        if op == "+":
+            add = interp.add
+
+            def plus(env):
+                a = left(env)
+                b = right(env)
+                if type(a) in _NUMBER_TYPES and type(b) in _NUMBER_TYPES:
+                    return a + b
+                return add(a, b, node)
+            return plus
+        if op == "-":
+            check_numbers = interp.check_numbers
+
+            def minus(env):
+                a = left(env)
+                b = right(env)
+                if type(a) in _NUMBER_TYPES and type(b) in _NUMBER_TYPES:
+                    return a - b
+                return check_numbers(a, b, node) and (a - b)
+            return minus
+        if op == "*":
+            multiply = interp.multiply
+
+            def times(env):
+                return multiply(left(env), right(env), node)
+            return times
+        if op == "/":
+            check_numbers = interp.check_numbers
+
+            def divide(env):
+                a = left(env)
+                b = right(env)
+                check_numbers(a, b, node)
+                if b == 0:
+                    raise ForbiddenMagic("Division by void is forbidden", line, column)
+                return a / b
+            return divide
+        if op == "%":
+            check_numbers = interp.check_numbers
+
+            def modulo(env):
+                a = left(env)
+                b = right(env)
+                check_numbers(a, b, node)
+                return a % b
+            return modulo
+        if op == "**":
+            check_numbers = interp.check_numbers
+
+            def power(env):
+                a = left(env)
+                b = right(env)
+                check_numbers(a, b, node)
+                return a ** b
+            return power
+
+        # Comparison
+        if op == "is":
+            return lambda env: left(env) == right(env)
+        if op == "isnt":
+            return lambda env: left(env) != right(env)
+        if op == "exceeds":
+            return lambda env: left(env) > right(env)
+        if op == "under":
+            return lambda env: left(env) < right(env)
+        if op == "atleast":
+            return lambda env: left(env) >= right(env)
+        if op == "atmost":
+            return lambda env: left(env) <= right(env)
+
+        raise ForbiddenMagic(f"Unknown operator '{op}'", line, column)
+
+    def compile_LogicalOp(self, node: LogicalOp):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        truthy = self.interpreter.is_truthy
+
+        if node.operator == "and":
+            def logical_and(env):
+                return truthy(left(env)) and truthy(right(env))
+            return logical_and
+
+        def logical_or(env):
+            return truthy(left(env)) or truthy(right(env))
+        return logical_or
+
+    def compile_UnaryOp(self, node: UnaryOp):
+        operand = self.compile(node.operand)
+
+        if node.operator == "-":
+            def negate(env):
+                value = operand(env)
+                if not isinstance(value, (int, float)):
+                    raise ForbiddenMagic("Negation requires a number", node.line, node.column)
+                return -value
+            return negate
+
+        if node.operator == "not":
+            truthy = self.interpreter.is_truthy
+            return lambda env: not truthy(operand(env))
+
+        raise ForbiddenMagic(f"Unknown unary operator '{node.operator}'", node.line, node.column)
+
+    def compile_TomeExpr(self, node: TomeExpr):
+        elements = tuple(self.compile(elem) for elem in node.elements)
+        return lambda env: [elem(env) for elem in elements]
+
+    def compile_GrimoireExpr(self, node: GrimoireExpr):
+        pairs = tuple((self.compile(k), self.compile(v)) for k, v in node.pairs)
+
+        def grimoire(env):
+            result = {}
+            for key_expr, value_expr in pairs:
+                key = key_expr(env)
+                result[key] = value_expr(env)
+            return result
+        return grimoire
+
+    def compile_IndexExpr(self, node: IndexExpr):
+        collection = self.compile(node.collection)
+        index = self.compile(node.index)
+        line, column = node.line, node.column
+
+        def index_expr(env):
+            target = collection(env)
+            key = index(env)
+
+            if isinstance(target, list):
+                if not isinstance(key, int):
+                    raise ForbiddenMagic("Tome index must be a rune (integer)", line, column)
+                if key < 0 or key >= len(target):
+                    raise ForbiddenMagic(f"Tome index {key} out of range", line, column)
+                return target[key]
+
+            if isinstance(target, dict):
+                if key not in target:
+                    raise ForbiddenMagic(f"Key '{key}' not found in grimoire", line, column)
+                return target[key]
+
+            if isinstance(target, str):
+                if not isinstance(key, int):
+                    raise ForbiddenMagic("Scroll index must be a rune (integer)", line, column)
+                if key < 0 or key >= len(target):
+                    raise ForbiddenMagic(f"Scroll index {key} out of range", line, column)
+                return target[key]
+
+            if isinstance(target, RangeStream):
+                if not isinstance(key, int):
+                    raise ForbiddenMagic("Range index must be a rune (integer)", line, column)
+                if key < 0 or key >= len(target):
+                    raise ForbiddenMagic(f"Range index {key} out of range", line, column)
+                return target[key]
+
+            raise ForbiddenMagic("Cannot index into this type", line, column)
+        return index_expr
+
+    def compile_CallExpr(self, node: CallExpr):
+        callee_expr = self.compile(node.callee)
+        arg_exprs = tuple(self.compile(arg) for arg in node.arguments)
+        arg_count = len(arg_exprs)
+        interp = self.interpreter
+        line, column = node.line, node.column
+
+        def call(env):
+            callee = callee_expr(env)
+            arguments = [arg(env) for arg in arg_exprs]
+
+            if not isinstance(callee, Callable):
+                raise ForbiddenMagic("Can only invoke spells and incantations", line, column)
+
+            arity = callee.arity()
+            if arity != -1 and arg_count != arity:
+                raise ForbiddenMagic(
+                    f"Expected {arity} arguments but got {arg_count}",
+                    line, column
+                )
+
+            try:
+                result = callee.call(interp, arguments)
+            except SlayScriptError as error:
+                if isinstance(callee, SlayFunction):
+                    error.add_frame(callee.declaration.name, line, column)
+                raise
+            except RecursionError:
+                raise SpellOverflow(line, column)
+
+            # If it's an incantation, speak the result
+            if isinstance(callee, SlayFunction) and callee.is_incantation:
+                if result is not None:
+                    interp.speak(str(result))
+
+            return result
+        return call
+
+    def compile_tail_call(self, node: CallExpr):
+        """Compile the call in `cast f(...)` (see Interpreter.tail_call)."""
+        callee_expr = self.compile(node.callee)
+        arg_exprs = tuple(self.compile(arg) for arg in node.arguments)
+        arg_count = len(arg_exprs)
+        invoke = self.interpreter.invoke
+
+        def tail_call(env):
+            callee = callee_expr(env)
+            arguments = [arg(env) for arg in arg_exprs]
+            if (type(callee) is CompiledSpell and not callee.is_incantation and callee.cache is None
+                    and callee.arity() == arg_count):
+                return TailCall(callee, arguments, node)
+            return invoke(callee, arguments, node)
+        return tail_call
+
+    def compile_MemberExpr(self, node: MemberExpr):
+        obj_expr = self.compile(node.object)
+        member = node.member
+
+        def member_expr(env):
+            obj = obj_expr(env)
+            if isinstance(obj, dict) and member in obj:
+                return obj[member]
+            raise ForbiddenMagic(f"No such member '{member}'", node.line, node.column)
+        return member_expr
+
+    def compile_InvariantExpr(self, node: InvariantExpr):
+        expression = self.compile(node.expression)
+        name, depth, slot = node.name, node.depth, node.slot
+
+        if depth < 0:
+            values = self.interpreter.globals.values
+
+            def global_invariant(env):
+                value = values.get(name, UNSET)
+                if value is UNSET:
+                    value = values[name] = expression(env)
+                return value
+            return global_invariant
+
+        def invariant(env):
+            scope = env
+            for _ in range(depth):
+                scope = scope.parent
+            value = scope.slots[slot]
+            if value is UNSET:
+                value = scope.slots[slot] = expression(env)
+            return value
+        return invariant
+
+    def compile_InlineExpr(self, node: InlineExpr):
+        arg_exprs = tuple(self.compile(arg) for arg in node.arguments)
+        body = self.compile(node.body)
+        spell, line, column = node.spell, node.line, node.column
+
+        def inline(env):
+            frame = Frame(env, 0)
+            frame.slots = [arg(env) for arg in arg_exprs]
+            try:
+                return body(frame)
+            except SlayScriptError as error:
+                error.add_frame(spell, line, column)
+                raise
+        return inline
+
+    # ============ Generator Spells ============
+
+    def compile_generator(self, statements: list, size: int = 0):
+        """Compile a generator spell body, or a block in one, to a function returning a Python generator.
+
+        Statements that cannot yield compile as usual and run straight
+        through; those that can compile with the generate_* methods, which
+        mirror the statement compilers with `yield from` around their bodies.
+        """
+        steps = tuple((self.generate(stmt), True) if _yields(stmt) else (self.compile(stmt), False)
+                      for stmt in statements)
+        interp = self.interpreter
+
+        def generator_sequence(env):
+            if size:
+                env = Frame(env, size)
+            for step, suspends in steps:
+                if suspends:
+                    yield from step(env)
+                else:
+                    step(env)
+                if interp.signal is not None:
+                    return
+        return generator_sequence
+
+    def generate(self, node):
+        return getattr(self, f"generate_{type(node).__name__}")(node)
+
+    def generate_YieldStmt(self, node: YieldStmt):
+        value = self.compile(node.value)
+
+        def yield_stmt(env):
+            yield value(env)
+        return yield_stmt
+
+    def generate_IfStmt(self, node: IfStmt):
+        truthy = self.interpreter.is_truthy
+        sizes = node.branch_sizes
+        branches = [(self.compile(node.condition), self.compile_generator(node.then_branch, sizes[0]))]
+        for i, (elif_cond, elif_body) in enumerate(node.elif_branches, 1):
+            branches.append((self.compile(elif_cond), self.compile_generator(elif_body, sizes[i])))
+        branches = tuple(branches)
+        else_branch = None
+        if node.else_branch is not None:
+            else_branch = self.compile_generator(node.else_branch, sizes[-1])
+
+        def if_stmt(env):
+            for condition, branch in branches:
+                test = condition(env)
+                if test is True or (test is not False and truthy(test)):
+                    return branch(env)
+            if else_branch is not None:
+                return else_branch(env)
+            return ()
+        return if_stmt
+
+    def generate_WhileStmt(self, node: WhileStmt):
+        truthy = self.interpreter.is_truthy
+        condition = self.compile(node.condition)
+        body = self.compile_generator(node.body, node.scope_size)
+        interp = self.interpreter
+
+        def while_stmt(env):
+            while True:
+                test = condition(env)
+                if test is True or (test is not False and truthy(test)):
+                    break
+                try:
+                    yield from body(env)
+                except SlayerInterrupt:
+                    break
+                except PatrolContinue:
+                    continue
+                signal = interp.signal
+                if signal is not None:
+                    if signal == SIGNAL_CAST:
+                        return
+                    interp.signal = None
+                    if signal == SIGNAL_BREAK:
+                        break
+        return while_stmt
+
+    def generate_ForStmt(self, node: ForStmt):
+        iterable = self.compile(node.iterable)
+        body = self.compile_generator(node.body)
+        size = node.scope_size
+        reuse_frame = node.reuse_frame
+        interp = self.interpreter
+
+        def for_stmt(env):
+            items = iterable(env)
+            if not hasattr(items, '__iter__'):
+                raise ForbiddenMagic("Cannot hunt through non-iterable", node.line, node.column)
+
+            frame = Frame(env, size) if reuse_frame else None
+            iterator = iter(items)
+            try:
+                for item in iterator:
+                    if frame is None:
+                        loop_env = Frame(env, size)
+                    else:
+                        loop_env = frame
+                        if size > 1:
+                            loop_env.reset()
+                    loop_env.slots[0] = item
+                    try:
+                        yield from body(loop_env)
+                    except SlayerInterrupt:
+                        break
+                    except PatrolContinue:
+                        continue
+                    signal = interp.signal
+                    if signal is not None:
+                        if signal == SIGNAL_CAST:
+                            return
+                        interp.signal = None
+                        if signal == SIGNAL_BREAK:
+                            break
+            finally:
+                close_iterator(iterator)
+        return for_stmt
+
+
+# ============ Tracing ============
+
+class TracingCompiler(Compiler):
+    """Compiles programs for an interpreter with tracing hooks registered.
+
+    Every statement fires a line event before it runs and every call goes
+    through Interpreter.traced_invoke. Tail positions compile like any
+    other statement, so `cast f(...)` nests instead of replacing the spell.
+    """
+
+    def compile(self, node) -> PyCallable[[Environment], Any]:
+        compiled = super().compile(node)
+        if type(node) not in STATEMENT_TYPES:
+            return compiled
+        hooks = self.interpreter.hooks
+        line = node.line
+
+        def traced_statement(env):
+            hooks.line(line)
+            return compiled(env)
+        return traced_statement
+
+    def compile_tail(self, node):
+        return self.compile(node)
+
+    def compile_CallExpr(self, node: CallExpr):
+        callee_expr = self.compile(node.callee)
+        arg_exprs = tuple(self.compile(arg) for arg in node.arguments)
+        traced_invoke = self.interpreter.traced_invoke
+
+        def traced_call(env):
+            callee = callee_expr(env)
+            return traced_invoke(callee, [arg(env) for arg in arg_exprs], node)
+        return traced_call
+
+    def compile_tail_call(self, node: CallExpr):
+        return self.compile_CallExpr(node)
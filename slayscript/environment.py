@@ -1,20 +1,48 @@
 """Environment and scope management for SlayScript."""
 
-from typing import Any, Dict, Optional
-from .errors import UnknownIncantation, ProphecyViolation
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from .streams import Stream, IterStream
+from .errors import SlayScriptError, UnknownIncantation, ProphecyViolation, SlayerInterrupt, PatrolContinue
+
+
+class _Unset:
+    """Marker for a scope slot whose variable has not been conjured (or was vanquished)."""
+
+    def __repr__(self):
+        return "<unset>"
+
+
+UNSET = _Unset()
+
+# Completion signals for cast, break and continue. The executing statement
+# stores one in `interpreter.signal` and returns normally; the enclosing
+# blocks stop early and the loop or spell it belongs to consumes it.
+SIGNAL_CAST = 1
+SIGNAL_BREAK = 2
+SIGNAL_CONTINUE = 3
+
+# Traits a builtin can declare in the register_builtins table. The optimizer
+# relies on them to move calls out of loops, so only declare what is true.
+PURE = "pure"            # No side effects; returns an immutable value computed from its arguments alone
+READ_ONLY = "read_only"  # May do I/O or build new values, but never modifies its arguments
 
 
 class Environment:
-    """Manages variable scopes and symbol lookup."""
+    """Manages the global scope: variables looked up by name."""
 
     def __init__(self, parent: Optional["Environment"] = None):
         self.values: Dict[str, Any] = {}
         self.constants: set = set()  # Names that cannot be reassigned
         self.parent = parent
+        # Bumped whenever a binding may stop naming the spell or builtin it
+        # held, which invalidates the interpreter's cached callees
+        self.version = 0
 
     def define(self, name: str, value: Any, is_const: bool = False):
         """Define a new variable in the current scope."""
         self.values[name] = value
+        self.version += 1
         if is_const:
             self.constants.add(name)
 
@@ -36,6 +64,8 @@ class Environment:
             )
 
         if name in self.values:
+            if isinstance(self.values[name], Callable):
+                self.version += 1
             self.values[name] = value
             return
 
@@ -62,6 +92,7 @@ class Environment:
 
         if name in self.values:
             del self.values[name]
+            self.version += 1
             return
 
         if self.parent is not None:
@@ -96,6 +127,178 @@ class Environment:
         return name in self.values
 
 
+class Frame:
+    """A block or spell scope: a fixed number of variable slots and a parent link.
+
+    Frames hold the variables the Resolver assigned to a block or spell,
+    addressed by (depth, slot). The chain of frames always ends in the
+    global Environment, where unresolved names are looked up by name.
+    Local prophecies are checked by the Resolver, so frames need no
+    constants bookkeeping.
+    """
+
+    __slots__ = ("slots", "parent")
+
+    def __init__(self, parent, size: int):
+        self.slots: List[Any] = [UNSET] * size
+        self.parent = parent
+
+    def reset(self):
+        """Empty every slot so the frame can be reused for another loop iteration."""
+        self.slots[:] = (UNSET,) * len(self.slots)
+
+    def ancestor(self, depth: int) -> "Frame":
+        """Return the frame `depth` levels up the chain."""
+        frame = self
+        for _ in range(depth):
+            frame = frame.parent
+        return frame
+
+    def root(self) -> Environment:
+        """Return the global Environment at the end of the chain."""
+        frame = self
+        while frame.parent is not None:
+            frame = frame.parent
+        return frame
+
+    def find_fallback(self, fallbacks: tuple):
+        """Find the first shadowed binding that is set; returns (frame, slot) or (None, 0)."""
+        for depth, slot in fallbacks:
+            frame = self.ancestor(depth)
+            if frame.slots[slot] is not UNSET:
+                return frame, slot
+        return None, 0
+
+    def get_at(self, depth: int, slot: int, name: str, fallbacks: tuple = (),
+               line: int = None, column: int = None) -> Any:
+        """Get a resolved local variable, falling back to shadowed bindings and globals."""
+        value = self.ancestor(depth).slots[slot]
+        if value is not UNSET:
+            return value
+        frame, slot = self.find_fallback(fallbacks)
+        if frame is not None:
+            return frame.slots[slot]
+        return self.root().get(name, line, column)
+
+    def assign_at(self, depth: int, slot: int, value: Any, name: str, fallbacks: tuple = (),
+                  line: int = None, column: int = None):
+        """Assign a resolved local variable, falling back like get_at."""
+        frame = self.ancestor(depth)
+        if frame.slots[slot] is UNSET:
+            frame, slot = self.find_fallback(fallbacks)
+            if frame is None:
+                self.root().assign(name, value, line, column)
+                return
+        frame.slots[slot] = value
+
+    def delete_at(self, depth: int, slot: int, name: str, fallbacks: tuple = (),
+                  line: int = None, column: int = None):
+        """Delete a resolved local variable, falling back like get_at."""
+        frame = self.ancestor(depth)
+        if frame.slots[slot] is UNSET:
+            frame, slot = self.find_fallback(fallbacks)
+            if frame is None:
+                self.root().delete(name, line, column)
+                return
+        frame.slots[slot] = UNSET
+
+
+def end_spell_signal(interpreter):
+    """Consume the completion signal left by a spell body.
+
+    A cast just ends the spell with the body's result. A break or continue
+    outside any loop in the spell still escapes as SlayerInterrupt or
+    PatrolContinue, reaching a loop in the caller or failing at top level.
+    """
+    signal = interpreter.signal
+    interpreter.signal = None
+    if signal == SIGNAL_BREAK:
+        raise SlayerInterrupt()
+    if signal == SIGNAL_CONTINUE:
+        raise PatrolContinue()
+
+
+# Results a pure spell remembers by default (see SpellCache)
+DEFAULT_MEMO_SIZE = 1024
+
+# Returned by SpellCache.get when the arguments have no remembered result
+MISSING = object()
+
+
+class SpellCache:
+    """Remembered results of a pure spell, least recently used evicted first.
+
+    Entries are keyed by the argument values together with their types, so
+    1, 1.0 and charm true stay apart. Calls with tome or grimoire arguments
+    cannot be keyed and bypass the cache; tome and grimoire results are
+    never remembered, since the caller may change them, and neither are
+    streams, which may only be walked once.
+    """
+
+    __slots__ = ("entries", "max_size", "hits", "misses", "bypasses")
+
+    def __init__(self, max_size: int = DEFAULT_MEMO_SIZE):
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0  # Calls with unhashable arguments
+
+    def key(self, arguments: list):
+        """Return the cache key for arguments, or None if they cannot be keyed."""
+        key = (tuple(map(type, arguments)), tuple(arguments))
+        try:
+            hash(key)
+        except TypeError:
+            self.bypasses += 1
+            return None
+        return key
+
+    def get(self, key):
+        """Return the remembered result for key, or MISSING."""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Remember value for key, evicting the least recently used entry if full."""
+        if isinstance(value, (list, dict, Stream)):
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Counters as a grimoire for divine_memos()."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+        }
+
+
+class TailCall:
+    """A spell call in `cast` position, left for the calling spell's loop to make.
+
+    Returning it instead of calling lets SlayFunction.call run the next
+    spell in its own Python frame, so tail recursion never deepens the
+    Python stack.
+    """
+
+    __slots__ = ("spell", "arguments", "node")
+
+    def __init__(self, spell, arguments: list, node):
+        self.spell = spell
+        self.arguments = arguments
+        self.node = node  # The CallExpr, for tracebacks
+
+
 class Callable:
     """Base class for callable objects (functions)."""
 
@@ -111,37 +314,86 @@ class Callable:
 class SlayFunction(Callable):
     """A user-defined SlayScript function (spell/incantation)."""
 
-    def __init__(self, declaration, closure: Environment, is_incantation: bool = False):
+    def __init__(self, declaration, closure, is_incantation: bool = False, cache: SpellCache = None):
         self.declaration = declaration
         self.closure = closure
         self.is_incantation = is_incantation
+        self.cache = cache  # Set for pure spells
 
     def arity(self) -> int:
         return len(self.declaration.params)
 
     def call(self, interpreter, arguments: list):
-        # Create new environment for function scope
-        env = Environment(self.closure)
-
-        # Bind parameters to arguments
-        for param, arg in zip(self.declaration.params, arguments):
-            env.define(param, arg)
-
-        # Execute function body
-        return interpreter.execute_block(self.declaration.body, env)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(arguments)
+            if key is not None:
+                result = self.cache.get(key)
+                if result is not MISSING:
+                    return result
+        spell, site = self, None
+        while True:
+            size = spell.declaration.frame_size
+            if not size:
+                # No parameters or locals: run directly in the closure scope
+                frame = spell.closure
+            else:
+                # Create a new frame for the function scope
+                frame = Frame(spell.closure, size)
+
+                # Bind parameters to arguments (parameters take the first slots)
+                frame.slots[:len(arguments)] = arguments
+
+            # Execute function body
+            try:
+                result = interpreter.execute_block(spell.declaration.body, frame)
+            except SlayScriptError as error:
+                if site is not None:
+                    error.add_frame(spell.declaration.name, site.line, site.column)
+                raise
+            if interpreter.signal is not None:
+                end_spell_signal(interpreter)
+            if type(result) is not TailCall:
+                if key is not None:
+                    self.cache.put(key, result)
+                return result
+            # `cast other(...)`: run the next spell in this same call
+            spell, arguments, site = result.spell, result.arguments, result.node
 
     def __repr__(self):
         kind = "incantation" if self.is_incantation else "spell"
         return f"<{kind} {self.declaration.name}>"
 
 
+class GeneratorSpell(SlayFunction):
+    """A spell that yields: calling it returns a stream of the values it yields.
+
+    The body does not start until the stream is first iterated, and runs
+    only as far as the next yield each time the consumer asks for an item.
+    """
+
+    def call(self, interpreter, arguments: list):
+        size = self.declaration.frame_size
+        if not size:
+            frame = self.closure
+        else:
+            frame = Frame(self.closure, size)
+            frame.slots[:len(arguments)] = arguments
+        return IterStream(interpreter.generate(self, frame))
+
+    def __repr__(self):
+        return f"<generator spell {self.declaration.name}>"
+
+
 class BuiltinFunction(Callable):
     """A built-in SlayScript function."""
 
-    def __init__(self, name: str, func, arity_count: int = -1):
+    def __init__(self, name: str, func, arity_count: int = -1, traits=()):
         self.name = name
         self.func = func
         self._arity = arity_count  # -1 means variable arity
+        self.pure = PURE in traits
+        self.read_only = self.pure or READ_ONLY in traits
 
     def arity(self) -> int:
         return self._arity
@@ -8,8 +8,31 @@ class SlayScriptError(Exception):
         self.message = message
         self.line = line
         self.column = column
+        # (spell, line, column) of each spell call the error escaped from, innermost first
+        self.traceback = []
         super().__init__(self.format_message())
 
+    def add_frame(self, spell: str, line: int, column: int):
+        """Record that the error escaped from a call to spell at line/column."""
+        self.traceback.append((spell, line, column))
+
+    def format_traceback(self) -> str:
+        """Render the spell calls the error escaped from, outermost first."""
+        lines = ["Spell traceback (most recent call last):"]
+        previous, repeats = None, 0
+        for entry in reversed(self.traceback):
+            if entry == previous:
+                repeats += 1
+                continue
+            if repeats:
+                lines.append(f"  [previous line repeated {repeats} more times]")
+            previous, repeats = entry, 0
+            spell, line, column = entry
+            lines.append(f"  line {line}, column {column}: in call to {spell}")
+        if repeats:
+            lines.append(f"  [previous line repeated {repeats} more times]")
+        return "\n".join(lines)
+
     def format_message(self) -> str:
         location = ""
         if self.line is not None:
@@ -83,6 +106,20 @@ class VoiceSilenced(SlayScriptError):
         return f"Voice Silenced! {base}"
 
 
+class SpellOverflow(SlayScriptError):
+    """Spells nested deeper than the Python call stack allows."""
+
+    def __init__(self, line: int = None, column: int = None):
+        super().__init__(
+            "Spells nested too deeply for this engine (the vm engine nests as deep as memory allows)",
+            line, column
+        )
+
+    def format_message(self) -> str:
+        base = super().format_message()
+        return f"Spell Overflow! {base}"
+
+
 class SlayerInterrupt(SlayScriptError):
     """Break statement signal (internal use)."""
 
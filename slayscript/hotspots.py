@@ -0,0 +1,130 @@
+"""Line hit counters and loop timings for SlayScript programs.
+
+LineCounter listens to the line, spell_enter and spell_exit tracing hooks.
+It counts the statements run on each source line and charges the time up
+to the next event to the line that was running (its self time: lines of
+the spells it calls charge their own). A patrol or hunt loop is timed
+from its statement starting until a later line of the same spell call
+falls outside the lines of its body, so nested loops and calls made from
+the body count towards it.
+
+main.print_listing renders the counts as an annotated copy of the source.
+"""
+
+import time
+from collections import Counter
+from dataclasses import fields
+from typing import Dict, List, Tuple
+
+from .ast_nodes import ASTNode, WhileStmt, ForStmt
+
+
+def _children(node):
+    """The AST nodes directly under node, including those in bodies and elif branches."""
+    for item in fields(node):
+        value = getattr(node, item.name)
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, ASTNode):
+                yield value
+            elif isinstance(value, (list, tuple)):
+                stack.extend(reversed(value))
+
+
+def _last_line(node) -> int:
+    """The last source line spanned by node and its descendants."""
+    return max([node.line] + [_last_line(child) for child in _children(node)])
+
+
+def _loops(node, found: Dict[int, Tuple[int, int]]):
+    """Map the header line of every loop under node to the first and last line of its body."""
+    if isinstance(node, (WhileStmt, ForStmt)) and node.body:
+        found[node.line] = (node.body[0].line, _last_line(node))
+    for child in _children(node):
+        _loops(child, found)
+
+
+class LineCounter:
+    """Statement runs and self time per line, and total time per loop.
+
+    Usage: attach() to an interpreter before running the program and
+    detach() after it, then read counts, seconds and hot_loops().
+    """
+
+    def __init__(self, program):
+        self.counts: Counter = Counter()  # Line -> statements run on it
+        self.seconds: Counter = Counter()  # Line -> self time
+        self.loops: Dict[int, Tuple[int, int]] = {}  # Loop header line -> first and last body line
+        _loops(program, self.loops)
+        self.loop_seconds: Counter = Counter()  # Loop header line -> time in the loop
+        self.loop_entries: Counter = Counter()  # Loop header line -> times the loop started
+        self.calls: List[List[Tuple[int, float]]] = [[]]  # Per spell call: running loops (line, start)
+        self.callers: List[int] = []  # Line each running spell was called from
+        self.current = None  # Line being run
+        self.last = time.perf_counter()
+
+    def attach(self, interpreter):
+        for event in ("line", "spell_enter", "spell_exit"):
+            interpreter.add_hook(event, getattr(self, event))
+
+    def detach(self, interpreter):
+        """Unregister the hooks and stop the loops still running (the program ended)."""
+        for event in ("line", "spell_enter", "spell_exit"):
+            interpreter.remove_hook(event, getattr(self, event))
+        now = self.charge()
+        for loops in self.calls:
+            while loops:
+                self.end_loop(loops.pop(), now)
+        self.current = None
+
+    # ============ Hooks ============
+
+    def charge(self) -> float:
+        now = time.perf_counter()
+        if self.current is not None:
+            self.seconds[self.current] += now - self.last
+        self.last = now
+        return now
+
+    def end_loop(self, loop: Tuple[int, float], now: float):
+        line, start = loop
+        self.loop_seconds[line] += now - start
+
+    def line(self, spell: str, line: int):
+        now = self.charge()
+        self.current = line
+        self.counts[line] += 1
+        loops = self.calls[-1]
+        while loops:
+            header = loops[-1][0]
+            if header < line <= self.loops[header][1]:
+                break
+            self.end_loop(loops.pop(), now)  # Left the body (or the loop starts again)
+        if line in self.loops:
+            loops.append((line, now))
+            self.loop_entries[line] += 1
+
+    def spell_enter(self, name: str, arguments: list, line: int):
+        self.charge()
+        self.callers.append(self.current)
+        self.calls.append([])
+        self.current = None
+
+    def spell_exit(self, name: str, result):
+        now = self.charge()
+        for loop in reversed(self.calls.pop()):
+            self.end_loop(loop, now)
+        self.current = self.callers.pop()
+
+    # ============ Output ============
+
+    def hot_loops(self, limit: int = 10) -> List[str]:
+        """The loops that took longest, one line each."""
+        lines = []
+        for line, seconds in self.loop_seconds.most_common(limit):
+            runs = self.loop_entries[line]
+            iterations = self.counts[self.loops[line][0]]  # Runs of the first body line
+            lines.append(f"line {line}: {seconds * 1000:.3f} ms in {runs} run{'s' if runs != 1 else ''}, "
+                         f"{iterations} iteration{'s' if iterations != 1 else ''}")
+        return lines
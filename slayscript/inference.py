@@ -0,0 +1,344 @@
+"""Static type inference for SlayScript.
+
+A pass that runs after the Resolver. It infers the type of every variable
+binding from the values written to it: literals, `conjure x as rune ...`
+hints (trusted only in strict mode, where they are enforced), arithmetic
+on typed operands and the results of a few builtins. A binding written
+with values of different types, vanquished, or bound to a spell parameter
+has no static type.
+
+Binary operations (+, -, *, /, ** and comparisons) whose operands are both
+statically runes or potions are marked `typed`. The tree and compiled
+engines apply those with the plain Python operator, skipping the
+isinstance checks of check_numbers and add. Inference cannot see every
+runtime path (reads that fall back to a shadowed binding, globals
+transmuted by a later REPL line), so a typed operation that raises
+TypeError or ZeroDivisionError is redone by the generic rules. This is
+only sound because each Python operator either agrees with the generic
+rules or raises. `*` does not: Python repeats a tome by a rune on either
+side, while the generic rules reject `2 * tome [1]`. The typed `*`
+therefore checks for two numbers first.
+
+Types are the names type_of returns ("rune", "potion", "scroll", ...).
+"""
+
+import operator
+from typing import Any, Dict, Optional
+from .ast_nodes import (
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt, ExprStmt
+)
+
+# Exact types _typed_multiply accepts (bool left to the generic rules)
+_NUMBER_TYPES = (int, float)
+
+
+def _typed_multiply(left, right):
+    """Multiply two numbers; anything else goes back to the generic rules.
+
+    Python would also accept `2 * tome [1]`, which the generic rules reject.
+    """
+    if type(left) in _NUMBER_TYPES and type(right) in _NUMBER_TYPES:
+        return left * right
+    raise TypeError("not two numbers")
+
+
+# Operators a typed BinaryOp applies directly to its operands
+TYPED_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": _typed_multiply,
+    "/": operator.truediv,
+    "**": operator.pow,
+    "is": operator.eq,
+    "isnt": operator.ne,
+    "exceeds": operator.gt,
+    "under": operator.lt,
+    "atleast": operator.ge,
+    "atmost": operator.le,
+}
+
+# SlayScript type of each Python value type, as reported by type_of
+TYPE_NAMES = {
+    str: "scroll",
+    int: "rune",
+    float: "potion",
+    bool: "charm",
+    list: "tome",
+    dict: "grimoire",
+    type(None): "void",
+}
+
+# A binding or expression whose type is not known statically
+ANY = "any"
+
+_NUMBERS = ("rune", "potion")
+_COMPARISONS = ("is", "isnt", "exceeds", "under", "atleast", "atmost")
+
+# Result types of builtins, used while their names are not rebound by the program
+BUILTIN_RESULTS = {
+    "measure": "rune",
+    "transform_to_rune": "rune",
+    "transform_to_potion": "potion",
+    "transform_to_scroll": "scroll",
+    "random_fate": "rune",
+    "type_of": "scroll",
+    "range": "tome",
+    "stream_range": "stream",
+}
+
+
+def type_name(value: Any) -> str:
+    """The SlayScript type name of a runtime value."""
+    return TYPE_NAMES.get(type(value), "unknown")
+
+
+def join(known: Optional[str], new: Optional[str]) -> Optional[str]:
+    """Combine two types written to one binding (None = nothing written yet)."""
+    if known is None:
+        return new
+    if new is None or new == known:
+        return known
+    return ANY
+
+
+class TypeInference:
+    """Marks BinaryOp nodes whose operands are statically runes or potions."""
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict  # Type hints are enforced, so they can be trusted
+        self.types: Dict[Any, str] = {}  # Binding key -> type of the values written so far
+        self.written = set()  # Keys of bindings the program writes to
+        self.scopes = []  # Keys of the runtime scopes open at this point
+        self.operations = 0  # BinaryOp nodes seen by the final walk
+        self.specialized = 0  # ... of which marked typed
+
+    def infer(self, program: Program) -> Program:
+        """Annotate a resolved program in place and return it.
+
+        The first walk only collects which bindings are written; reads of
+        anything else (builtins, names from earlier REPL lines) are ANY.
+        Further walks join the written types until nothing changes, which
+        takes a few walks since a type can only move up to ANY.
+        """
+        self.walk(program)
+        self.written = set(self.types)
+        self.types = {}
+        while True:
+            before = dict(self.types)
+            self.walk(program)
+            if self.types == before:
+                break
+        program.inferred = True
+        return program
+
+    def walk(self, program: Program):
+        self.scopes = []
+        self.operations = 0
+        self.specialized = 0
+        for stmt in program.statements:
+            self.statement(stmt)
+
+    def summary(self) -> str:
+        """One line for --debug."""
+        return f"{self.specialized} of {self.operations} binary operations statically typed"
+
+    # ============ Bindings ============
+
+    def key(self, depth: int, slot: int, name: str):
+        """Key of the binding a resolved (depth, slot) or global name refers to."""
+        if depth < 0:
+            return name
+        return (self.scopes[-1 - depth], slot)
+
+    def write(self, key, type_: Optional[str]):
+        self.types[key] = join(self.types.get(key), type_)
+
+    def read(self, key) -> Optional[str]:
+        if key not in self.written:
+            return ANY
+        return self.types.get(key)
+
+    def block(self, statements: list, scope, size: int):
+        """Walk a block body, in a scope of its own unless the Resolver elided it."""
+        if size:
+            self.scopes.append(scope)
+        for stmt in statements:
+            self.statement(stmt)
+        if size:
+            self.scopes.pop()
+
+    # ============ Statements ============
+
+    def statement(self, node):
+        method = getattr(self, f"stmt_{type(node).__name__}", None)
+        if method is not None:
+            method(node)
+
+    def stmt_ExprStmt(self, node: ExprStmt):
+        self.expression(node.expression)
+
+    def stmt_VarDecl(self, node: VarDecl):
+        type_ = self.expression(node.value)
+        if self.strict and node.type_hint is not None:
+            type_ = node.type_hint
+        self.write(self.key(0 if node.slot >= 0 else -1, node.slot, node.name), type_)
+
+    def stmt_VarAssign(self, node: VarAssign):
+        type_ = self.expression(node.value)
+        self.write(self.key(node.depth, node.slot, node.name), type_)
+
+    def stmt_IndexAssign(self, node: IndexAssign):
+        self.expression(node.collection)
+        self.expression(node.index)
+        self.expression(node.value)
+
+    def stmt_VarDelete(self, node: VarDelete):
+        self.write(self.key(node.depth, node.slot, node.name), ANY)
+
+    def stmt_SpellDecl(self, node: SpellDecl):
+        self.write(self.key(0 if node.slot >= 0 else -1, node.slot, node.name), ANY)
+        scope = (id(node), 0)
+        if node.frame_size:
+            self.scopes.append(scope)
+            for slot in range(len(node.params)):
+                self.write((scope, slot), ANY)
+        for stmt in node.body:
+            self.statement(stmt)
+        if node.frame_size:
+            self.scopes.pop()
+
+    def stmt_CastStmt(self, node: CastStmt):
+        if node.value is not None:
+            self.expression(node.value)
+
+    def stmt_YieldStmt(self, node: YieldStmt):
+        self.expression(node.value)
+
+    def stmt_IfStmt(self, node: IfStmt):
+        sizes = node.branch_sizes
+        self.expression(node.condition)
+        self.block(node.then_branch, (id(node), 0), sizes[0])
+        for i, (elif_cond, elif_body) in enumerate(node.elif_branches, 1):
+            self.expression(elif_cond)
+            self.block(elif_body, (id(node), i), sizes[i])
+        if node.else_branch is not None:
+            self.block(node.else_branch, (id(node), len(sizes) - 1), sizes[-1])
+
+    def stmt_WhileStmt(self, node: WhileStmt):
+        self.expression(node.condition)
+        self.block(node.body, (id(node), 0), node.scope_size)
+
+    def stmt_ForStmt(self, node: ForStmt):
+        iterable = node.iterable
+        item = ANY
+        # hunt each i in range(...) (or stream_range(...)) always yields runes
+        if (isinstance(iterable, CallExpr) and isinstance(iterable.callee, Identifier)
+                and iterable.callee.depth < 0 and iterable.callee.name in ("range", "stream_range")
+                and iterable.callee.name not in self.written):
+            item = "rune"
+        self.expression(iterable)
+        scope = (id(node), 0)
+        self.scopes.append(scope)
+        self.write((scope, 0), item)
+        for stmt in node.body:
+            self.statement(stmt)
+        self.scopes.pop()
+
+    # ============ Expressions ============
+
+    def expression(self, node) -> Optional[str]:
+        """Infer the type of an expression (None while its inputs have no writes yet)."""
+        method = getattr(self, f"expr_{type(node).__name__}", None)
+        if method is None:
+            return ANY
+        return method(node)
+
+    def expr_Literal(self, node: Literal) -> str:
+        return type_name(node.value)
+
+    def expr_Identifier(self, node: Identifier) -> Optional[str]:
+        return self.read(self.key(node.depth, node.slot, node.name))
+
+    def expr_BinaryOp(self, node: BinaryOp) -> Optional[str]:
+        left = self.expression(node.left)
+        right = self.expression(node.right)
+        op = node.operator
+        node.typed = op in TYPED_OPS and left in _NUMBERS and right in _NUMBERS
+        self.operations += 1
+        self.specialized += node.typed
+
+        if op in _COMPARISONS:
+            return "charm"
+        if left is None or right is None:
+            return None
+        if left in _NUMBERS and right in _NUMBERS:
+            if op == "/":
+                return "potion"
+            if op == "**":
+                return ANY  # Negative exponents give potions, fractional ones of negatives worse
+            if op in ("+", "-", "*", "%"):
+                return "rune" if left == right == "rune" else "potion"
+            return ANY
+        if op == "+" and "scroll" in (left, right):
+            return "scroll"
+        if op == "+" and left == right == "tome":
+            return "tome"
+        return ANY
+
+    def expr_LogicalOp(self, node: LogicalOp) -> str:
+        self.expression(node.left)
+        self.expression(node.right)
+        return "charm"
+
+    def expr_UnaryOp(self, node: UnaryOp) -> Optional[str]:
+        operand = self.expression(node.operand)
+        if node.operator == "not":
+            return "charm"
+        if operand is None or operand in _NUMBERS:
+            return operand
+        return ANY
+
+    def expr_TomeExpr(self, node: TomeExpr) -> str:
+        for elem in node.elements:
+            self.expression(elem)
+        return "tome"
+
+    def expr_GrimoireExpr(self, node: GrimoireExpr) -> str:
+        for key, value in node.pairs:
+            self.expression(key)
+            self.expression(value)
+        return "grimoire"
+
+    def expr_IndexExpr(self, node: IndexExpr) -> str:
+        self.expression(node.collection)
+        self.expression(node.index)
+        return ANY
+
+    def expr_CallExpr(self, node: CallExpr) -> str:
+        self.expression(node.callee)
+        for arg in node.arguments:
+            self.expression(arg)
+        callee = node.callee
+        if isinstance(callee, Identifier) and callee.depth < 0 and callee.name not in self.written:
+            return BUILTIN_RESULTS.get(callee.name, ANY)
+        return ANY
+
+    def expr_MemberExpr(self, node: MemberExpr) -> str:
+        self.expression(node.object)
+        return ANY
+
+    def expr_InvariantExpr(self, node: InvariantExpr) -> Optional[str]:
+        return self.expression(node.expression)
+
+    def expr_InlineExpr(self, node: InlineExpr) -> Optional[str]:
+        types = [self.expression(arg) for arg in node.arguments]
+        scope = (id(node), 0)
+        self.scopes.append(scope)
+        for slot, type_ in enumerate(types):
+            self.write((scope, slot), type_)
+        result = self.expression(node.body)
+        self.scopes.pop()
+        return result
@@ -1,34 +1,229 @@
 """AST interpreter for SlayScript."""
 
+import operator
+import time
 from typing import Any, List
 from .ast_nodes import (
-    Program, Literal, Identifier, BinaryOp, UnaryOp,
-    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr,
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
     VarDecl, VarAssign, IndexAssign, VarDelete,
-    SpellDecl, CastStmt, IfStmt, WhileStmt, ForStmt,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
     BreakStmt, ContinueStmt, ExprStmt
 )
-from .environment import Environment, SlayFunction, Callable
+from .environment import (
+    Environment, Frame, SlayFunction, GeneratorSpell, BuiltinFunction, Callable, TailCall, SpellCache, UNSET,
+    DEFAULT_MEMO_SIZE, SIGNAL_CAST, SIGNAL_BREAK, SIGNAL_CONTINUE, end_spell_signal
+)
+from .resolver import Resolver
+from .streams import RangeStream, close_iterator
+from .inference import TypeInference, TYPED_OPS, type_name
+from .optimizer import Optimizer, DEFAULT_INLINE_SIZE
+from .compiler import Compiler, TracingCompiler
+from .bytecode import BytecodeCompiler
+from .vm import VM
+from .tracing import Hooks, STATEMENT_TYPES
 from .errors import (
-    ForbiddenMagic, SlayerInterrupt, PatrolContinue, SpellReturn,
-    UnknownIncantation
+    SlayScriptError, ForbiddenMagic, SlayerInterrupt, PatrolContinue, SpellReturn,
+    UnknownIncantation, ProphecyViolation, SpellOverflow
 )
 
 
+# Execution engines selectable via Interpreter(mode=...)
+ENGINES = ("tree", "compiled", "vm")
+
+# Operators a BinaryOp node specializes once both operands are runes or
+# potions. Keyed on exact types, so charms (bools) stay on the generic path.
+_NUMBER_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "is": operator.eq,
+    "isnt": operator.ne,
+    "exceeds": operator.gt,
+    "under": operator.lt,
+    "atleast": operator.ge,
+    "atmost": operator.le,
+}
+_NUMBER_TYPES = (int, float)
+
+
+class CacheStats:
+    """Hit and miss counters of the tree interpreter's inline caches."""
+
+    __slots__ = ("call_hits", "call_misses", "op_hits", "op_misses", "op_deopts")
+
+    def __init__(self):
+        self.call_hits = 0
+        self.call_misses = 0  # Calls that looked the callee up
+        self.op_hits = 0
+        self.op_misses = 0  # Binary operations on the generic path
+        self.op_deopts = 0  # Specialized operations whose operand types changed
+
+    def report(self) -> List[str]:
+        """One line per cache, for --debug."""
+        return [
+            f"calls: {self.call_hits} hits, {self.call_misses} misses "
+            f"({_rate(self.call_hits, self.call_misses)})",
+            f"binary ops: {self.op_hits} hits, {self.op_misses} misses, {self.op_deopts} deopts "
+            f"({_rate(self.op_hits, self.op_misses)})",
+        ]
+
+
+def _rate(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{100 * hits / total:.1f}% hit rate" if total else "unused"
+
+
 class Interpreter:
     """Evaluates SlayScript AST."""
 
-    def __init__(self):
+    def __init__(self, mode: str = "tree", optimize: bool = False,
+                 inline_size: int = DEFAULT_INLINE_SIZE, memo_size: int = DEFAULT_MEMO_SIZE,
+                 strict: bool = False):
+        if mode not in ENGINES:
+            raise ValueError(f"Unknown execution engine '{mode}' (expected one of: {', '.join(ENGINES)})")
+        self.mode = mode
+        self.optimize = optimize  # Run the Optimizer on programs before resolving them
+        self.inline_size = inline_size  # Largest spell body the Optimizer inlines
+        self.memo_size = memo_size  # Results each pure spell remembers (0 = none)
+        self.strict = strict  # Declarations must match their type hints
+        self.spell_caches = {}  # Spell name -> SpellCache of its latest pure declaration
         self.globals = Environment()
         self.environment = self.globals
+        self.signal = None  # Pending cast/break/continue (see environment.SIGNAL_*)
         self.tts_engine = None  # Lazy init for TTS
+        self.compiler = None  # Lazy init for compiled mode
+        self.vm = None  # Lazy init for vm mode
+        self.cache_stats = CacheStats()
+        self.hooks = Hooks()
+        self.tracing = False  # Hooks are registered and instrumented code is in use
+        self.metrics = None  # BuiltinMetrics collecting for divine_metrics(), if attached
+        self.memory_profiler = None  # MemoryProfiler recording memory_snapshot(), if attached
 
     def interpret(self, program: Program) -> Any:
         """Interpret a program."""
-        result = None
-        for statement in program.statements:
-            result = self.execute(statement)
-        return result
+        if self.optimize and not program.optimized:
+            Optimizer(self.globals, self.inline_size).optimize(program)
+        if not program.resolved:
+            Resolver().resolve(program)
+        if not program.inferred:
+            TypeInference(self.strict).infer(program)
+
+        try:
+            if self.mode == "compiled":
+                if self.compiler is None:
+                    self.compiler = TracingCompiler(self) if self.tracing else Compiler(self)
+                result = self.compiler.compile(program)(self.environment)
+                if self.signal is not None:
+                    self.raise_signal(result)
+                return result
+            if self.mode == "vm":
+                if self.vm is None:
+                    self.vm = VM(self)
+                return self.vm.execute(BytecodeCompiler(self.strict, self.tracing).compile_program(program))
+
+            result = None
+            for statement in program.statements:
+                result = self.execute(statement)
+                if self.signal is not None:
+                    self.raise_signal(result)
+            return result
+        except SlayScriptError as error:
+            if self.tracing:
+                self.hooks.error(error)
+            raise
+
+    # ============ Tracing Hooks ============
+
+    def add_hook(self, event: str, callback):
+        """Call callback on every event from now on (see tracing.HOOK_EVENTS)."""
+        self.hooks.add(event, callback)
+        self.update_tracing()
+
+    def remove_hook(self, event: str, callback):
+        """Stop calling a callback registered with add_hook."""
+        self.hooks.remove(event, callback)
+        self.update_tracing()
+
+    def update_tracing(self):
+        """Swap instrumented code in while any hook is registered, and out after.
+
+        The tree engine's execute is shadowed on the instance, so untraced
+        runs never look at the hooks. The compiled and vm engines pick
+        their compiler per program: spells declared before the switch keep
+        the code they were compiled to.
+        """
+        tracing = bool(self.hooks)
+        if tracing == self.tracing:
+            return
+        self.tracing = tracing
+        if tracing:
+            self.execute = self.traced_execute
+        else:
+            del self.execute
+        self.compiler = None
+
+    def traced_execute(self, node) -> Any:
+        """execute() while hooks are registered: fire line events, trace every call."""
+        kind = type(node)
+        if kind in STATEMENT_TYPES:
+            self.hooks.line(node.line)
+            if kind is CastStmt and node.tail_call:
+                # Nest the call so the spell it runs gets its own events
+                value = self.evaluate(node.value)
+                self.signal = SIGNAL_CAST
+                return value
+        elif kind is CallExpr:
+            callee = self.evaluate(node.callee)
+            arguments = [self.evaluate(arg) for arg in node.arguments]
+            return self.traced_invoke(callee, arguments, node)
+        return getattr(self, f"visit_{kind.__name__}", self.generic_visit)(node)
+
+    def traced_invoke(self, callee, arguments: list, node: CallExpr) -> Any:
+        """invoke() firing spell_enter/spell_exit or builtin events around the call."""
+        hooks = self.hooks
+        if isinstance(callee, SlayFunction):
+            name = callee.declaration.name
+            hooks.spell_enter(name, arguments, node.line)
+            result = None
+            try:
+                result = self.invoke(callee, arguments, node)
+            finally:
+                hooks.spell_exit(name, result)
+            return result
+        if isinstance(callee, BuiltinFunction):
+            result = error = None
+            start = time.perf_counter()
+            try:
+                result = self.invoke(callee, arguments, node)
+            except Exception as raised:
+                error = raised
+                raise
+            finally:
+                hooks.builtin(callee.name, arguments, result, time.perf_counter() - start, error)
+            return result
+        return self.invoke(callee, arguments, node)
+
+    def new_cache(self, declaration: SpellDecl):
+        """Create the result cache for a spell being declared (None unless it is pure).
+
+        Generator spells return a fresh single-pass stream per call, so they
+        are never memoized.
+        """
+        if not declaration.is_pure or declaration.is_generator or self.memo_size <= 0:
+            return None
+        cache = SpellCache(self.memo_size)
+        self.spell_caches[declaration.name] = cache
+        return cache
+
+    def raise_signal(self, value):
+        """Turn a cast, break or continue that reached the top level into its error."""
+        signal, self.signal = self.signal, None
+        if signal == SIGNAL_BREAK:
+            raise SlayerInterrupt()
+        if signal == SIGNAL_CONTINUE:
+            raise PatrolContinue()
+        raise SpellReturn(value)
 
     def execute(self, node) -> Any:
         """Execute a single AST node."""
@@ -39,14 +234,16 @@ class Interpreter:
     def generic_visit(self, node):
         raise ForbiddenMagic(f"No visitor for {type(node).__name__}", node.line, node.column)
 
-    def execute_block(self, statements: List, env: Environment) -> Any:
-        """Execute a block of statements in a given environment."""
+    def execute_block(self, statements: List, env: Frame) -> Any:
+        """Execute a block of statements in a given frame."""
         previous = self.environment
         result = None
         try:
             self.environment = env
             for stmt in statements:
                 result = self.execute(stmt)
+                if self.signal is not None:
+                    break
         finally:
             self.environment = previous
         return result
@@ -57,16 +254,32 @@ class Interpreter:
         result = None
         for stmt in node.statements:
             result = self.execute(stmt)
+            if self.signal is not None:
+                break
         return result
 
     def visit_VarDecl(self, node: VarDecl) -> Any:
         value = self.evaluate(node.value)
-        self.environment.define(node.name, value, is_const=node.is_const)
+        if self.strict and node.type_hint is not None:
+            self.check_hint(value, node)
+        if node.slot < 0:
+            self.environment.define(node.name, value, is_const=node.is_const)
+        else:
+            self.environment.slots[node.slot] = value
         return value
 
     def visit_VarAssign(self, node: VarAssign) -> Any:
         value = self.evaluate(node.value)
-        self.environment.assign(node.name, value, node.line, node.column)
+        if node.depth < 0:
+            self.globals.assign(node.name, value, node.line, node.column)
+        elif node.is_const_target:
+            raise ProphecyViolation(
+                f"Cannot modify the prophecy '{node.name}' - it is constant",
+                node.line, node.column
+            )
+        else:
+            self.environment.assign_at(node.depth, node.slot, value, node.name,
+                                       node.fallbacks, node.line, node.column)
         return value
 
     def visit_IndexAssign(self, node: IndexAssign) -> Any:
@@ -86,43 +299,96 @@ class Interpreter:
         return value
 
     def visit_VarDelete(self, node: VarDelete) -> Any:
-        self.environment.delete(node.name, node.line, node.column)
+        if node.depth < 0:
+            self.globals.delete(node.name, node.line, node.column)
+        elif node.is_const_target:
+            raise ProphecyViolation(
+                f"Cannot vanquish the prophecy '{node.name}' - it is constant",
+                node.line, node.column
+            )
+        else:
+            self.environment.delete_at(node.depth, node.slot, node.name,
+                                       node.fallbacks, node.line, node.column)
         return None
 
     def visit_SpellDecl(self, node: SpellDecl) -> Any:
-        func = SlayFunction(node, self.environment, is_incantation=node.is_incantation)
-        self.environment.define(node.name, func)
+        kind = GeneratorSpell if node.is_generator else SlayFunction
+        func = kind(node, self.environment, node.is_incantation, self.new_cache(node))
+        if node.slot < 0:
+            self.environment.define(node.name, func)
+        else:
+            self.environment.slots[node.slot] = func
         return func
 
     def visit_CastStmt(self, node: CastStmt) -> Any:
         value = None
-        if node.value is not None:
+        if node.tail_call:
+            value = self.tail_call(node.value)
+        elif node.value is not None:
             value = self.evaluate(node.value)
-        raise SpellReturn(value)
+        self.signal = SIGNAL_CAST
+        return value
+
+    def tail_call(self, node: CallExpr) -> Any:
+        """Evaluate the call in `cast f(...)`.
+
+        A call to a plain (not incantation or pure) spell is returned as a TailCall for the calling
+        spell's SlayFunction.call to make, so it does not nest.
+        """
+        callee = self.evaluate(node.callee)
+        arguments = [self.evaluate(arg) for arg in node.arguments]
+        if (type(callee) is SlayFunction and not callee.is_incantation and callee.cache is None
+                and callee.arity() == len(arguments)):
+            return TailCall(callee, arguments, node)
+        return self.invoke(callee, arguments, node)
+
+    def block_scope(self, size: int):
+        """Scope for a block body: a fresh frame, or the current scope if the block declares nothing."""
+        if size:
+            return Frame(self.environment, size)
+        return self.environment
 
     def visit_IfStmt(self, node: IfStmt) -> Any:
+        sizes = node.branch_sizes
         if self.is_truthy(self.evaluate(node.condition)):
-            return self.execute_block(node.then_branch, Environment(self.environment))
+            return self.execute_block(node.then_branch, self.block_scope(sizes[0]))
 
-        for elif_cond, elif_body in node.elif_branches:
+        for i, (elif_cond, elif_body) in enumerate(node.elif_branches, 1):
             if self.is_truthy(self.evaluate(elif_cond)):
-                return self.execute_block(elif_body, Environment(self.environment))
+                return self.execute_block(elif_body, self.block_scope(sizes[i]))
 
         if node.else_branch is not None:
-            return self.execute_block(node.else_branch, Environment(self.environment))
+            return self.execute_block(node.else_branch, self.block_scope(sizes[-1]))
 
         return None
 
     def visit_WhileStmt(self, node: WhileStmt) -> Any:
         result = None
+        size = node.scope_size
         # Note: "patrol until" means "while NOT condition" - loop while condition is false
         while not self.is_truthy(self.evaluate(node.condition)):
             try:
-                result = self.execute_block(node.body, Environment(self.environment))
+                if size:
+                    value = self.execute_block(node.body, Frame(self.environment, size))
+                else:
+                    value = None
+                    for stmt in node.body:
+                        value = self.execute(stmt)
+                        if self.signal is not None:
+                            break
             except SlayerInterrupt:
                 break
             except PatrolContinue:
                 continue
+            signal = self.signal
+            if signal is not None:
+                if signal == SIGNAL_CAST:
+                    return value
+                self.signal = None
+                if signal == SIGNAL_BREAK:
+                    break
+                continue
+            result = value
         return result
 
     def visit_ForStmt(self, node: ForStmt) -> Any:
@@ -132,27 +398,169 @@ class Interpreter:
         if not hasattr(iterable, '__iter__'):
             raise ForbiddenMagic("Cannot hunt through non-iterable", node.line, node.column)
 
-        for item in iterable:
-            env = Environment(self.environment)
-            env.define(node.variable, item)
-            try:
-                result = self.execute_block(node.body, env)
-            except SlayerInterrupt:
-                break
-            except PatrolContinue:
-                continue
+        # Without spells in the body no closure can keep an iteration's
+        # frame alive, so a single frame is emptied and reused
+        frame = Frame(self.environment, node.scope_size) if node.reuse_frame else None
+
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if frame is None:
+                    env = Frame(self.environment, node.scope_size)
+                else:
+                    env = frame
+                    if node.scope_size > 1:
+                        env.reset()
+                env.slots[0] = item
+                try:
+                    value = self.execute_block(node.body, env)
+                except SlayerInterrupt:
+                    break
+                except PatrolContinue:
+                    continue
+                signal = self.signal
+                if signal is not None:
+                    if signal == SIGNAL_CAST:
+                        return value
+                    self.signal = None
+                    if signal == SIGNAL_BREAK:
+                        break
+                    continue
+                result = value
+        finally:
+            # Leaving early releases the stream's producer right away
+            close_iterator(iterator)
 
         return result
 
     def visit_BreakStmt(self, node: BreakStmt) -> Any:
-        raise SlayerInterrupt()
+        self.signal = SIGNAL_BREAK
+        return None
 
     def visit_ContinueStmt(self, node: ContinueStmt) -> Any:
-        raise PatrolContinue()
+        self.signal = SIGNAL_CONTINUE
+        return None
 
     def visit_ExprStmt(self, node: ExprStmt) -> Any:
         return self.evaluate(node.expression)
 
+    def visit_YieldStmt(self, node: YieldStmt) -> Any:
+        # Only reachable through execute(); generate() runs generator bodies
+        raise ForbiddenMagic("'yield' outside a generator spell", node.line, node.column)
+
+    # ============ Generator Spells ============
+
+    def generate(self, spell: GeneratorSpell, frame: Frame):
+        """Run a generator spell's body lazily, yielding each value it yields.
+
+        The gen_* visitors mirror the statement visitors for the statements
+        a yield can sit in; everything else runs through execute(). While
+        the body is suspended the consumer's scope is current, so the body's
+        own scope is swapped in and out around each step.
+        """
+        steps = self.gen_block(spell.declaration.body, frame)
+        current = frame
+        try:
+            while True:
+                previous, self.environment = self.environment, current
+                try:
+                    value = next(steps)
+                except StopIteration:
+                    break
+                finally:
+                    current, self.environment = self.environment, previous
+                yield value
+        finally:
+            # Closing runs the body's cleanup (closing its own hunt loops'
+            # streams), which must not disturb the consumer's scope
+            previous = self.environment
+            steps.close()
+            self.environment = previous
+        if self.signal is not None:
+            end_spell_signal(self)
+
+    def gen_statement(self, node):
+        method = getattr(self, f"gen_{type(node).__name__}", None)
+        if method is None:
+            self.execute(node)
+            return ()
+        return method(node)
+
+    def gen_block(self, statements: List, env):
+        previous = self.environment
+        self.environment = env
+        try:
+            for stmt in statements:
+                yield from self.gen_statement(stmt)
+                if self.signal is not None:
+                    break
+        finally:
+            self.environment = previous
+
+    def gen_YieldStmt(self, node: YieldStmt):
+        yield self.evaluate(node.value)
+
+    def gen_IfStmt(self, node: IfStmt):
+        sizes = node.branch_sizes
+        if self.is_truthy(self.evaluate(node.condition)):
+            return self.gen_block(node.then_branch, self.block_scope(sizes[0]))
+        for i, (elif_cond, elif_body) in enumerate(node.elif_branches, 1):
+            if self.is_truthy(self.evaluate(elif_cond)):
+                return self.gen_block(elif_body, self.block_scope(sizes[i]))
+        if node.else_branch is not None:
+            return self.gen_block(node.else_branch, self.block_scope(sizes[-1]))
+        return ()
+
+    def gen_WhileStmt(self, node: WhileStmt):
+        while not self.is_truthy(self.evaluate(node.condition)):
+            try:
+                yield from self.gen_block(node.body, self.block_scope(node.scope_size))
+            except SlayerInterrupt:
+                break
+            except PatrolContinue:
+                continue
+            signal = self.signal
+            if signal is not None:
+                if signal == SIGNAL_CAST:
+                    return
+                self.signal = None
+                if signal == SIGNAL_BREAK:
+                    break
+
+    def gen_ForStmt(self, node: ForStmt):
+        iterable = self.evaluate(node.iterable)
+        if not hasattr(iterable, '__iter__'):
+            raise ForbiddenMagic("Cannot hunt through non-iterable", node.line, node.column)
+
+        # A frame reused across a suspension is still safe: nothing outside
+        # the body can reach it without a spell declared inside the loop
+        frame = Frame(self.environment, node.scope_size) if node.reuse_frame else None
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if frame is None:
+                    env = Frame(self.environment, node.scope_size)
+                else:
+                    env = frame
+                    if node.scope_size > 1:
+                        env.reset()
+                env.slots[0] = item
+                try:
+                    yield from self.gen_block(node.body, env)
+                except SlayerInterrupt:
+                    break
+                except PatrolContinue:
+                    continue
+                signal = self.signal
+                if signal is not None:
+                    if signal == SIGNAL_CAST:
+                        return
+                    self.signal = None
+                    if signal == SIGNAL_BREAK:
+                        break
+        finally:
+            close_iterator(iterator)
+
     # ============ Expression Visitors ============
 
     def evaluate(self, node) -> Any:
@@ -163,12 +571,51 @@ class Interpreter:
         return node.value
 
     def visit_Identifier(self, node: Identifier) -> Any:
-        return self.environment.get(node.name, node.line, node.column)
+        depth = node.depth
+        if depth < 0:
+            return self.globals.get(node.name, node.line, node.column)
+        env = self.environment
+        while depth:
+            env = env.parent
+            depth -= 1
+        value = env.slots[node.slot]
+        if value is UNSET:
+            return self.environment.get_at(node.depth, node.slot, node.name,
+                                           node.fallbacks, node.line, node.column)
+        return value
 
     def visit_BinaryOp(self, node: BinaryOp) -> Any:
         left = self.evaluate(node.left)
         right = self.evaluate(node.right)
 
+        if node.typed:
+            try:
+                return TYPED_OPS[node.operator](left, right)
+            except (TypeError, ZeroDivisionError):
+                # Not numbers after all (see inference): the generic rules decide
+                return self.apply_operator(node, left, right)
+
+        spec = node.spec
+        if spec is not None:
+            if type(left) is spec[0] and type(right) is spec[1]:
+                self.cache_stats.op_hits += 1
+                return spec[2](left, right)
+            # Operand types changed: back to the generic path, which
+            # specializes again if the new types allow it
+            node.spec = None
+            self.cache_stats.op_deopts += 1
+        return self.binary_op(node, left, right)
+
+    def binary_op(self, node: BinaryOp, left, right) -> Any:
+        """Apply node's operator to evaluated operands, specializing node if they are numbers."""
+        self.cache_stats.op_misses += 1
+        op = node.operator
+        if op in _NUMBER_OPS and type(left) in _NUMBER_TYPES and type(right) in _NUMBER_TYPES:
+            node.spec = (type(left), type(right), _NUMBER_OPS[op])
+        return self.apply_operator(node, left, right)
+
+    def apply_operator(self, node: BinaryOp, left, right) -> Any:
+        """Apply node's operator to evaluated operands with full type checks."""
         op = node.operator
 
         # Arithmetic
@@ -204,14 +651,17 @@ class Interpreter:
         if op == "atmost":
             return left <= right
 
-        # Logical
-        if op == "and":
-            return self.is_truthy(left) and self.is_truthy(right)
-        if op == "or":
-            return self.is_truthy(left) or self.is_truthy(right)
-
         raise ForbiddenMagic(f"Unknown operator '{op}'", node.line, node.column)
 
+    def visit_LogicalOp(self, node: LogicalOp) -> Any:
+        left = self.is_truthy(self.evaluate(node.left))
+        if node.operator == "and":
+            if not left:
+                return False
+        elif left:
+            return True
+        return self.is_truthy(self.evaluate(node.right))
+
     def visit_UnaryOp(self, node: UnaryOp) -> Any:
         operand = self.evaluate(node.operand)
 
@@ -259,12 +709,51 @@ class Interpreter:
                 raise ForbiddenMagic(f"Scroll index {index} out of range", node.line, node.column)
             return collection[index]
 
+        if isinstance(collection, RangeStream):
+            if not isinstance(index, int):
+                raise ForbiddenMagic("Range index must be a rune (integer)", node.line, node.column)
+            if index < 0 or index >= len(collection):
+                raise ForbiddenMagic(f"Range index {index} out of range", node.line, node.column)
+            return collection[index]
+
         raise ForbiddenMagic("Cannot index into this type", node.line, node.column)
 
     def visit_CallExpr(self, node: CallExpr) -> Any:
-        callee = self.evaluate(node.callee)
+        cache = node.callee_cache
+        globals_env = self.globals
+        if cache is None or cache[0] is not globals_env or cache[1] != globals_env.version:
+            return self.call_uncached(node)
+
+        # The global callee is still bound and its arity was checked when cached
+        self.cache_stats.call_hits += 1
+        callee = cache[2]
         arguments = [self.evaluate(arg) for arg in node.arguments]
+        try:
+            result = callee.call(self, arguments)
+        except SlayScriptError as error:
+            if cache[3]:
+                error.add_frame(callee.declaration.name, node.line, node.column)
+            raise
+        except RecursionError:
+            raise SpellOverflow(node.line, node.column)
+        if cache[4] and result is not None:
+            self.speak(str(result))
+        return result
 
+    def call_uncached(self, node: CallExpr) -> Any:
+        """Evaluate a call, caching the callee on node if it is a global spell or builtin."""
+        self.cache_stats.call_misses += 1
+        callee = self.evaluate(node.callee)
+        arguments = [self.evaluate(arg) for arg in node.arguments]
+        if (type(node.callee) is Identifier and node.callee.depth < 0 and isinstance(callee, Callable)
+                and callee.arity() in (-1, len(arguments))):
+            is_spell = isinstance(callee, SlayFunction)
+            node.callee_cache = (self.globals, self.globals.version, callee,
+                                 is_spell, is_spell and callee.is_incantation)
+        return self.invoke(callee, arguments, node)
+
+    def invoke(self, callee, arguments: list, node: CallExpr) -> Any:
+        """Call callee with already evaluated arguments on behalf of node."""
         if not isinstance(callee, Callable):
             raise ForbiddenMagic("Can only invoke spells and incantations", node.line, node.column)
 
@@ -277,22 +766,19 @@ class Interpreter:
 
         try:
             result = callee.call(self, arguments)
+        except SlayScriptError as error:
+            if isinstance(callee, SlayFunction):
+                error.add_frame(callee.declaration.name, node.line, node.column)
+            raise
+        except RecursionError:
+            raise SpellOverflow(node.line, node.column)
+
+        # If it's an incantation, speak the result
+        if isinstance(callee, SlayFunction) and callee.is_incantation:
+            if result is not None:
+                self.speak(str(result))
 
-            # If it's an incantation, speak the result
-            if isinstance(callee, SlayFunction) and callee.is_incantation:
-                if result is not None:
-                    self.speak(str(result))
-
-            return result
-        except SpellReturn as ret:
-            result = ret.value
-
-            # If it's an incantation, speak the result
-            if isinstance(callee, SlayFunction) and callee.is_incantation:
-                if result is not None:
-                    self.speak(str(result))
-
-            return result
+        return result
 
     def visit_MemberExpr(self, node: MemberExpr) -> Any:
         obj = self.evaluate(node.object)
@@ -303,6 +789,32 @@ class Interpreter:
 
         raise ForbiddenMagic(f"No such member '{node.member}'", node.line, node.column)
 
+    def visit_InvariantExpr(self, node: InvariantExpr) -> Any:
+        if node.depth < 0:
+            values = self.globals.values
+            value = values.get(node.name, UNSET)
+            if value is UNSET:
+                value = values[node.name] = self.evaluate(node.expression)
+            return value
+        scope = self.environment.ancestor(node.depth)
+        value = scope.slots[node.slot]
+        if value is UNSET:
+            value = scope.slots[node.slot] = self.evaluate(node.expression)
+        return value
+
+    def visit_InlineExpr(self, node: InlineExpr) -> Any:
+        frame = Frame(self.environment, 0)
+        frame.slots = [self.evaluate(arg) for arg in node.arguments]
+        previous = self.environment
+        try:
+            self.environment = frame
+            return self.evaluate(node.body)
+        except SlayScriptError as error:
+            error.add_frame(node.spell, node.line, node.column)
+            raise
+        finally:
+            self.environment = previous
+
     # ============ Helper Methods ============
 
     def is_truthy(self, value: Any) -> bool:
@@ -315,10 +827,19 @@ class Interpreter:
             return value != 0
         if isinstance(value, str):
             return len(value) > 0
-        if isinstance(value, (list, dict)):
+        if isinstance(value, (list, dict, RangeStream)):
             return len(value) > 0
         return True
 
+    def check_hint(self, value, node: VarDecl):
+        """Reject a strict-mode declaration whose value does not match its type hint."""
+        actual = type_name(value)
+        if actual != node.type_hint:
+            raise ForbiddenMagic(
+                f"'{node.name}' is declared as {node.type_hint} but conjured as {actual}",
+                node.line, node.column
+            )
+
     def check_numbers(self, left, right, node) -> bool:
         """Verify both operands are numbers."""
         if isinstance(left, (int, float)) and isinstance(right, (int, float)):
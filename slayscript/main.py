@@ -2,16 +2,40 @@
 
 import sys
 import argparse
+from dataclasses import fields
 from . import __version__
+from .ast_nodes import ASTNode
 from .lexer import Lexer
 from .parser import Parser
-from .interpreter import Interpreter
+from .resolver import Resolver
+from .inference import TypeInference
+from .optimizer import Optimizer, DEFAULT_INLINE_SIZE
+from .interpreter import Interpreter, ENGINES
+from .environment import DEFAULT_MEMO_SIZE
 from .builtins import register_builtins
+from .bytecode import BytecodeCompiler, disassemble
+from .profiler import SamplingProfiler, DEFAULT_INTERVAL
+from .tracing import TracePrinter, ChromeTracer
+from .metrics import BuiltinMetrics
+from .memprofile import MemoryProfiler
+from .hotspots import LineCounter
+from .cache import cache_path, load_program, store_program
 from .errors import SlayScriptError
 
 
-def run_file(filename: str, debug: bool = False):
-    """Run a SlayScript file."""
+def run_file(filename: str, debug: bool = False, engine: str = "tree",
+             show_bytecode: bool = False, optimize: bool = False,
+             inline_size: int = DEFAULT_INLINE_SIZE, memo_size: int = DEFAULT_MEMO_SIZE,
+             strict: bool = False, profile: str = None, profile_interval: float = DEFAULT_INTERVAL,
+             trace: bool = False, trace_events: str = None,
+             metrics: bool = False, metrics_file: str = None, memprofile: bool = False,
+             line_counts: str = None, use_cache: bool = True, cache_dir: str = None):
+    """Run a SlayScript file.
+
+    Unless use_cache is off, the parsed program is kept in a .slayc file
+    (in cache_dir, or __slaycache__ beside the script) and reused while the
+    source does not change.
+    """
     try:
         with open(filename, 'r', encoding='utf-8') as f:
             source = f.read()
@@ -22,78 +46,248 @@ def run_file(filename: str, debug: bool = False):
         print(f"Failed to read scroll: {e}")
         sys.exit(1)
 
-    run(source, debug)
-
-
-def run(source: str, debug: bool = False):
-    """Run SlayScript source code."""
+    run(source, debug, engine, show_bytecode, optimize, inline_size, memo_size, strict,
+        profile, profile_interval, trace, trace_events, metrics, metrics_file, memprofile,
+        line_counts, cache_path(filename, cache_dir) if use_cache else None)
+
+
+def run(source: str, debug: bool = False, engine: str = "tree",
+        show_bytecode: bool = False, optimize: bool = False,
+        inline_size: int = DEFAULT_INLINE_SIZE, memo_size: int = DEFAULT_MEMO_SIZE,
+        strict: bool = False, profile: str = None, profile_interval: float = DEFAULT_INTERVAL,
+        trace: bool = False, trace_events: str = None,
+        metrics: bool = False, metrics_file: str = None, memprofile: bool = False,
+        line_counts: str = None, cached: str = None):
+    """Run SlayScript source code.
+
+    With profile set, the run is sampled every profile_interval seconds:
+    collapsed stacks are written to the file profile names and a time
+    table is printed to stderr. With trace set, every spell call, line,
+    builtin call and error is printed to stderr as it happens. With
+    trace_events set, spell and builtin calls are written as spans to
+    that Chrome trace-event file when the run ends. With metrics (or
+    metrics_file) set, builtin call metrics are collected for
+    divine_metrics(), and written to metrics_file in Prometheus text
+    format when the run ends. With memprofile set, allocations are
+    attributed to spells and lines and reported to stderr. With
+    line_counts set, the source annotated with how often each line ran
+    and how long it and its loops took is written to that file, and the
+    hottest loops are printed to stderr. With cached set, the program is
+    loaded from that .slayc file if it was parsed from this same source,
+    and stored there otherwise (see cache.py).
+    """
     try:
-        # Lexer
-        lexer = Lexer(source)
-        tokens = lexer.tokenize()
+        # Parsed before: skip the lexer and parser (--debug shows the tokens)
+        ast = None
+        if cached is not None and not debug:
+            ast = load_program(cached, source)
+
+        if ast is None:
+            # Lexer
+            lexer = Lexer(source)
+            tokens = lexer.tokenize()
+
+            if debug:
+                print("=== Tokens ===")
+                for token in tokens:
+                    print(f"  {token}")
+                print()
+
+            # Parser
+            parser = Parser(tokens)
+            ast = parser.parse()
+            if cached is not None:
+                store_program(cached, source, ast)
+
+        # Interpreter
+        interpreter = Interpreter(mode=engine, memo_size=memo_size, strict=strict)
+        register_builtins(interpreter.globals)
+        if trace:
+            TracePrinter().attach(interpreter)
+        tracer = None
+        if trace_events is not None:
+            tracer = ChromeTracer()
+            tracer.attach(interpreter)
+        builtin_metrics = None
+        if metrics or metrics_file is not None:
+            builtin_metrics = BuiltinMetrics()
+            builtin_metrics.attach(interpreter)
+        memory_profiler = None
+        if memprofile:
+            memory_profiler = MemoryProfiler()
+            memory_profiler.attach(interpreter)
+
+        # Optimizer: fold constants, prune dead branches, inline small spells,
+        # hoist loop invariants
+        if optimize:
+            optimizer = Optimizer(interpreter.globals, inline_size)
+            optimizer.optimize(ast)
+
+            if debug:
+                print("=== Optimizations ===")
+                for change in optimizer.changes:
+                    print(f"  {change}")
+                if not optimizer.changes:
+                    print("  (none)")
+                print()
+
+        # Resolver: assign (depth, slot) addresses to block and spell locals
+        Resolver().resolve(ast)
+
+        # Type inference: mark arithmetic and comparisons on known numbers
+        inference = TypeInference(strict)
+        inference.infer(ast)
 
         if debug:
-            print("=== Tokens ===")
-            for token in tokens:
-                print(f"  {token}")
+            print("=== Types ===")
+            print(f"  {inference.summary()}")
             print()
 
-        # Parser
-        parser = Parser(tokens)
-        ast = parser.parse()
-
         if debug:
             print("=== AST ===")
             print_ast(ast)
             print()
 
-        # Interpreter
-        interpreter = Interpreter()
-        register_builtins(interpreter.globals)
+        line_counter = None
+        if line_counts is not None:
+            line_counter = LineCounter(ast)
+            line_counter.attach(interpreter)
 
-        result = interpreter.interpret(ast)
+        if show_bytecode:
+            print("=== Bytecode ===")
+            print(disassemble(BytecodeCompiler(strict).compile_program(ast)))
+            print()
+
+        try:
+            if profile is None:
+                result = interpreter.interpret(ast)
+            else:
+                profiler = SamplingProfiler(profile_interval)
+                try:
+                    with profiler:
+                        result = interpreter.interpret(ast)
+                finally:
+                    write_profile(profiler, profile)
+        finally:
+            if tracer is not None:
+                write_trace_events(tracer, trace_events)
+            if metrics_file is not None:
+                try:
+                    builtin_metrics.write(metrics_file)
+                except IOError as e:
+                    print(f"Failed to write metrics: {e}", file=sys.stderr)
+            if memory_profiler is not None:
+                memory_profiler.detach(interpreter)
+                print("=== Memory Profile ===", file=sys.stderr)
+                for line in memory_profiler.report():
+                    print(f"  {line}" if line else "", file=sys.stderr)
+            if line_counter is not None:
+                line_counter.detach(interpreter)
+                write_line_counts(line_counter, source, line_counts)
 
         if debug and result is not None:
             print(f"=== Result: {result} ===")
 
+        if debug and engine == "tree":
+            print("=== Inline Caches ===")
+            for line in interpreter.cache_stats.report():
+                print(f"  {line}")
+
     except SlayScriptError as e:
-        print(f"\n{e}")
+        print(f"\n{format_error(e)}")
         sys.exit(1)
 
 
+def write_profile(profiler: SamplingProfiler, filename: str):
+    """Write a profiler's collapsed stacks to filename and its table to stderr."""
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(profiler.collapsed())
+    except IOError as e:
+        print(f"Failed to write profile: {e}", file=sys.stderr)
+    print("=== Profile ===", file=sys.stderr)
+    for line in profiler.report():
+        print(f"  {line}" if line else "", file=sys.stderr)
+    print(f"  collapsed stacks written to {filename}", file=sys.stderr)
+
+
+def write_trace_events(tracer: ChromeTracer, filename: str):
+    """Write a tracer's spans to filename."""
+    try:
+        tracer.write(filename)
+    except IOError as e:
+        print(f"Failed to write trace events: {e}", file=sys.stderr)
+        return
+    print(f"=== {len(tracer.events)} trace events written to {filename} ===", file=sys.stderr)
+
+
+def write_line_counts(counter: LineCounter, source: str, filename: str):
+    """Write the annotated listing to filename and the hottest loops to stderr."""
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            print_listing(source, counter, f)
+    except IOError as e:
+        print(f"Failed to write line counts: {e}", file=sys.stderr)
+    print("=== Hot Loops ===", file=sys.stderr)
+    for line in counter.hot_loops() or ["(no loops ran)"]:
+        print(f"  {line}", file=sys.stderr)
+    print(f"  annotated listing written to {filename}", file=sys.stderr)
+
+
+def format_error(error: SlayScriptError) -> str:
+    """Render an error for the user, after the spell calls it escaped from."""
+    if error.traceback:
+        return f"{error.format_traceback()}\n{error}"
+    return str(error)
+
+
 def print_ast(node, indent=0):
     """Pretty-print an AST node (for debugging)."""
     prefix = "  " * indent
     name = type(node).__name__
 
-    if hasattr(node, '__dict__'):
+    if isinstance(node, ASTNode):
         print(f"{prefix}{name}:")
-        for key, value in node.__dict__.items():
-            if key in ('line', 'column'):
+        for item in fields(node):
+            if item.name in ('line', 'column'):
                 continue
+            value = getattr(node, item.name)
             if isinstance(value, list):
-                print(f"{prefix}  {key}:")
-                for item in value:
-                    if hasattr(item, '__dict__'):
-                        print_ast(item, indent + 2)
+                print(f"{prefix}  {item.name}:")
+                for element in value:
+                    if isinstance(element, ASTNode):
+                        print_ast(element, indent + 2)
                     else:
-                        print(f"{prefix}    {item}")
-            elif hasattr(value, '__dict__') and not isinstance(value, type):
-                print(f"{prefix}  {key}:")
+                        print(f"{prefix}    {element}")
+            elif isinstance(value, ASTNode):
+                print(f"{prefix}  {item.name}:")
                 print_ast(value, indent + 2)
             else:
-                print(f"{prefix}  {key}: {value}")
+                print(f"{prefix}  {item.name}: {value}")
     else:
         print(f"{prefix}{node}")
 
 
-def repl():
+def print_listing(source: str, counter: LineCounter, file=None):
+    """Print source with the runs and self time of each line, and the total time of loops, in the margin."""
+    print(f"{'runs':>10} {'self ms':>10} {'loop ms':>10} |", file=file)
+    for number, text in enumerate(source.splitlines(), 1):
+        runs = f"{counter.counts[number]}" if number in counter.counts else ""
+        own = f"{counter.seconds[number] * 1000:.3f}" if number in counter.seconds else ""
+        loop = f"{counter.loop_seconds[number] * 1000:.3f}" if number in counter.loop_seconds else ""
+        print(f"{runs:>10} {own:>10} {loop:>10} | {text}".rstrip(), file=file)
+
+
+def repl(engine: str = "tree", optimize: bool = False,
+         inline_size: int = DEFAULT_INLINE_SIZE, memo_size: int = DEFAULT_MEMO_SIZE,
+         strict: bool = False):
     """Start the interactive REPL."""
     print(f"SlayScript REPL v{__version__}")
     print("Cast spells, slay bugs.")
     print("Type 'exit' or 'quit' to leave the Hellmouth.\n")
 
-    interpreter = Interpreter()
+    interpreter = Interpreter(mode=engine, optimize=optimize, inline_size=inline_size,
+                              memo_size=memo_size, strict=strict)
     register_builtins(interpreter.globals)
 
     # For multi-line input
@@ -121,7 +315,7 @@ def repl():
                     try:
                         execute_repl_input(interpreter, source)
                     except SlayScriptError as e:
-                        print(f"{e}")
+                        print(format_error(e))
                 continue
 
             # Check if line ends with colon (starts a block)
@@ -147,13 +341,13 @@ def repl():
                     try:
                         execute_repl_input(interpreter, source)
                     except SlayScriptError as e:
-                        print(f"{e}")
+                        print(format_error(e))
 
             # Single line execution
             try:
                 execute_repl_input(interpreter, line)
             except SlayScriptError as e:
-                print(f"{e}")
+                print(format_error(e))
 
         except EOFError:
             print("\nThe Slayer departs. Stay vigilant.")
@@ -214,6 +408,105 @@ def main():
         action="store_true",
         help="Show debug output (tokens and AST)"
     )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="tree",
+        help="Execution engine: tree-walking interpreter, compiled closures "
+             "or bytecode virtual machine (default: tree)"
+    )
+    parser.add_argument(
+        "--disassemble",
+        action="store_true",
+        help="Show the compiled bytecode before running"
+    )
+    parser.add_argument(
+        "-O", "--optimize",
+        action="store_true",
+        help="Fold constants and prune dead branches before running"
+    )
+    parser.add_argument(
+        "--inline-size",
+        type=int,
+        default=DEFAULT_INLINE_SIZE,
+        metavar="N",
+        help="With --optimize, inline spells whose body has at most N "
+             f"expression nodes; 0 disables inlining (default: {DEFAULT_INLINE_SIZE})"
+    )
+    parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=DEFAULT_MEMO_SIZE,
+        metavar="N",
+        help="Results each pure spell remembers before evicting the least "
+             f"recently used; 0 disables memoization (default: {DEFAULT_MEMO_SIZE})"
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Raise when a declaration's value does not match its type hint "
+             "(conjure x as rune ...)"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Sample the SlayScript call stack while running, write collapsed "
+             "stacks (for flame graphs) to FILE and print self/total time per "
+             "spell and per line"
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=DEFAULT_INTERVAL * 1000,
+        metavar="MS",
+        help=f"Milliseconds between --profile samples (default: {DEFAULT_INTERVAL * 1000:g})"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Print every spell call and return, line run, builtin call "
+             "and error to stderr"
+    )
+    parser.add_argument(
+        "--trace-events",
+        metavar="FILE",
+        help="Record every spell and builtin call as a span and write them "
+             "to FILE in Chrome trace-event format (chrome://tracing, Perfetto)"
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Count calls, errors and latencies of every builtin for divine_metrics()"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help="Like --metrics, and write the metrics to FILE in Prometheus "
+             "text format when the script ends"
+    )
+    parser.add_argument(
+        "--memprofile",
+        action="store_true",
+        help="Trace allocations with tracemalloc and print the bytes each "
+             "spell and line allocated and kept alive"
+    )
+    parser.add_argument(
+        "--line-counts",
+        metavar="FILE",
+        help="Count the runs and time of every line and loop, write the "
+             "annotated source to FILE and print the hottest loops"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the script instead of reusing its cached .slayc program"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="Keep cached .slayc programs in DIR (default: __slaycache__ "
+             "beside each script)"
+    )
     parser.add_argument(
         "-c", "--command",
         help="Execute a single command"
@@ -226,12 +519,20 @@ def main():
 
     args = parser.parse_args()
 
+    profile_interval = args.profile_interval / 1000
     if args.command:
-        run(args.command, args.debug)
+        run(args.command, args.debug, args.engine, args.disassemble,
+            args.optimize, args.inline_size, args.memo_size, args.strict,
+            args.profile, profile_interval, args.trace, args.trace_events,
+            args.metrics, args.metrics_file, args.memprofile, args.line_counts)
     elif args.file:
-        run_file(args.file, args.debug)
+        run_file(args.file, args.debug, args.engine, args.disassemble,
+                 args.optimize, args.inline_size, args.memo_size, args.strict,
+                 args.profile, profile_interval, args.trace, args.trace_events,
+                 args.metrics, args.metrics_file, args.memprofile, args.line_counts,
+                 not args.no_cache, args.cache_dir)
     else:
-        repl()
+        repl(args.engine, args.optimize, args.inline_size, args.memo_size, args.strict)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+"""Memory profiler for SlayScript programs.
+
+tracemalloc traces every allocation, but its tracebacks point into the
+interpreter. MemoryProfiler instead reads tracemalloc's traced total at
+each line, spell_enter and spell_exit tracing hook and charges the change
+since the previous event to the SlayScript line that was running (the
+spell and line of the statement's AST node):
+
+- allocated: growth of the traced total while the line ran
+- net: growth minus what was freed meanwhile, i.e. what the line left alive
+
+Per spell, self sums its own lines and total is the net change over each
+outermost call, callees included. memory_snapshot() in the script records
+the net bytes per line so far; report() lists what changed between the
+first and the last snapshot.
+"""
+
+import tracemalloc
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .tracing import PROGRAM
+
+Position = Tuple[str, Optional[int]]  # (spell, line); line is None before the first statement
+
+
+def _label(position: Position) -> str:
+    name, line = position
+    return name if line is None else f"{name}:{line}"
+
+
+def _size(size: int) -> str:
+    return f"{size / 1024:11.1f} KiB"
+
+
+class MemoryProfiler:
+    """Attributes traced memory to the SlayScript lines and spells that allocated it.
+
+    Usage: attach() to an interpreter before running the program and
+    detach() after it, then read report().
+    """
+
+    def __init__(self):
+        self.allocated: Counter = Counter()  # Position -> bytes allocated
+        self.net: Counter = Counter()  # Position -> bytes allocated and not freed
+        self.spell_totals: Counter = Counter()  # Spell -> net bytes of its outermost calls
+        self.snapshots: List[Tuple[str, Counter]] = []  # (label, copy of net)
+        self.peak = 0
+        self.position: Position = (PROGRAM, None)
+        self.calls = []  # (caller position, traced bytes at entry), innermost last
+        self.active: Counter = Counter()  # Spell -> activations on calls
+        self.last = 0  # Traced bytes at the previous event
+        self._started = False  # tracemalloc was started by attach()
+
+    def attach(self, interpreter):
+        """Start tracing allocations and register the hooks on interpreter."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        self.last = tracemalloc.get_traced_memory()[0]
+        interpreter.memory_profiler = self
+        for event in ("line", "spell_enter", "spell_exit"):
+            interpreter.add_hook(event, getattr(self, event))
+
+    def detach(self, interpreter):
+        """Charge the last line, unregister the hooks and stop tracing."""
+        self.charge()
+        for event in ("line", "spell_enter", "spell_exit"):
+            interpreter.remove_hook(event, getattr(self, event))
+        interpreter.memory_profiler = None
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    # ============ Hooks ============
+
+    def charge(self) -> int:
+        """Charge the traced memory change since the last event to the running line."""
+        current = tracemalloc.get_traced_memory()[0]
+        delta = current - self.last
+        self.last = current
+        if delta:
+            if delta > 0:
+                self.allocated[self.position] += delta
+            self.net[self.position] += delta
+        return current
+
+    def line(self, spell: str, line: int):
+        self.charge()
+        self.position = (spell, line)
+
+    def spell_enter(self, name: str, arguments: list, line: int):
+        self.calls.append((self.position, self.charge()))
+        self.active[name] += 1
+        self.position = (name, None)
+
+    def spell_exit(self, name: str, result):
+        current = self.charge()
+        self.position, entered = self.calls.pop()
+        self.active[name] -= 1
+        if not self.active[name]:
+            # Recursive calls are already part of the outermost one
+            self.spell_totals[name] += current - entered
+
+    def snapshot(self, label: str):
+        """Record the net bytes per line so far under label."""
+        self.charge()
+        self.snapshots.append((label, Counter(self.net)))
+
+    # ============ Output ============
+
+    def report(self, limit: int = 15) -> List[str]:
+        """Top spells and lines by allocated bytes, and the change between snapshots."""
+        spell_allocated: Counter = Counter()
+        spell_net: Counter = Counter()
+        for position, size in self.allocated.items():
+            spell_allocated[position[0]] += size
+        for position, size in self.net.items():
+            spell_net[position[0]] += size
+
+        current, peak = self.last, self.peak
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced: {current / 1024:.1f} KiB at the end, {max(peak, self.peak) / 1024:.1f} KiB peak",
+                 "",
+                 f"{'spell':<32}{'allocated':>15}{'net':>15}{'total':>15}"]
+        for name, size in spell_allocated.most_common(limit):
+            total = _size(self.spell_totals[name]) if name in self.spell_totals else f"{'':>15}"
+            lines.append(f"{name:<32}{_size(size)}{_size(spell_net[name])}{total}")
+        lines += ["", f"{'line':<32}{'allocated':>15}{'net':>15}"]
+        for position, size in self.allocated.most_common(limit):
+            lines.append(f"{_label(position):<32}{_size(size)}{_size(self.net[position])}")
+
+        if len(self.snapshots) >= 2:
+            (first, before), (last, after) = self.snapshots[0], self.snapshots[-1]
+            changes = Counter(after)
+            changes.subtract(before)
+            ranked = sorted((item for item in changes.items() if item[1]), key=lambda item: -abs(item[1]))
+            lines += ["", f"{'net change ' + first + ' -> ' + last:<32}{'bytes':>15}"]
+            for position, size in ranked[:limit]:
+                lines.append(f"{_label(position):<32}{_size(size)}")
+        return lines
@@ -0,0 +1,115 @@
+"""Per-builtin call metrics for SlayScript programs.
+
+BuiltinMetrics counts calls and errors of every builtin and keeps a
+latency histogram per builtin, with logarithmic buckets from 10 us to 10 s
+(two per decade). It collects through the builtin tracing hook, so
+interpreters without it attached pay nothing.
+
+Scripts read the counters with divine_metrics(); --metrics-file FILE
+writes them in the Prometheus text exposition format when the script
+ends, for a node_exporter style textfile collector to pick up.
+"""
+
+import os
+from bisect import bisect_left
+from typing import Dict, List
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = tuple(10 ** (exponent / 2) for exponent in range(-10, 3))
+
+
+def _bound(seconds: float) -> str:
+    return f"{seconds:.6g}"
+
+
+class BuiltinStats:
+    """Calls, errors and latencies of one builtin."""
+
+    __slots__ = ("calls", "errors", "seconds", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0  # Total time spent in the builtin
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Not cumulative; the last is +Inf
+
+    def record(self, seconds: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.seconds += seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def cumulative(self) -> List[int]:
+        """Calls that took at most each bound, then all calls (+Inf)."""
+        counts, total = [], 0
+        for count in self.buckets:
+            total += count
+            counts.append(total)
+        return counts
+
+    def stats(self) -> dict:
+        counts = self.cumulative()
+        histogram = {_bound(bound): count for bound, count in zip(LATENCY_BUCKETS, counts)}
+        histogram["+Inf"] = counts[-1]
+        return {"calls": self.calls, "errors": self.errors, "seconds": self.seconds,
+                "histogram": histogram}
+
+
+class BuiltinMetrics:
+    """Collects BuiltinStats for every builtin an interpreter calls."""
+
+    def __init__(self):
+        self.builtins: Dict[str, BuiltinStats] = {}
+
+    def attach(self, interpreter):
+        """Start collecting on interpreter; divine_metrics() then reports these metrics."""
+        interpreter.metrics = self
+        interpreter.add_hook("builtin", self.builtin)
+
+    def detach(self, interpreter):
+        interpreter.remove_hook("builtin", self.builtin)
+        interpreter.metrics = None
+
+    def builtin(self, name: str, arguments: list, result, seconds: float, error):
+        stats = self.builtins.get(name)
+        if stats is None:
+            stats = self.builtins[name] = BuiltinStats()
+        stats.record(seconds, error is not None)
+
+    def stats(self) -> dict:
+        """A grimoire of calls, errors, seconds and cumulative histogram per builtin."""
+        return {name: stats.stats() for name, stats in sorted(self.builtins.items())}
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        builtins = sorted(self.builtins.items())
+        lines = [
+            "# HELP slayscript_builtin_calls_total Calls of each builtin.",
+            "# TYPE slayscript_builtin_calls_total counter",
+        ]
+        lines += [f'slayscript_builtin_calls_total{{builtin="{name}"}} {stats.calls}'
+                  for name, stats in builtins]
+        lines += [
+            "# HELP slayscript_builtin_errors_total Calls of each builtin that raised.",
+            "# TYPE slayscript_builtin_errors_total counter",
+        ]
+        lines += [f'slayscript_builtin_errors_total{{builtin="{name}"}} {stats.errors}'
+                  for name, stats in builtins]
+        lines += [
+            "# HELP slayscript_builtin_latency_seconds Time spent in each builtin call.",
+            "# TYPE slayscript_builtin_latency_seconds histogram",
+        ]
+        for name, stats in builtins:
+            bounds = [_bound(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, stats.cumulative()):
+                lines.append(f'slayscript_builtin_latency_seconds_bucket{{builtin="{name}",le="{bound}"}} {count}')
+            lines.append(f'slayscript_builtin_latency_seconds_sum{{builtin="{name}"}} {stats.seconds!r}')
+            lines.append(f'slayscript_builtin_latency_seconds_count{{builtin="{name}"}} {stats.calls}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str):
+        """Write prometheus() to filename, replacing it in one step for collectors reading it."""
+        temporary = f"{filename}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temporary, filename)
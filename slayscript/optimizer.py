@@ -0,0 +1,829 @@
+"""AST optimizer for SlayScript.
+
+An optional pass (--optimize) that runs between parsing and resolution:
+
+- folds arithmetic, comparisons and logic whose operands are literals
+  (`false and ...` and `true or ...` fold whatever their right side is)
+- replaces reads of `const prophecy` values that are literals with the value
+- prunes prophecy branches (otherwise / fate decrees) and patrol loops
+  whose conditions are known at parse time
+- inlines calls to small spells whose body is a single expression
+- hoists loop-invariant calls to pure builtins (measure, type_of, ...) out
+  of patrol and hunt loops, so they run once per loop entry
+- turns `hunt each x in range(...)` into `stream_range(...)`, so the
+  numbers are produced one at a time instead of built as a tome
+
+Folded literals keep the line and column of the expression they replace.
+Anything that would raise at runtime (dividing by void, mixing types) is
+left alone so the error still happens, at the same position.
+
+A spell is inlined only at calls that come after its declaration, within
+its scope, when its name is declared once and never transmuted or
+vanquished, it is not an incantation, and its body (one `cast` or
+expression of at most `inline_size` nodes) calls nothing but builtins and
+reads no variables other than its parameters and top-level names. The
+arguments are still evaluated first, in order, into a scope of their own;
+when they are all literals they are substituted and folded instead. An
+error raised by the inlined body still shows the spell call in the spell
+traceback, as if the spell had run.
+
+Hoisted expressions are evaluated lazily: the first evaluation in a loop
+entry caches the value in a hidden variable declared right before the loop,
+and later iterations reuse it. A loop is only considered if everything it
+calls is a builtin declared PURE or READ_ONLY in the register_builtins
+table, it assigns no tome or grimoire elements, and every hunt in it walks
+a tome, grimoire or range rather than a stream a generator spell may be
+producing, so nothing inside the loop can change what a pure call would
+return.
+"""
+
+import copy
+from typing import Any, Dict, List, Optional
+from .ast_nodes import (
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt, ExprStmt
+)
+from .environment import Environment, BuiltinFunction, UNSET
+
+# Exact literal types the folder understands (bool deliberately excluded
+# from the numbers, as in the engines' fast paths)
+_NUMBER_TYPES = (int, float)
+
+# Limits that keep folding from building huge values at parse time
+_MAX_POWER_EXPONENT = 64
+_MAX_REPEAT_LENGTH = 1024
+
+# Largest spell body (in expression nodes) inlined by default; see --inline-size
+DEFAULT_INLINE_SIZE = 16
+
+# Builtins whose result a hunt loop can walk without running any spell:
+# tomes, grimoires and ranges, never a stream a generator spell produces
+_PLAIN_ITERABLE_BUILTINS = ("range", "stream_range", "gather", "keys", "values")
+
+
+def literal_truthy(value: Any) -> bool:
+    """Truthiness of a literal value, matching Interpreter.is_truthy."""
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        return len(value) > 0
+    return True
+
+
+def format_literal(value: Any) -> str:
+    """Render a literal value as SlayScript source."""
+    if value is None:
+        return "void"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
+
+
+class _Unfoldable(Exception):
+    """Raised by the folder when an operation must be left to runtime."""
+
+
+def _fold_binary(op: str, left: Any, right: Any) -> Any:
+    """Compute a binary operation on literals the way the engines would."""
+    left_number = type(left) in _NUMBER_TYPES
+    right_number = type(right) in _NUMBER_TYPES
+
+    if op == "+":
+        if left_number and right_number:
+            return left + right
+        if type(left) is str and type(right) is str:
+            return left + right
+        if type(left) is str or type(right) is str:
+            return str(left) + str(right)
+        raise _Unfoldable
+    if op in ("-", "*", "/", "%", "**"):
+        if op == "*" and (type(left), type(right)) in ((str, int), (int, str)):
+            count = left if type(left) is int else right
+            text = right if type(left) is int else left
+            if len(text) * max(count, 0) > _MAX_REPEAT_LENGTH:
+                raise _Unfoldable
+            return left * right
+        if not (left_number and right_number):
+            raise _Unfoldable
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        if right == 0 and op in ("/", "%"):
+            raise _Unfoldable
+        if op == "/":
+            return left / right
+        if op == "%":
+            return left % right
+        if abs(right) > _MAX_POWER_EXPONENT or (left == 0 and right < 0):
+            raise _Unfoldable
+        try:
+            value = left ** right
+        except OverflowError:
+            raise _Unfoldable
+        if isinstance(value, complex):
+            raise _Unfoldable
+        return value
+
+    if op == "is":
+        return left == right
+    if op == "isnt":
+        return left != right
+    if op in ("exceeds", "under", "atleast", "atmost"):
+        try:
+            if op == "exceeds":
+                return left > right
+            if op == "under":
+                return left < right
+            if op == "atleast":
+                return left >= right
+            return left <= right
+        except TypeError:
+            raise _Unfoldable
+
+    raise _Unfoldable
+
+
+def _declared_names(statements: list, counts: Dict[str, int], rebound: set):
+    """Count every declaration of each name, anywhere in statements.
+
+    Names that are transmuted or vanquished anywhere are added to rebound.
+    """
+    for stmt in statements:
+        if isinstance(stmt, VarDecl):
+            counts[stmt.name] = counts.get(stmt.name, 0) + 1
+        elif isinstance(stmt, (VarAssign, VarDelete)):
+            rebound.add(stmt.name)
+        elif isinstance(stmt, SpellDecl):
+            for name in [stmt.name] + list(stmt.params):
+                counts[name] = counts.get(name, 0) + 1
+            _declared_names(stmt.body, counts, rebound)
+        elif isinstance(stmt, IfStmt):
+            _declared_names(stmt.then_branch, counts, rebound)
+            for _, body in stmt.elif_branches:
+                _declared_names(body, counts, rebound)
+            if stmt.else_branch is not None:
+                _declared_names(stmt.else_branch, counts, rebound)
+        elif isinstance(stmt, WhileStmt):
+            _declared_names(stmt.body, counts, rebound)
+        elif isinstance(stmt, ForStmt):
+            counts[stmt.variable] = counts.get(stmt.variable, 0) + 1
+            _declared_names(stmt.body, counts, rebound)
+
+
+def _loop_bodies(stmt) -> List[list]:
+    """Statement lists nested directly in a compound statement."""
+    if isinstance(stmt, IfStmt):
+        bodies = [stmt.then_branch] + [body for _, body in stmt.elif_branches]
+        if stmt.else_branch is not None:
+            bodies.append(stmt.else_branch)
+        return bodies
+    if isinstance(stmt, (WhileStmt, ForStmt, SpellDecl)):
+        return [stmt.body]
+    return []
+
+
+def _expression_size(node) -> int:
+    """Count the nodes of an expression."""
+    if isinstance(node, (BinaryOp, LogicalOp)):
+        return 1 + _expression_size(node.left) + _expression_size(node.right)
+    if isinstance(node, UnaryOp):
+        return 1 + _expression_size(node.operand)
+    if isinstance(node, CallExpr):
+        return 1 + _expression_size(node.callee) + sum(_expression_size(arg) for arg in node.arguments)
+    if isinstance(node, IndexExpr):
+        return 1 + _expression_size(node.collection) + _expression_size(node.index)
+    if isinstance(node, MemberExpr):
+        return 1 + _expression_size(node.object)
+    if isinstance(node, TomeExpr):
+        return 1 + sum(_expression_size(elem) for elem in node.elements)
+    if isinstance(node, GrimoireExpr):
+        return 1 + sum(_expression_size(key) + _expression_size(value) for key, value in node.pairs)
+    if isinstance(node, InlineExpr):
+        return 1 + sum(_expression_size(arg) for arg in node.arguments) + _expression_size(node.body)
+    return 1
+
+
+class Optimizer:
+    """Rewrites a Program AST in place; `changes` describes what was done.
+
+    environment is the global scope the program will run in; it tells the
+    optimizer which names are builtins and what traits they declare. Without
+    it no calls are hoisted out of loops and no spell calling a builtin is
+    inlined. inline_size is the largest spell body inlined (0 disables
+    inlining).
+    """
+
+    def __init__(self, environment: Optional[Environment] = None,
+                 inline_size: int = DEFAULT_INLINE_SIZE):
+        self.environment = environment
+        self.inline_size = inline_size
+        self.changes: List[str] = []
+        self.constants: Dict[str, Any] = {}  # Literal prophecies visible here
+        self.spells: Dict[str, SpellDecl] = {}  # Inlinable spells visible here
+        self.single_names: set = set()  # Names declared exactly once, never rebound
+        self.shadowed: set = set()  # Names the program declares or rebinds somewhere
+        self.local_names: set = set()  # Names declared somewhere other than the top level
+        self.tome_names: set = set()  # Single names declared as a tome or grimoire literal
+        self.invariants = 0  # Hidden variables created for hoisted expressions
+
+    def optimize(self, program: Program) -> Program:
+        """Optimize a whole program in place and return it."""
+        counts: Dict[str, int] = {}
+        rebound: set = set()
+        _declared_names(program.statements, counts, rebound)
+        self.single_names = {name for name, count in counts.items()
+                             if count == 1 and name not in rebound}
+        self.shadowed = set(counts) | rebound
+        top_level: Dict[str, int] = {}
+        for stmt in program.statements:
+            if isinstance(stmt, (VarDecl, SpellDecl)):
+                top_level[stmt.name] = top_level.get(stmt.name, 0) + 1
+        self.local_names = {name for name, count in counts.items()
+                            if count > top_level.get(name, 0)}
+        self.constants = {}
+        self.spells = {}
+        self.tome_names = set()
+
+        program.statements = self.block(program.statements)
+        if self.environment is not None:
+            program.statements = self.hoist_block(program.statements)
+        program.optimized = True
+        program.resolved = False  # Scope layout may have changed
+        return program
+
+    def note(self, node, message: str):
+        self.changes.append(f"line {node.line}, column {node.column}: {message}")
+
+    # ============ Statements ============
+
+    def block(self, statements: list) -> list:
+        """Optimize a statement list; prophecies and spells it declares stay local to it."""
+        outer_constants, outer_spells = self.constants, self.spells
+        self.constants, self.spells = dict(outer_constants), dict(outer_spells)
+        result = []
+        last = len(statements) - 1
+        for index, stmt in enumerate(statements):
+            replaced = self.statement(stmt)
+            if replaced is None:
+                # Dropped; the last statement still has to produce void
+                if index == last:
+                    result.append(ExprStmt(expression=Literal(value=None, line=stmt.line, column=stmt.column),
+                                           line=stmt.line, column=stmt.column))
+            elif isinstance(replaced, list):
+                if not replaced and index == last:
+                    replaced = [ExprStmt(expression=Literal(value=None, line=stmt.line, column=stmt.column),
+                                         line=stmt.line, column=stmt.column)]
+                result.extend(replaced)
+            else:
+                result.append(replaced)
+        self.constants, self.spells = outer_constants, outer_spells
+        return result
+
+    def statement(self, node):
+        """Optimize one statement.
+
+        Returns the replacement node, a list of statements to splice into
+        the enclosing block, or None to drop the statement.
+        """
+        method = getattr(self, f"optimize_{type(node).__name__}", None)
+        if method is None:
+            return node
+        return method(node)
+
+    def optimize_ExprStmt(self, node: ExprStmt):
+        node.expression = self.expression(node.expression)
+        return node
+
+    def optimize_VarDecl(self, node: VarDecl):
+        node.value = self.expression(node.value)
+        if node.is_const and isinstance(node.value, Literal) and node.name in self.single_names:
+            self.constants[node.name] = node.value.value
+        if isinstance(node.value, (TomeExpr, GrimoireExpr)) and node.name in self.single_names:
+            self.tome_names.add(node.name)
+        return node
+
+    def optimize_VarAssign(self, node: VarAssign):
+        node.value = self.expression(node.value)
+        return node
+
+    def optimize_IndexAssign(self, node: IndexAssign):
+        node.collection = self.expression(node.collection)
+        node.index = self.expression(node.index)
+        node.value = self.expression(node.value)
+        return node
+
+    def optimize_SpellDecl(self, node: SpellDecl):
+        node.body = self.block(node.body)
+        if self.inlinable(node):
+            self.spells[node.name] = node
+        return node
+
+    def optimize_CastStmt(self, node: CastStmt):
+        if node.value is not None:
+            node.value = self.expression(node.value)
+        return node
+
+    def optimize_YieldStmt(self, node: YieldStmt):
+        node.value = self.expression(node.value)
+        return node
+
+    def optimize_IfStmt(self, node: IfStmt):
+        branches = [(node.condition, node.then_branch)] + list(node.elif_branches)
+        kept = []
+        else_branch = node.else_branch
+        for condition, body in branches:
+            condition = self.expression(condition)
+            if isinstance(condition, Literal):
+                if literal_truthy(condition.value):
+                    # Everything after an always-true branch is unreachable
+                    self.note(condition, f"condition is always {format_literal(condition.value)}; "
+                                         "later branches pruned")
+                    else_branch = body
+                    break
+                self.note(condition, f"condition is always {format_literal(condition.value)}; branch pruned")
+                continue
+            kept.append((condition, body))
+
+        if else_branch is not None:
+            else_branch = self.block(else_branch)
+        kept = [(condition, self.block(body)) for condition, body in kept]
+
+        if not kept:
+            # Only the fate decrees branch (or nothing) is left
+            if else_branch is None:
+                return None
+            return self.inline_branch(node, else_branch)
+
+        node.condition, node.then_branch = kept[0]
+        node.elif_branches = kept[1:]
+        node.else_branch = else_branch
+        return node
+
+    def inline_branch(self, node: IfStmt, body: list):
+        """Replace a prophecy with the one branch that always runs."""
+        if any(isinstance(stmt, (VarDecl, SpellDecl)) for stmt in body):
+            # It declares variables, so it still needs its own scope
+            return IfStmt(condition=Literal(value=True, line=node.line, column=node.column),
+                          then_branch=body, line=node.line, column=node.column)
+        return body
+
+    def optimize_WhileStmt(self, node: WhileStmt):
+        node.condition = self.expression(node.condition)
+        if isinstance(node.condition, Literal) and literal_truthy(node.condition.value):
+            # "patrol until" a true condition never runs its body
+            self.note(node, "patrol condition is already met; loop removed")
+            return None
+        node.body = self.block(node.body)
+        return node
+
+    def optimize_ForStmt(self, node: ForStmt):
+        node.iterable = self.expression(node.iterable)
+        node.body = self.block(node.body)
+        iterable = node.iterable
+        if isinstance(iterable, CallExpr) and self.streamable_range(iterable.callee):
+            # The tome range() builds is only walked, so stream it instead
+            iterable.callee = Identifier(name="stream_range", line=iterable.callee.line,
+                                         column=iterable.callee.column)
+            self.note(iterable, "range() streamed by hunt each")
+        return node
+
+    def streamable_range(self, callee) -> bool:
+        """Check that callee is the range builtin and stream_range is not rebound either."""
+        builtin = self.builtin(callee)
+        if builtin is None or builtin.name != "range":
+            return False
+        stream = self.builtin(Identifier(name="stream_range"))
+        return stream is not None and stream.name == "stream_range"
+
+    # ============ Expressions ============
+
+    def expression(self, node):
+        """Optimize an expression and return its replacement."""
+        method = getattr(self, f"fold_{type(node).__name__}", None)
+        if method is None:
+            return node
+        return method(node)
+
+    def fold_Identifier(self, node: Identifier):
+        if node.name in self.constants:
+            value = self.constants[node.name]
+            self.note(node, f"prophecy {node.name} replaced by {format_literal(value)}")
+            return Literal(value=value, line=node.line, column=node.column)
+        return node
+
+    def fold_BinaryOp(self, node: BinaryOp):
+        node.left = self.expression(node.left)
+        node.right = self.expression(node.right)
+        if not (isinstance(node.left, Literal) and isinstance(node.right, Literal)):
+            return node
+        left, right = node.left.value, node.right.value
+        try:
+            value = _fold_binary(node.operator, left, right)
+        except _Unfoldable:
+            return node
+        self.note(node, f"folded {format_literal(left)} {node.operator} {format_literal(right)} "
+                        f"to {format_literal(value)}")
+        return Literal(value=value, line=node.line, column=node.column)
+
+    def fold_LogicalOp(self, node: LogicalOp):
+        node.left = self.expression(node.left)
+        node.right = self.expression(node.right)
+        if not isinstance(node.left, Literal):
+            return node
+        left = node.left.value
+        decided = literal_truthy(left) != (node.operator == "and")
+        if decided:
+            # The right operand is never evaluated, whatever it is
+            value = node.operator == "or"
+        elif isinstance(node.right, Literal):
+            value = literal_truthy(node.right.value)
+        else:
+            return node
+        self.note(node, f"folded {self.describe(node)} to {format_literal(value)}")
+        return Literal(value=value, line=node.line, column=node.column)
+
+    def fold_UnaryOp(self, node: UnaryOp):
+        node.operand = self.expression(node.operand)
+        if not isinstance(node.operand, Literal):
+            return node
+        operand = node.operand.value
+        if node.operator == "-" and type(operand) in _NUMBER_TYPES:
+            value = -operand
+        elif node.operator == "not":
+            value = not literal_truthy(operand)
+        else:
+            return node
+        self.note(node, f"folded {node.operator} {format_literal(operand)} to {format_literal(value)}")
+        return Literal(value=value, line=node.line, column=node.column)
+
+    def fold_TomeExpr(self, node: TomeExpr):
+        node.elements = [self.expression(elem) for elem in node.elements]
+        return node
+
+    def fold_GrimoireExpr(self, node: GrimoireExpr):
+        node.pairs = [(self.expression(key), self.expression(value)) for key, value in node.pairs]
+        return node
+
+    def fold_IndexExpr(self, node: IndexExpr):
+        node.collection = self.expression(node.collection)
+        node.index = self.expression(node.index)
+        return node
+
+    def fold_CallExpr(self, node: CallExpr):
+        node.callee = self.expression(node.callee)
+        node.arguments = [self.expression(arg) for arg in node.arguments]
+        if isinstance(node.callee, Identifier) and node.callee.name in self.spells:
+            spell = self.spells[node.callee.name]
+            if len(spell.params) == len(node.arguments):
+                return self.inline(node, spell)
+        return node
+
+    def fold_MemberExpr(self, node: MemberExpr):
+        node.object = self.expression(node.object)
+        return node
+
+    def fold_InlineExpr(self, node: InlineExpr):
+        node.arguments = [self.expression(arg) for arg in node.arguments]
+        if all(isinstance(arg, Literal) for arg in node.arguments):
+            values = {param: arg.value for param, arg in zip(node.params, node.arguments)}
+            body = self.expression(self.substitute(node.body, values))
+            if isinstance(body, Literal):
+                return body
+            # Still a call without parameters, so an error names the spell
+            node.arguments, node.params, node.body = [], [], body
+        return node
+
+    # ============ Inlining ============
+
+    def inlinable(self, node: SpellDecl) -> bool:
+        """Check whether calls to node can be replaced by its body."""
+        if self.inline_size <= 0 or node.is_incantation or node.name not in self.single_names:
+            return False
+        if len(node.body) != 1:
+            return False
+        stmt = node.body[0]
+        if isinstance(stmt, CastStmt) and stmt.value is not None:
+            body = stmt.value
+        elif isinstance(stmt, ExprStmt):
+            body = stmt.expression
+        else:
+            return False
+        return _expression_size(body) <= self.inline_size and self.closed(body, set(node.params))
+
+    def closed(self, node, params: set) -> bool:
+        """Check that node reads only params and top-level names, and calls only builtins.
+
+        Those names mean the same thing at every call site as in the spell.
+        Calls to other spells are rejected, which also rules out recursion.
+        """
+        if isinstance(node, Literal):
+            return True
+        if isinstance(node, Identifier):
+            return node.name in params or node.name not in self.local_names
+        if isinstance(node, CallExpr):
+            return (self.builtin(node.callee) is not None
+                    and all(self.closed(arg, params) for arg in node.arguments))
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            return self.closed(node.left, params) and self.closed(node.right, params)
+        if isinstance(node, UnaryOp):
+            return self.closed(node.operand, params)
+        if isinstance(node, IndexExpr):
+            return self.closed(node.collection, params) and self.closed(node.index, params)
+        if isinstance(node, MemberExpr):
+            return self.closed(node.object, params)
+        if isinstance(node, TomeExpr):
+            return all(self.closed(elem, params) for elem in node.elements)
+        if isinstance(node, GrimoireExpr):
+            return all(self.closed(key, params) and self.closed(value, params)
+                       for key, value in node.pairs)
+        if isinstance(node, InlineExpr):
+            return (all(self.closed(arg, params) for arg in node.arguments)
+                    and self.closed(node.body, set(node.params)))
+        return False
+
+    def inline(self, node: CallExpr, spell: SpellDecl):
+        """Replace a call to spell with a copy of its body."""
+        stmt = spell.body[0]
+        body = copy.deepcopy(stmt.value if isinstance(stmt, CastStmt) else stmt.expression)
+
+        self.note(node, f"inlined spell {spell.name}")
+        inlined = InlineExpr(arguments=node.arguments, params=list(spell.params), body=body,
+                             spell=spell.name, line=node.line, column=node.column)
+        # Literal arguments cannot fail or change anything: substitute them
+        return self.fold_InlineExpr(inlined)
+
+    def substitute(self, node, values: Dict[str, Any]):
+        """Replace reads of the names in values with literals."""
+        if isinstance(node, Identifier):
+            if node.name in values:
+                return Literal(value=values[node.name], line=node.line, column=node.column)
+        elif isinstance(node, (BinaryOp, LogicalOp)):
+            node.left = self.substitute(node.left, values)
+            node.right = self.substitute(node.right, values)
+        elif isinstance(node, UnaryOp):
+            node.operand = self.substitute(node.operand, values)
+        elif isinstance(node, CallExpr):
+            node.arguments = [self.substitute(arg, values) for arg in node.arguments]
+        elif isinstance(node, IndexExpr):
+            node.collection = self.substitute(node.collection, values)
+            node.index = self.substitute(node.index, values)
+        elif isinstance(node, MemberExpr):
+            node.object = self.substitute(node.object, values)
+        elif isinstance(node, TomeExpr):
+            node.elements = [self.substitute(elem, values) for elem in node.elements]
+        elif isinstance(node, GrimoireExpr):
+            node.pairs = [(self.substitute(key, values), self.substitute(value, values))
+                          for key, value in node.pairs]
+        elif isinstance(node, InlineExpr):
+            # The inner body only sees its own parameters
+            node.arguments = [self.substitute(arg, values) for arg in node.arguments]
+        return node
+
+    # ============ Loop-Invariant Hoisting ============
+
+    def hoist_block(self, statements: list) -> list:
+        """Hoist invariants out of every loop in statements, nested ones included."""
+        result = []
+        for stmt in statements:
+            if isinstance(stmt, (WhileStmt, ForStmt)):
+                result.extend(self.hoist_loop(stmt))
+            else:
+                result.append(stmt)
+            if isinstance(stmt, IfStmt):
+                stmt.then_branch = self.hoist_block(stmt.then_branch)
+                stmt.elif_branches = [(condition, self.hoist_block(body))
+                                      for condition, body in stmt.elif_branches]
+                if stmt.else_branch is not None:
+                    stmt.else_branch = self.hoist_block(stmt.else_branch)
+            elif isinstance(stmt, (WhileStmt, ForStmt, SpellDecl)):
+                stmt.body = self.hoist_block(stmt.body)
+        return result
+
+    def hoist_loop(self, node) -> list:
+        """Cache the loop's invariant expressions; return the statements replacing it."""
+        written = set()
+        if not self.scan_statements([node], written):
+            return [node]
+
+        hoisted: List[InvariantExpr] = []
+        if isinstance(node, WhileStmt):
+            node.condition = self.hoist_expression(node.condition, written, hoisted)
+        self.hoist_statements(node.body, written, hoisted)
+
+        kind = "patrol" if isinstance(node, WhileStmt) else "hunt"
+        declarations = []
+        for invariant in hoisted:
+            self.note(invariant, f"{self.describe(invariant.expression)} is loop-invariant; "
+                                 f"evaluated once per {kind} loop entry")
+            declarations.append(VarDecl(name=invariant.name, value=Literal(value=UNSET),
+                                        line=node.line, column=node.column))
+        return declarations + [node]
+
+    def builtin(self, callee) -> Optional[BuiltinFunction]:
+        """Return the builtin callee always refers to, or None."""
+        if self.environment is None:
+            return None
+        if not isinstance(callee, Identifier) or callee.name in self.shadowed:
+            return None
+        value = self.environment.values.get(callee.name)
+        return value if isinstance(value, BuiltinFunction) else None
+
+    def scan_statements(self, statements: list, written: set) -> bool:
+        """Collect the names statements may rebind into written.
+
+        Returns False if they may do anything a cached value could miss:
+        call a spell or a builtin that is not PURE or READ_ONLY, assign
+        an element of a tome or grimoire, yield (the consumer runs
+        arbitrary code while the generator is suspended), or hunt through
+        anything that could be a generator spell's stream (which runs the
+        spell's body between iterations).
+        """
+        for stmt in statements:
+            if isinstance(stmt, (IndexAssign, YieldStmt)):
+                return False
+            if isinstance(stmt, ForStmt) and not self.plain_iterable(stmt.iterable):
+                return False
+            if isinstance(stmt, (VarDecl, VarAssign, VarDelete, SpellDecl)):
+                written.add(stmt.name)
+            elif isinstance(stmt, ForStmt):
+                written.add(stmt.variable)
+
+            if isinstance(stmt, SpellDecl):
+                continue  # The body only runs if called, and calling it is rejected
+            if isinstance(stmt, ExprStmt):
+                expressions = [stmt.expression]
+            elif isinstance(stmt, (VarDecl, VarAssign)):
+                expressions = [stmt.value]
+            elif isinstance(stmt, CastStmt):
+                expressions = [stmt.value] if stmt.value is not None else []
+            elif isinstance(stmt, IfStmt):
+                expressions = [stmt.condition] + [condition for condition, _ in stmt.elif_branches]
+            elif isinstance(stmt, WhileStmt):
+                expressions = [stmt.condition]
+            elif isinstance(stmt, ForStmt):
+                expressions = [stmt.iterable]
+            else:
+                expressions = []
+            if not all(self.scan_expression(expr) for expr in expressions):
+                return False
+            if not all(self.scan_statements(body, written) for body in _loop_bodies(stmt)):
+                return False
+        return True
+
+    def plain_iterable(self, node) -> bool:
+        """Check that walking node, once evaluated, cannot run a spell.
+
+        Only a tome or grimoire literal, a tome variable that is never
+        rebound, or a call to a builtin that returns a tome or range
+        qualifies: any other value may be a generator spell's stream.
+        """
+        if isinstance(node, (TomeExpr, GrimoireExpr, Literal)):
+            return True
+        if isinstance(node, Identifier):
+            return node.name in self.tome_names
+        if isinstance(node, CallExpr):
+            builtin = self.builtin(node.callee)
+            return builtin is not None and builtin.name in _PLAIN_ITERABLE_BUILTINS
+        return False
+
+    def scan_expression(self, node) -> bool:
+        """Check that evaluating node cannot modify any value or variable."""
+        if isinstance(node, CallExpr):
+            builtin = self.builtin(node.callee)
+            if builtin is None or not builtin.read_only:
+                return False
+            return all(self.scan_expression(arg) for arg in node.arguments)
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            return self.scan_expression(node.left) and self.scan_expression(node.right)
+        if isinstance(node, UnaryOp):
+            return self.scan_expression(node.operand)
+        if isinstance(node, IndexExpr):
+            return self.scan_expression(node.collection) and self.scan_expression(node.index)
+        if isinstance(node, MemberExpr):
+            return self.scan_expression(node.object)
+        if isinstance(node, TomeExpr):
+            return all(self.scan_expression(elem) for elem in node.elements)
+        if isinstance(node, GrimoireExpr):
+            return all(self.scan_expression(key) and self.scan_expression(value)
+                       for key, value in node.pairs)
+        if isinstance(node, InvariantExpr):
+            return self.scan_expression(node.expression)
+        if isinstance(node, InlineExpr):
+            return (all(self.scan_expression(arg) for arg in node.arguments)
+                    and self.scan_expression(node.body))
+        return True
+
+    def invariant(self, node, written: set) -> bool:
+        """Check whether node has the same value on every iteration."""
+        if isinstance(node, (Literal, InvariantExpr)):
+            return True
+        if isinstance(node, Identifier):
+            return node.name not in written
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            return self.invariant(node.left, written) and self.invariant(node.right, written)
+        if isinstance(node, UnaryOp):
+            return self.invariant(node.operand, written)
+        if isinstance(node, CallExpr):
+            builtin = self.builtin(node.callee)
+            return (builtin is not None and builtin.pure
+                    and all(self.invariant(arg, written) for arg in node.arguments))
+        if isinstance(node, InlineExpr):
+            return not node.arguments and self.invariant(node.body, written)
+        return False
+
+    def worth_hoisting(self, node) -> bool:
+        """Check that node calls a pure builtin and always yields an immutable value.
+
+        Values that could be tomes or grimoires are never cached, since every
+        evaluation would otherwise have produced a fresh one.
+        """
+        if isinstance(node, CallExpr):
+            return True  # Only pure builtins pass invariant()
+        if isinstance(node, UnaryOp):
+            return self.worth_hoisting(node.operand)
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            # Pure builtins return numbers and scrolls, and arithmetic on
+            # those either yields another one or raises
+            return self.worth_hoisting(node.left) or self.worth_hoisting(node.right)
+        if isinstance(node, InlineExpr):
+            return self.worth_hoisting(node.body)
+        return False
+
+    def hoist_expression(self, node, written: set, hoisted: list):
+        """Replace the largest invariant parts of node with cached InvariantExprs."""
+        if self.invariant(node, written) and self.worth_hoisting(node):
+            invariant = InvariantExpr(expression=node, name=f"<invariant {self.invariants}>",
+                                      line=node.line, column=node.column)
+            self.invariants += 1
+            hoisted.append(invariant)
+            return invariant
+
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            node.left = self.hoist_expression(node.left, written, hoisted)
+            node.right = self.hoist_expression(node.right, written, hoisted)
+        elif isinstance(node, UnaryOp):
+            node.operand = self.hoist_expression(node.operand, written, hoisted)
+        elif isinstance(node, CallExpr):
+            node.arguments = [self.hoist_expression(arg, written, hoisted) for arg in node.arguments]
+        elif isinstance(node, IndexExpr):
+            node.collection = self.hoist_expression(node.collection, written, hoisted)
+            node.index = self.hoist_expression(node.index, written, hoisted)
+        elif isinstance(node, MemberExpr):
+            node.object = self.hoist_expression(node.object, written, hoisted)
+        elif isinstance(node, TomeExpr):
+            node.elements = [self.hoist_expression(elem, written, hoisted) for elem in node.elements]
+        elif isinstance(node, GrimoireExpr):
+            node.pairs = [(self.hoist_expression(key, written, hoisted),
+                           self.hoist_expression(value, written, hoisted))
+                          for key, value in node.pairs]
+        elif isinstance(node, InlineExpr):
+            # Not the body: its parameters change with every evaluation
+            node.arguments = [self.hoist_expression(arg, written, hoisted) for arg in node.arguments]
+        return node
+
+    def hoist_statements(self, statements: list, written: set, hoisted: list):
+        """Hoist from every expression in statements, except inside spell bodies."""
+        for stmt in statements:
+            if isinstance(stmt, ExprStmt):
+                stmt.expression = self.hoist_expression(stmt.expression, written, hoisted)
+            elif isinstance(stmt, (VarDecl, VarAssign)):
+                stmt.value = self.hoist_expression(stmt.value, written, hoisted)
+            elif isinstance(stmt, CastStmt) and stmt.value is not None:
+                stmt.value = self.hoist_expression(stmt.value, written, hoisted)
+            elif isinstance(stmt, IfStmt):
+                stmt.condition = self.hoist_expression(stmt.condition, written, hoisted)
+                stmt.elif_branches = [(self.hoist_expression(condition, written, hoisted), body)
+                                      for condition, body in stmt.elif_branches]
+            elif isinstance(stmt, WhileStmt):
+                stmt.condition = self.hoist_expression(stmt.condition, written, hoisted)
+            elif isinstance(stmt, ForStmt):
+                stmt.iterable = self.hoist_expression(stmt.iterable, written, hoisted)
+            if not isinstance(stmt, SpellDecl):
+                for body in _loop_bodies(stmt):
+                    self.hoist_statements(body, written, hoisted)
+
+    def describe(self, node) -> str:
+        """Short source-like rendering of an expression for change notes."""
+        if isinstance(node, Literal):
+            return format_literal(node.value)
+        if isinstance(node, Identifier):
+            return node.name
+        if isinstance(node, InvariantExpr):
+            return self.describe(node.expression)
+        if isinstance(node, CallExpr):
+            args = ", ".join(self.describe(arg) for arg in node.arguments)
+            return f"{self.describe(node.callee)}({args})"
+        if isinstance(node, (BinaryOp, LogicalOp)):
+            return f"{self.describe(node.left)} {node.operator} {self.describe(node.right)}"
+        if isinstance(node, UnaryOp):
+            return f"{node.operator} {self.describe(node.operand)}"
+        return "..."
@@ -3,10 +3,10 @@
 from typing import List, Optional
 from .tokens import Token, TokenType
 from .ast_nodes import (
-    Program, Literal, Identifier, BinaryOp, UnaryOp,
+    Program, Literal, Identifier, BinaryOp, LogicalOp, UnaryOp,
     TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr,
     VarDecl, VarAssign, IndexAssign, VarDelete,
-    SpellDecl, CastStmt, IfStmt, WhileStmt, ForStmt,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
     BreakStmt, ContinueStmt, ExprStmt
 )
 from .errors import SpellMiscast
@@ -18,6 +18,7 @@ class Parser:
     def __init__(self, tokens: List[Token]):
         self.tokens = tokens
         self.current = 0
+        self.spell_yields: List[bool] = []  # Per enclosing spell: has a yield been parsed
 
     def parse(self) -> Program:
         """Parse the token stream into a Program AST."""
@@ -42,10 +43,12 @@ class Parser:
             return self.var_assignment()
         if self.check(TokenType.VANQUISH):
             return self.var_delete()
-        if self.check(TokenType.SPELL) or self.check(TokenType.INCANTATION):
+        if self.check(TokenType.SPELL) or self.check(TokenType.INCANTATION) or self.check(TokenType.PURE):
             return self.spell_declaration()
         if self.check(TokenType.CAST):
             return self.cast_statement()
+        if self.check(TokenType.YIELD):
+            return self.yield_statement()
         if self.check(TokenType.PROPHECY):
             return self.if_statement()
         if self.check(TokenType.PATROL):
@@ -125,10 +128,13 @@ class Parser:
         return VarDelete(name=name_token.value, line=token.line, column=token.column)
 
     def spell_declaration(self):
-        """Parse: spell/incantation name(params) { body }."""
+        """Parse: [pure] spell/incantation name(params) { body }."""
+        line, col = self.peek().line, self.peek().column
+        is_pure = self.match(TokenType.PURE)
+        if is_pure and not (self.check(TokenType.SPELL) or self.check(TokenType.INCANTATION)):
+            raise SpellMiscast("Expected 'spell' or 'incantation' after 'pure'", self.peek().line, self.peek().column)
         token = self.advance()  # SPELL or INCANTATION
         is_incantation = token.type == TokenType.INCANTATION
-        line, col = token.line, token.column
 
         name_token = self.consume(TokenType.IDENTIFIER, "Expected spell name")
         name = name_token.value
@@ -144,13 +150,19 @@ class Parser:
 
         self.consume(TokenType.RPAREN, "Expected ')' after parameters")
 
-        body = self.block()
+        self.spell_yields.append(False)
+        try:
+            body = self.block()
+        finally:
+            is_generator = self.spell_yields.pop()
 
         return SpellDecl(
             name=name,
             params=params,
             body=body,
             is_incantation=is_incantation,
+            is_pure=is_pure,
+            is_generator=is_generator,
             line=line,
             column=col
         )
@@ -163,6 +175,15 @@ class Parser:
             value = self.expression()
         return CastStmt(value=value, line=token.line, column=token.column)
 
+    def yield_statement(self):
+        """Parse: yield value."""
+        token = self.advance()  # YIELD
+        if not self.spell_yields:
+            raise SpellMiscast("'yield' is only allowed inside a spell", token.line, token.column)
+        self.spell_yields[-1] = True
+        value = self.expression()
+        return YieldStmt(value=value, line=token.line, column=token.column)
+
     def if_statement(self):
         """Parse: prophecy reveals condition { body }."""
         token = self.advance()  # PROPHECY
@@ -282,7 +303,7 @@ class Parser:
         while self.match(TokenType.OR):
             op = "or"
             right = self.and_expr()
-            left = BinaryOp(left=left, operator=op, right=right, line=left.line, column=left.column)
+            left = LogicalOp(left=left, operator=op, right=right, line=left.line, column=left.column)
 
         return left
 
@@ -293,7 +314,7 @@ class Parser:
         while self.match(TokenType.AND):
             op = "and"
             right = self.not_expr()
-            left = BinaryOp(left=left, operator=op, right=right, line=left.line, column=left.column)
+            left = LogicalOp(left=left, operator=op, right=right, line=left.line, column=left.column)
 
         return left
 
@@ -0,0 +1,224 @@
+"""Sampling profiler for SlayScript programs.
+
+A background thread wakes every `interval` seconds and reads the main
+thread's Python stack (sys._current_frames). The engines already keep what
+is needed to rebuild the SlayScript call stack in their Python frames, so
+nothing is instrumented and a run without --profile pays nothing:
+
+- tree: Interpreter.execute holds the node being run, SlayFunction.call
+  the spell being called and Interpreter.generate the generator spell
+- compiled: closures that report errors hold their node or line, and
+  CompiledSpell.call and CompiledGenerator.run the spell
+- vm: VM.run holds the code object, its pc and the saved callers
+
+Each sample becomes a stack of (spell, line) frames, outermost first, with
+"<program>" at the root; the line of a caller is the line of its call. In
+the compiled engine only closures that can raise keep a position, so the
+line is that of the innermost call, operation or loop being run.
+
+collapsed() renders the samples in the folded format flame graph tools
+read (flamegraph.pl, inferno, speedscope); report() tabulates self and
+total time per spell and per line.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Dict, List, Optional, Tuple
+
+from .compiler import Compiler, TracingCompiler, CompiledSpell, CompiledGenerator
+from .environment import SlayFunction
+from .interpreter import Interpreter
+from .tracing import PROGRAM
+from .vm import VM
+
+# Seconds between samples by default; see --profile-interval
+DEFAULT_INTERVAL = 0.001
+
+# What a sampled Python frame tells about the SlayScript stack, by code object
+_NODE = 1         # f_locals["node"] is the AST node being run
+_LINE = 2         # f_locals["line"] is the line being run (compiled closures)
+_SPELL = 3        # f_locals["spell"] (or "self") is the spell being run
+_VM = 4           # A VM.run dispatch loop: code, pc and saved callers
+_PROGRAM = 5      # Interpreter.interpret: the root of the stack
+
+
+def _nested_codes(code: CodeType):
+    """Code objects of the functions defined inside code, at any depth."""
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield const
+            yield from _nested_codes(const)
+
+
+def _frame_kinds() -> Dict[CodeType, int]:
+    """Map the code objects of the frames the profiler reads to what they hold."""
+    kinds = {
+        Interpreter.execute.__code__: _NODE,
+        Interpreter.traced_execute.__code__: _NODE,
+        Interpreter.generate.__code__: _SPELL,
+        Interpreter.interpret.__code__: _PROGRAM,
+        SlayFunction.call.__code__: _SPELL,
+        CompiledSpell.call.__code__: _SPELL,
+        CompiledGenerator.run.__code__: _SPELL,
+        VM.run.__code__: _VM,
+    }
+    for method in (*vars(Compiler).values(), *vars(TracingCompiler).values()):
+        code = getattr(method, "__code__", None)
+        if code is None:
+            continue
+        for closure in _nested_codes(code):
+            if "node" in closure.co_freevars:
+                kinds[closure] = _NODE
+            elif "line" in closure.co_freevars:
+                kinds[closure] = _LINE
+    return kinds
+
+
+def _label(frame: Tuple[str, Optional[int]]) -> str:
+    name, line = frame
+    return name if line is None else f"{name}:{line}"
+
+
+class SamplingProfiler:
+    """Samples the SlayScript call stack of the thread that starts it.
+
+    Usage: start() before running the program and stop() after it (or use
+    it as a context manager), then read collapsed() and report().
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()  # Stack (outermost first) -> samples
+        self.total = 0
+        self.elapsed = 0.0  # Wall-clock seconds spent sampling
+        self.kinds = _frame_kinds()
+        self._target = None  # Thread id of the profiled thread
+        self._thread = None
+        self._done = threading.Event()
+        self._started = 0.0
+        self._switch_interval = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start sampling the calling thread."""
+        self._target = threading.get_ident()
+        # The sampler only runs when the interpreter lets go of the GIL,
+        # which by default happens every 5 ms
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._done.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="slayscript-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; collected samples stay available."""
+        if self._thread is None:
+            return
+        self._done.set()
+        self._thread.join()
+        self._thread = None
+        self.elapsed += time.perf_counter() - self._started
+        sys.setswitchinterval(self._switch_interval)
+
+    def _sample_loop(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = self.sample(frame)
+            if stack:
+                self.samples[stack] += 1
+                self.total += 1
+
+    def sample(self, frame) -> tuple:
+        """Rebuild the SlayScript stack, outermost first, from a Python frame."""
+        kinds = self.kinds
+        stack: List[Tuple[str, Optional[int]]] = []  # Innermost first
+        line = None  # Innermost known line of the spell being walked
+        while frame is not None:
+            kind = kinds.get(frame.f_code)
+            if kind is None:
+                pass
+            elif kind == _NODE:
+                if line is None:
+                    line = getattr(frame.f_locals.get("node"), "line", None)
+            elif kind == _LINE:
+                if line is None:
+                    line = frame.f_locals.get("line")
+            elif kind == _SPELL:
+                local_vars = frame.f_locals
+                spell = local_vars.get("spell") or local_vars.get("self")
+                if spell is not None:
+                    declaration = spell.declaration
+                    # Not inside a statement yet: binding arguments, creating the frame
+                    stack.append((declaration.name, declaration.line if line is None else line))
+                line = None
+            elif kind == _VM:
+                local_vars = frame.f_locals
+                code, pc = local_vars.get("code"), local_vars.get("pc", 0)
+                if code is not None:
+                    if pc:
+                        stack.append((code.name, code.node_at(pc).line))
+                    else:
+                        stack.append((code.name, getattr(code.declaration, "line", None)))
+                    for record in reversed(local_vars.get("frames") or ()):
+                        caller, caller_pc = record[0], record[1]
+                        stack.append((caller.name, caller.node_at(caller_pc).line))
+                line = None
+            elif line is not None:  # _PROGRAM, when the tree or compiled engine runs it
+                stack.append((PROGRAM, line))
+                line = None
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    # ============ Output ============
+
+    def collapsed(self) -> str:
+        """Folded stacks, one "frame;frame;frame count" line per distinct stack."""
+        folded: Counter = Counter()
+        for stack, count in self.samples.items():
+            folded[";".join(_label(frame) for frame in stack)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(folded.items()))
+
+    def report(self, limit: int = 15) -> List[str]:
+        """Self and total time per spell and per line, hottest first."""
+        if not self.total:
+            return ["no samples (the program finished before the first one)"]
+        spell_self: Counter = Counter()
+        spell_total: Counter = Counter()
+        line_self: Counter = Counter()
+        line_total: Counter = Counter()
+        for stack, count in self.samples.items():
+            spell_self[stack[-1][0]] += count
+            line_self[stack[-1]] += count
+            # Recursive spells count once per sample towards their total
+            for name in {name for name, _ in stack}:
+                spell_total[name] += count
+            for frame in set(stack):
+                line_total[frame] += count
+
+        seconds = self.elapsed / self.total
+
+        def cell(count: int) -> str:
+            return f"{count * seconds:9.3f}s {100 * count / self.total:5.1f}%"
+
+        lines = [f"{self.total} samples over {self.elapsed:.3f}s (one per {seconds * 1000:.2f} ms)",
+                 "",
+                 f"{'spell':<32}{'self':>17}{'total':>17}"]
+        for name, count in spell_total.most_common(limit):
+            lines.append(f"{name:<32}{cell(spell_self[name])}{cell(count)}")
+        lines += ["", f"{'line':<32}{'self':>17}{'total':>17}"]
+        for frame, count in line_self.most_common(limit):
+            lines.append(f"{_label(frame):<32}{cell(count)}{cell(line_total[frame])}")
+        return lines
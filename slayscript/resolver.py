@@ -0,0 +1,306 @@
+"""Static scope resolution for SlayScript.
+
+The Resolver runs between parsing and execution. It assigns every
+variable declared inside a block or spell a numbered slot in that block's
+scope and annotates each variable access with the (depth, slot) of the
+binding it refers to, so the execution engines index straight into scope
+slots instead of searching dictionaries up the scope chain.
+
+Top-level variables, builtins and anything not declared in an enclosing
+block stay global (depth -1) and are looked up by name at runtime.
+
+Blocks that declare nothing get no scope of their own (size 0): they run
+directly in the enclosing scope, so patrol and prophecy bodies that only
+transmute outer variables allocate nothing per iteration. A hunt loop whose
+body declares no spell reuses one frame for all its iterations, since no
+closure can outlive an iteration and observe the reset.
+
+Straight-line code resolves names in declaration order, exactly like the
+dynamic scope chain does. Spell bodies are resolved last, once their
+enclosing scopes are complete, so a spell can refer to a sibling spell or
+variable conjured after it. If the resolved slot turns out to be empty at
+runtime (not conjured yet, or vanquished), the engines fall back to the
+shadowed outer bindings recorded in `fallbacks`, and then to the globals.
+"""
+
+from typing import List
+from .ast_nodes import (
+    Program, Identifier, BinaryOp, LogicalOp, UnaryOp,
+    TomeExpr, GrimoireExpr, IndexExpr, CallExpr, MemberExpr, InvariantExpr, InlineExpr,
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt, ExprStmt
+)
+
+# Depth of names that are not declared in any enclosing block or spell
+GLOBAL = -1
+
+
+class Binding:
+    """A variable slot in a static scope."""
+
+    __slots__ = ("slot", "is_const")
+
+    def __init__(self, slot: int, is_const: bool = False):
+        self.slot = slot
+        self.is_const = is_const
+
+
+class StaticScope:
+    """Compile-time view of one runtime scope."""
+
+    __slots__ = ("bindings",)
+
+    def __init__(self):
+        self.bindings = {}
+
+    def declare(self, name: str, is_const: bool = False) -> Binding:
+        binding = self.bindings.get(name)
+        if binding is None:
+            binding = Binding(len(self.bindings), is_const)
+            self.bindings[name] = binding
+        elif is_const:
+            binding.is_const = True
+        return binding
+
+    @property
+    def size(self) -> int:
+        return len(self.bindings)
+
+
+def declares(statements: list) -> bool:
+    """Check whether a block conjures or declares anything in its own scope."""
+    return any(isinstance(stmt, (VarDecl, SpellDecl)) for stmt in statements)
+
+
+def contains_spell(statements: list) -> bool:
+    """Check whether a spell is declared anywhere inside statements."""
+    for stmt in statements:
+        if isinstance(stmt, SpellDecl):
+            return True
+        if isinstance(stmt, IfStmt):
+            bodies = [stmt.then_branch] + [body for _, body in stmt.elif_branches]
+            if stmt.else_branch is not None:
+                bodies.append(stmt.else_branch)
+            if any(contains_spell(body) for body in bodies):
+                return True
+        elif isinstance(stmt, (WhileStmt, ForStmt)):
+            if contains_spell(stmt.body):
+                return True
+    return False
+
+
+class Resolver:
+    """Annotates a Program with scope sizes and (depth, slot) addresses."""
+
+    def __init__(self):
+        self.scopes: List[StaticScope] = []
+        self.pending = []  # (SpellDecl, enclosing scopes) resolved after their scopes close
+        self.in_spell = False
+        self.in_generator = False
+        self.loop_depth = 0  # Loops open in the current spell (or program)
+
+    def resolve(self, program: Program) -> Program:
+        """Resolve a whole program in place and return it."""
+        self.scopes = []
+        self.pending = []
+        self.in_spell = False
+        self.in_generator = False
+        self.loop_depth = 0
+
+        for stmt in program.statements:
+            self.statement(stmt)
+
+        while self.pending:
+            node, enclosing = self.pending.pop(0)
+            self.resolve_spell(node, enclosing)
+
+        program.resolved = True
+        return program
+
+    def resolve_spell(self, node: SpellDecl, enclosing: List[StaticScope]):
+        self.scopes = list(enclosing)
+        self.in_spell = True
+        self.in_generator = node.is_generator
+        self.loop_depth = 0
+        if not node.params and not declares(node.body):
+            # Nothing to hold: the body runs directly in the closure scope
+            for stmt in node.body:
+                self.statement(stmt)
+            node.frame_size = 0
+            return
+
+        frame = StaticScope()
+        self.scopes.append(frame)
+        for param in node.params:
+            frame.declare(param)
+        for stmt in node.body:
+            self.statement(stmt)
+        node.frame_size = frame.size
+
+    # ============ Scope Helpers ============
+
+    def block(self, statements: list) -> int:
+        """Resolve statements in a new scope and return its slot count.
+
+        A block that declares nothing is elided: it is resolved in the
+        enclosing scope and its size is 0.
+        """
+        if not declares(statements):
+            for stmt in statements:
+                self.statement(stmt)
+            return 0
+
+        scope = StaticScope()
+        self.scopes.append(scope)
+        for stmt in statements:
+            self.statement(stmt)
+        self.scopes.pop()
+        return scope.size
+
+    def declare(self, name: str, is_const: bool = False) -> int:
+        """Declare name in the innermost scope and return its slot (or GLOBAL)."""
+        if not self.scopes:
+            return GLOBAL
+        return self.scopes[-1].declare(name, is_const).slot
+
+    def lookup(self, name: str):
+        """Find the innermost binding of name.
+
+        Returns (depth, binding, fallbacks), where fallbacks lists the
+        (depth, slot) of shadowed bindings further out, or
+        (GLOBAL, None, ()) when name is not declared in any scope.
+        """
+        found = None
+        fallbacks = []
+        for depth, scope in enumerate(reversed(self.scopes)):
+            binding = scope.bindings.get(name)
+            if binding is None:
+                continue
+            if found is None:
+                found = (depth, binding)
+            else:
+                fallbacks.append((depth, binding.slot))
+        if found is None:
+            return GLOBAL, None, ()
+        return found[0], found[1], tuple(fallbacks)
+
+    def annotate(self, node, name: str):
+        """Record the address of the binding node refers to; return it."""
+        depth, binding, fallbacks = self.lookup(name)
+        node.depth = depth
+        node.slot = binding.slot if binding is not None else 0
+        node.fallbacks = fallbacks
+        return binding
+
+    # ============ Statements ============
+
+    def statement(self, node):
+        method = getattr(self, f"resolve_{type(node).__name__}", None)
+        if method is not None:
+            method(node)
+
+    def resolve_ExprStmt(self, node: ExprStmt):
+        self.expression(node.expression)
+
+    def resolve_VarDecl(self, node: VarDecl):
+        self.expression(node.value)
+        node.slot = self.declare(node.name, node.is_const)
+
+    def resolve_VarAssign(self, node: VarAssign):
+        self.expression(node.value)
+        binding = self.annotate(node, node.name)
+        node.is_const_target = binding is not None and binding.is_const
+
+    def resolve_IndexAssign(self, node: IndexAssign):
+        self.expression(node.collection)
+        self.expression(node.index)
+        self.expression(node.value)
+
+    def resolve_VarDelete(self, node: VarDelete):
+        binding = self.annotate(node, node.name)
+        node.is_const_target = binding is not None and binding.is_const
+
+    def resolve_SpellDecl(self, node: SpellDecl):
+        node.slot = self.declare(node.name)
+        self.pending.append((node, list(self.scopes)))
+
+    def resolve_CastStmt(self, node: CastStmt):
+        if node.value is not None:
+            self.expression(node.value)
+        # Inside a loop, a break or continue escaping the called spell would
+        # end this spell's loop rather than the spell, so the call must nest.
+        # A generator's cast only ends its stream, so it never tail-calls.
+        node.tail_call = (self.in_spell and not self.in_generator and not self.loop_depth
+                          and isinstance(node.value, CallExpr))
+
+    def resolve_YieldStmt(self, node: YieldStmt):
+        self.expression(node.value)
+
+    def resolve_IfStmt(self, node: IfStmt):
+        sizes = []
+        self.expression(node.condition)
+        sizes.append(self.block(node.then_branch))
+        for elif_cond, elif_body in node.elif_branches:
+            self.expression(elif_cond)
+            sizes.append(self.block(elif_body))
+        if node.else_branch is not None:
+            sizes.append(self.block(node.else_branch))
+        node.branch_sizes = sizes
+
+    def resolve_WhileStmt(self, node: WhileStmt):
+        self.expression(node.condition)
+        self.loop_depth += 1
+        node.scope_size = self.block(node.body)
+        self.loop_depth -= 1
+
+    def resolve_ForStmt(self, node: ForStmt):
+        self.expression(node.iterable)
+        scope = StaticScope()
+        scope.declare(node.variable)  # Always slot 0
+        self.scopes.append(scope)
+        self.loop_depth += 1
+        for stmt in node.body:
+            self.statement(stmt)
+        self.loop_depth -= 1
+        self.scopes.pop()
+        node.scope_size = scope.size
+        node.reuse_frame = not contains_spell(node.body)
+
+    # ============ Expressions ============
+
+    def expression(self, node):
+        if isinstance(node, Identifier):
+            self.annotate(node, node.name)
+        elif isinstance(node, (BinaryOp, LogicalOp)):
+            self.expression(node.left)
+            self.expression(node.right)
+        elif isinstance(node, UnaryOp):
+            self.expression(node.operand)
+        elif isinstance(node, CallExpr):
+            self.expression(node.callee)
+            for arg in node.arguments:
+                self.expression(arg)
+        elif isinstance(node, IndexExpr):
+            self.expression(node.collection)
+            self.expression(node.index)
+        elif isinstance(node, MemberExpr):
+            self.expression(node.object)
+        elif isinstance(node, TomeExpr):
+            for elem in node.elements:
+                self.expression(elem)
+        elif isinstance(node, GrimoireExpr):
+            for key, value in node.pairs:
+                self.expression(key)
+                self.expression(value)
+        elif isinstance(node, InvariantExpr):
+            self.annotate(node, node.name)
+            self.expression(node.expression)
+        elif isinstance(node, InlineExpr):
+            for arg in node.arguments:
+                self.expression(arg)
+            scope = StaticScope()
+            for param in node.params:
+                scope.declare(param)
+            self.scopes.append(scope)
+            self.expression(node.body)
+            self.scopes.pop()
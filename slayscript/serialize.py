@@ -0,0 +1,252 @@
+"""Compact binary encoding of SlayScript ASTs.
+
+dump_ast(node) returns bytes and load_ast(data) rebuilds an equal tree,
+much smaller and faster to load than a pickle of the node dataclasses.
+The cache of parsed programs (cache.py) stores this format.
+
+Layout, all integers as unsigned LEB128 varints unless noted:
+
+    header      b"SLAYAST" and one byte FORMAT_VERSION
+    strings     count, then per string its UTF-8 length and bytes
+    value       one byte tag, then:
+                  NONE, FALSE, TRUE     nothing
+                  INT                   zigzag varint (any size)
+                  FLOAT                 8 bytes, little-endian IEEE 754
+                  STR                   index into strings
+                  LIST, TUPLE           length, then that many values
+                  NODE                  node type tag (index into NODE_TYPES),
+                                        line and column (zigzag), then one
+                                        value per field of the node type,
+                                        in order
+
+Node type tags and field order are part of the format: FORMAT_VERSION
+changes whenever a node type or field is added, removed or reordered, and
+load_ast refuses data of any other version. Inline caches of the tree
+interpreter (CallExpr.callee_cache, BinaryOp.spec) hold runtime objects
+and are written as NONE; everything the Resolver, Optimizer and
+TypeInference annotate is kept.
+"""
+
+import gc
+import struct
+from dataclasses import fields
+from typing import Dict, List
+
+from . import ast_nodes
+from .ast_nodes import ASTNode
+
+FORMAT_VERSION = 1
+
+_HEADER = b"SLAYAST" + bytes([FORMAT_VERSION])
+
+# Node type tags, by position: append only, and bump FORMAT_VERSION
+NODE_TYPES = (
+    ast_nodes.Literal, ast_nodes.Identifier, ast_nodes.BinaryOp, ast_nodes.LogicalOp,
+    ast_nodes.UnaryOp, ast_nodes.TomeExpr, ast_nodes.GrimoireExpr, ast_nodes.IndexExpr,
+    ast_nodes.CallExpr, ast_nodes.MemberExpr, ast_nodes.InvariantExpr, ast_nodes.InlineExpr,
+    ast_nodes.Program, ast_nodes.VarDecl, ast_nodes.VarAssign, ast_nodes.IndexAssign,
+    ast_nodes.VarDelete, ast_nodes.SpellDecl, ast_nodes.CastStmt, ast_nodes.YieldStmt,
+    ast_nodes.IfStmt, ast_nodes.WhileStmt, ast_nodes.ForStmt, ast_nodes.BreakStmt,
+    ast_nodes.ContinueStmt, ast_nodes.ExprStmt,
+)
+
+# Runtime caches, written as NONE
+_CACHE_FIELDS = frozenset({"callee_cache", "spec"})
+
+# Value tags
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _TUPLE, _NODE = range(9)
+
+_DOUBLE = struct.Struct("<d")
+
+
+def _field_names(node_type) -> tuple:
+    """Fields encoded after line and column, in declaration order."""
+    return tuple(item.name for item in fields(node_type) if item.name not in ("line", "column"))
+
+
+_FIELDS = {node_type: _field_names(node_type) for node_type in NODE_TYPES}
+_TAGS = {node_type: tag for tag, node_type in enumerate(NODE_TYPES)}
+
+
+def _zigzag(value: int) -> int:
+    """Map ..., -2, -1, 0, 1, 2, ... to the varint friendly 3, 1, 0, 2, 4, ..."""
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+# ============ Encoding ============
+
+class _Encoder:
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.out = bytearray()
+
+    def string(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def value(self, value):
+        out = self.out
+        kind = type(value)
+        if value is None:
+            out.append(_NONE)
+        elif kind is bool:
+            out.append(_TRUE if value else _FALSE)
+        elif kind is int:
+            out.append(_INT)
+            _varint(out, _zigzag(value))
+        elif kind is float:
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif kind is str:
+            out.append(_STR)
+            _varint(out, self.string(value))
+        elif kind is list or kind is tuple:
+            out.append(_LIST if kind is list else _TUPLE)
+            _varint(out, len(value))
+            for item in value:
+                self.value(item)
+        elif kind in _TAGS:
+            out.append(_NODE)
+            _varint(out, _TAGS[kind])
+            _varint(out, _zigzag(value.line))
+            _varint(out, _zigzag(value.column))
+            for name in _FIELDS[kind]:
+                self.value(None if name in _CACHE_FIELDS else getattr(value, name))
+        else:
+            raise ValueError(f"Cannot serialize {kind.__name__} value {value!r}")
+
+
+def dump_ast(node: ASTNode) -> bytes:
+    """Encode an AST (usually a Program) in the binary format."""
+    encoder = _Encoder()
+    encoder.value(node)
+    table = bytearray(_HEADER)
+    _varint(table, len(encoder.strings))
+    for text in encoder.strings:
+        encoded = text.encode("utf-8")
+        _varint(table, len(encoded))
+        table += encoded
+    return bytes(table + encoder.out)
+
+
+# ============ Decoding ============
+
+def load_ast(data: bytes) -> ASTNode:
+    """Rebuild the AST encoded by dump_ast; raises ValueError on malformed data."""
+    if not data.startswith(_HEADER):
+        raise ValueError("Not a SlayScript AST of format version "
+                         f"{FORMAT_VERSION} (header {bytes(data[:len(_HEADER)])!r})")
+    # The tree is built bottom-up and nothing in it is garbage yet, so
+    # collections triggered by the allocations would only slow loading
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode(data)
+    except IndexError:
+        raise ValueError("Malformed SlayScript AST: truncated") from None
+    except (UnicodeDecodeError, struct.error) as error:
+        raise ValueError(f"Malformed SlayScript AST: {error}") from None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _decode(data: bytes) -> ASTNode:
+    pos = len(_HEADER)
+    # Node constructors take line, column and then the fields in _FIELDS order
+    node_types = [(node_type, len(_FIELDS[node_type])) for node_type in NODE_TYPES]
+    unpack_double = _DOUBLE.unpack_from
+
+    def varint() -> int:
+        nonlocal pos
+        byte = data[pos]
+        pos += 1
+        if byte < 0x80:
+            return byte
+        result = byte & 0x7F
+        shift = 7
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    strings: List[str] = []
+    for _ in range(varint()):
+        length = varint()
+        strings.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    def value():
+        # Varints below 128 (nearly all of them) are read inline
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        if tag == _NODE:
+            index = data[pos]
+            if index < 0x80:
+                pos += 1
+            else:
+                index = varint()
+            node_type, size = node_types[index]
+            line = data[pos]
+            if line < 0x80:
+                pos += 1
+            else:
+                line = varint()
+            column = data[pos]
+            if column < 0x80:
+                pos += 1
+            else:
+                column = varint()
+            return node_type(line >> 1 if not line & 1 else -((line + 1) >> 1),
+                             column >> 1 if not column & 1 else -((column + 1) >> 1),
+                             *[value() for _ in range(size)])
+        if tag == _STR:
+            index = data[pos]
+            if index < 0x80:
+                pos += 1
+                return strings[index]
+            return strings[varint()]
+        if tag == _NONE:
+            return None
+        if tag == _LIST:
+            return [value() for _ in range(varint())]
+        if tag == _INT:
+            number = data[pos]
+            if number < 0x80:
+                pos += 1
+            else:
+                number = varint()
+            return _unzigzag(number)
+        if tag == _FALSE:
+            return False
+        if tag == _TRUE:
+            return True
+        if tag == _TUPLE:
+            return tuple([value() for _ in range(varint())])
+        if tag == _FLOAT:
+            number = unpack_double(data, pos)[0]
+            pos += 8
+            return number
+        raise ValueError(f"Malformed SlayScript AST: unknown tag {tag} at byte {pos - 1}")
+
+    node = value()
+    if pos != len(data):
+        raise ValueError(f"Malformed SlayScript AST: {len(data) - pos} bytes after the tree")
+    return node
@@ -0,0 +1,89 @@
+"""Lazy sequences for SlayScript.
+
+A stream is a value `hunt each` consumes one item at a time, without the
+whole sequence ever being built as a tome. Builtins that produce
+sequences return one: stream_range() gives a RangeStream, which also
+knows its length and supports O(1) indexing, and stream_lines(),
+stream_oracle() and calls to generator spells (spells that yield) wrap a
+Python generator in an IterStream, which can be walked once.
+
+The engines need nothing beyond Python's iterator protocol to loop over a
+stream. A hunt loop that ends early closes its iterator, so the producer
+behind a stream (a file, a cursor, a suspended generator spell) is
+released at the break rather than whenever it is garbage collected.
+gather() turns any stream into a tome.
+
+range() itself still returns a tome, so append, remove, + and index
+assignment keep working on it; with --optimize, `hunt each` over a call
+to range() is rewritten to stream_range() (see Optimizer.optimize_ForStmt).
+"""
+
+
+class Stream:
+    """Base class of lazy sequences; type_of reports them as "stream"."""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release whatever produces the items (a file, a cursor); no-op by default."""
+
+
+class RangeStream(Stream):
+    """stream_range(start, end, step): a range without the list, O(1) measure and indexing."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: range):
+        self.values = values
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index: int):
+        return self.values[index]
+
+    def __eq__(self, other):
+        if isinstance(other, RangeStream):
+            return self.values == other.values
+        if isinstance(other, list):
+            return len(other) == len(self.values) and list(self.values) == other
+        return NotImplemented
+
+    __hash__ = None  # Compares equal to tomes, which cannot be hashed
+
+    def __repr__(self):
+        # Printed like the tome it stands for
+        return repr(list(self.values))
+
+
+class IterStream(Stream):
+    """A single pass over a Python iterator, such as a generator reading a file."""
+
+    __slots__ = ("iterator",)
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        close = getattr(self.iterator, "close", None)
+        if close is not None:
+            close()
+
+    def __repr__(self):
+        return "<stream>"
+
+
+def close_iterator(iterator):
+    """Close the iterator of a hunt loop, if it holds a producer (no-op once exhausted)."""
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
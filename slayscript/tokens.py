@@ -35,7 +35,9 @@ class TokenType(Enum):
     # Function keywords
     SPELL = auto()        # spell funcname():
     INCANTATION = auto()  # incantation funcname(): (auto-speaks)
+    PURE = auto()         # pure spell funcname(): (remembers results)
     CAST = auto()         # cast value (return)
+    YIELD = auto()        # yield value (makes the spell a generator)
 
     # Control flow keywords
     REVEALS = auto()      # prophecy reveals (if)
@@ -129,7 +131,9 @@ KEYWORDS = {
     # Functions
     "spell": TokenType.SPELL,
     "incantation": TokenType.INCANTATION,
+    "pure": TokenType.PURE,
     "cast": TokenType.CAST,
+    "yield": TokenType.YIELD,
 
     # Control flow
     "reveals": TokenType.REVEALS,
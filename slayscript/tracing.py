@@ -0,0 +1,197 @@
+"""Tracing hooks for SlayScript programs.
+
+Embedders register callbacks with Interpreter.add_hook(event, callback);
+the CLI's --trace registers a TracePrinter. Events and the arguments their
+callbacks receive:
+
+- spell_enter(name, arguments, line): a spell is called from line
+- spell_exit(name, result): it returned (result is None if it raised)
+- line(spell, line): a statement on line is about to run in spell
+- builtin(name, arguments, result, seconds, error): a builtin returned
+  result, or raised error (then result is None), after seconds
+- error(error): a SlayScriptError ended the program (or REPL input)
+
+No engine checks for hooks while it runs. Registering the first hook makes
+the interpreter swap in instrumented code instead: the tree engine
+dispatches through Interpreter.traced_execute, and programs compiled from
+then on use the TracingCompiler or BytecodeCompiler(traced=True), which
+emit line events and route every call through Interpreter.traced_invoke.
+Removing the last hook swaps the plain code back. While traced, a
+`cast f(...)` nests like any other call, so every spell gets its enter
+and exit events.
+
+ChromeTracer (--trace-events FILE) turns the spell and builtin events into
+spans of a Chrome trace-event file, which chrome://tracing, Perfetto and
+speedscope open.
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+from .ast_nodes import (
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
+    BreakStmt, ContinueStmt, ExprStmt
+)
+
+HOOK_EVENTS = ("spell_enter", "spell_exit", "line", "builtin", "error")
+
+PROGRAM = "<program>"
+
+# Nodes that fire a line event before they run
+STATEMENT_TYPES = frozenset({
+    VarDecl, VarAssign, IndexAssign, VarDelete,
+    SpellDecl, CastStmt, YieldStmt, IfStmt, WhileStmt, ForStmt,
+    BreakStmt, ContinueStmt, ExprStmt,
+})
+
+
+class Hooks:
+    """The callbacks registered for each event, and the spells they run in."""
+
+    def __init__(self):
+        self.callbacks: Dict[str, List[Callable]] = {event: [] for event in HOOK_EVENTS}
+        self.spells = [PROGRAM]  # Spells being run, innermost last
+
+    def __bool__(self):
+        return any(self.callbacks.values())
+
+    def add(self, event: str, callback: Callable):
+        if event not in self.callbacks:
+            raise ValueError(f"Unknown hook event '{event}' (expected one of: {', '.join(HOOK_EVENTS)})")
+        self.callbacks[event].append(callback)
+
+    def remove(self, event: str, callback: Callable):
+        if event not in self.callbacks or callback not in self.callbacks[event]:
+            raise ValueError(f"No {event} hook {callback!r} to remove")
+        self.callbacks[event].remove(callback)
+
+    # ============ Events ============
+
+    def spell_enter(self, name: str, arguments: list, line: int):
+        self.spells.append(name)
+        for callback in self.callbacks["spell_enter"]:
+            callback(name, arguments, line)
+
+    def spell_exit(self, name: str, result):
+        self.spells.pop()
+        for callback in self.callbacks["spell_exit"]:
+            callback(name, result)
+
+    def line(self, line: int):
+        spell = self.spells[-1]
+        for callback in self.callbacks["line"]:
+            callback(spell, line)
+
+    def builtin(self, name: str, arguments: list, result, seconds: float, error):
+        for callback in self.callbacks["builtin"]:
+            callback(name, arguments, result, seconds, error)
+
+    def error(self, error):
+        for callback in self.callbacks["error"]:
+            callback(error)
+
+
+def _brief(value, width: int = 40) -> str:
+    text = "void" if value is None else repr(value)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+class TracePrinter:
+    """Prints every event to a stream (stderr by default), indented by call depth."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.depth = 0
+
+    def attach(self, interpreter):
+        """Register a hook for every event on interpreter."""
+        for event in HOOK_EVENTS:
+            interpreter.add_hook(event, getattr(self, event))
+
+    def detach(self, interpreter):
+        for event in HOOK_EVENTS:
+            interpreter.remove_hook(event, getattr(self, event))
+
+    def write(self, text: str):
+        print(f"[trace] {'  ' * self.depth}{text}", file=self.stream or sys.stderr)
+
+    def spell_enter(self, name: str, arguments: list, line: int):
+        self.write(f"-> {name}({', '.join(_brief(arg) for arg in arguments)}) from line {line}")
+        self.depth += 1
+
+    def spell_exit(self, name: str, result):
+        self.depth -= 1
+        self.write(f"<- {name} = {_brief(result)}")
+
+    def line(self, spell: str, line: int):
+        self.write(f"{spell}:{line}")
+
+    def builtin(self, name: str, arguments: list, result, seconds: float, error):
+        outcome = f"!! {type(error).__name__}" if error is not None else f"= {_brief(result)}"
+        self.write(f"{name}({', '.join(_brief(arg) for arg in arguments)}) {outcome} "
+                   f"[{seconds * 1000:.3f} ms]")
+
+    def error(self, error):
+        self.write(f"!! {error.format_message()}")
+
+
+class ChromeTracer:
+    """Records spell and builtin calls as spans of a Chrome trace-event file.
+
+    Events are kept in memory and written in one go by write(), so tracing
+    adds no file I/O while the program runs. Arguments are summarized
+    (scrolls cut at `width` characters, which keeps SQL text and endpoints
+    readable), and builtin spans carry their duration as measured around
+    the call.
+    """
+
+    def __init__(self, width: int = 80):
+        self.width = width
+        self.events: List[dict] = []
+        self.pid = os.getpid()
+        self.started = time.perf_counter()
+
+    def attach(self, interpreter):
+        """Register the hooks that record spans on interpreter."""
+        for event in ("spell_enter", "spell_exit", "builtin", "error"):
+            interpreter.add_hook(event, getattr(self, event))
+
+    def detach(self, interpreter):
+        for event in ("spell_enter", "spell_exit", "builtin", "error"):
+            interpreter.remove_hook(event, getattr(self, event))
+
+    def timestamp(self, seconds_ago: float = 0.0) -> float:
+        """Microseconds since the tracer was created, as trace events count them."""
+        return (time.perf_counter() - seconds_ago - self.started) * 1e6
+
+    def record(self, phase: str, name: str, category: str, ts: float, **fields):
+        self.events.append({"ph": phase, "name": name, "cat": category, "ts": ts,
+                            "pid": self.pid, "tid": 1, **fields})
+
+    def summarize(self, arguments: list) -> List[str]:
+        return [_brief(arg, self.width) for arg in arguments]
+
+    def spell_enter(self, name: str, arguments: list, line: int):
+        self.record("B", name, "spell", self.timestamp(),
+                    args={"arguments": self.summarize(arguments), "line": line})
+
+    def spell_exit(self, name: str, result):
+        self.record("E", name, "spell", self.timestamp(), args={"result": _brief(result, self.width)})
+
+    def builtin(self, name: str, arguments: list, result, seconds: float, error):
+        outcome = {"error": str(error)} if error is not None else {"result": _brief(result, self.width)}
+        self.record("X", name, "builtin", self.timestamp(seconds), dur=seconds * 1e6,
+                    args={"arguments": self.summarize(arguments), **outcome})
+
+    def error(self, error):
+        self.record("i", type(error).__name__, "error", self.timestamp(), s="g",
+                    args={"message": error.format_message()})
+
+    def write(self, filename: str):
+        """Write the recorded events as a trace-event JSON file."""
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,683 @@
+"""Stack-based virtual machine for SlayScript bytecode."""
+
+from typing import Any, List, Optional
+from .bytecode import (
+    CodeObject, SLOT_BITS, SLOT_MASK,
+    LOAD_CONST, LOAD_LOCAL, LOAD_GLOBAL, STORE_LOCAL, ASSIGN_LOCAL,
+    DEFINE_GLOBAL, DEFINE_CONST, ASSIGN_GLOBAL, DELETE_LOCAL, DELETE_GLOBAL,
+    CONST_VIOLATION,
+    ADD, SUB, MUL, DIV, MOD, POW, EQ, NE, GT, LT, GE, LE, NEG, NOT, TO_CHARM,
+    BUILD_TOME, BUILD_GRIMOIRE, INDEX, STORE_INDEX, MEMBER,
+    JUMP, JUMP_IF_TRUE, JUMP_IF_FALSE, GET_ITER, FOR_ITER,
+    ENTER_SCOPE, EXIT_SCOPE, RESET_SCOPE, BREAK, CONTINUE,
+    MAKE_SPELL, CALL, RETURN, CAST,
+    POP, DUP, STORE_RESULT, LOAD_RESULT,
+    PEEK_LOCAL, PEEK_GLOBAL, JUMP_IF_SET, CACHE_LOCAL, CACHE_GLOBAL, TAIL_CALL, CHECK_HINT,
+    YIELD, CLOSE_ITER, TRACE_LINE, CALL_TRACED,
+)
+from .streams import RangeStream, IterStream, close_iterator
+from .environment import Frame, SlayFunction, Callable, UNSET, MISSING
+from .errors import (
+    SlayScriptError, ForbiddenMagic, UnknownIncantation, ProphecyViolation,
+    SlayerInterrupt, PatrolContinue, SpellReturn
+)
+
+# Exact types that take the arithmetic fast paths (bool deliberately excluded)
+_NUMBER_TYPES = (int, float)
+
+# Returned by next() when a hunt loop's iterator is exhausted
+_EXHAUSTED = object()
+
+
+class VMSpell(SlayFunction):
+    """A spell compiled to bytecode."""
+
+    def __init__(self, code: CodeObject, closure, vm):
+        super().__init__(code.declaration, closure, code.declaration.is_incantation,
+                         vm.interpreter.new_cache(code.declaration))
+        self.code = code
+        self.vm = vm
+
+    def call(self, interpreter, arguments: list):
+        return self.vm.call_spell(self, arguments)
+
+
+class VMGenerator(VMSpell):
+    """A spell whose code yields: calling it returns a stream (see VM.generate)."""
+
+    def call(self, interpreter, arguments: list):
+        return IterStream(self.vm.generate(self, arguments))
+
+    def __repr__(self):
+        return f"<generator spell {self.declaration.name}>"
+
+
+class Suspension:
+    """A generator spell stopped at YIELD: the value handed out and where to resume."""
+
+    __slots__ = ("value", "pc", "stack", "scope")
+
+    def __init__(self, value, pc: int, stack: list, scope):
+        self.value = value
+        self.pc = pc
+        self.stack = stack  # Only the iterators of the hunt loops the yield sits in
+        self.scope = scope
+
+
+class VM:
+    """Executes CodeObjects produced by the BytecodeCompiler."""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.globals = interpreter.globals
+
+    def execute(self, code: CodeObject) -> Any:
+        """Run top-level program code."""
+        return self.run(code, self.globals)
+
+    def call_spell(self, spell: VMSpell, arguments: list) -> Any:
+        """Run a spell's code in a fresh frame holding its arguments."""
+        code = spell.code
+        if not code.nlocals:
+            return self.run(code, spell.closure)  # No parameters or locals
+        scope = Frame(spell.closure, code.nlocals)
+        scope.slots[:len(arguments)] = arguments
+        return self.run(code, scope)
+
+    def generate(self, spell: VMGenerator, arguments: list):
+        """Run a generator spell's code lazily, yielding each value it yields.
+
+        Each step is one run() from where the last YIELD suspended it. A
+        generator's code is never pushed on another run's frames, so at a
+        YIELD it is the outermost code of its run() and nothing else needs
+        saving.
+        """
+        code = spell.code
+        if code.nlocals:
+            scope = Frame(spell.closure, code.nlocals)
+            scope.slots[:len(arguments)] = arguments
+        else:
+            scope = spell.closure  # No parameters or locals
+        suspension = None
+        while True:
+            suspension = self.run(code, scope, suspension)
+            if type(suspension) is not Suspension:
+                return
+            try:
+                yield suspension.value
+            except GeneratorExit:
+                # The consumer stopped early: release the streams this
+                # spell's own hunt loops were walking
+                for iterator in suspension.stack:
+                    close_iterator(iterator)
+                raise
+
+    def run(self, code: CodeObject, scope, resume: Optional[Suspension] = None) -> Any:
+        """Dispatch loop: execute code until it returns (or, for a generator, yields).
+
+        Calls to VMSpells do not recurse into run(): the caller's state is
+        saved on `frames` and the callee's code runs in this same loop, so
+        spells can nest as deep as memory allows.
+        """
+        interp = self.interpreter
+        truthy = interp.is_truthy
+        global_values = self.globals.values
+        global_constants = self.globals.constants
+        instructions = code.code
+        consts = code.consts
+        names = code.names
+
+        stack: List[Any] = []
+        pc = 0
+        if resume is not None:
+            stack, pc, scope = resume.stack, resume.pc, resume.scope
+        push = stack.append
+        pop = stack.pop
+        result = None
+        site = None  # The `cast f(...)` that replaced the running spell, if any
+        # Saved callers, innermost last: (code, pc, stack, scope, result, site,
+        # callee, key), where key is the callee's SpellCache key if it is pure
+        frames = []
+
+        try:
+            while True:
+                op = instructions[pc]
+                arg = instructions[pc + 1]
+                pc += 2
+
+                if op == LOAD_LOCAL:
+                    target = scope
+                    depth = arg >> SLOT_BITS
+                    while depth:
+                        target = target.parent
+                        depth -= 1
+                    value = target.slots[arg & SLOT_MASK]
+                    if value is UNSET:
+                        node = code.node_at(pc)
+                        value = scope.get_at(arg >> SLOT_BITS, arg & SLOT_MASK, node.name,
+                                             node.fallbacks, node.line, node.column)
+                    push(value)
+
+                elif op == LOAD_CONST:
+                    push(consts[arg])
+
+                elif op == LOAD_GLOBAL:
+                    name = names[arg]
+                    if name in global_values:
+                        push(global_values[name])
+                    else:
+                        node = code.node_at(pc)
+                        raise UnknownIncantation(f"Undefined variable '{name}'", node.line, node.column)
+
+                elif op == PEEK_LOCAL:
+                    target = scope
+                    depth = arg >> SLOT_BITS
+                    while depth:
+                        target = target.parent
+                        depth -= 1
+                    push(target.slots[arg & SLOT_MASK])
+
+                elif op == PEEK_GLOBAL:
+                    push(global_values.get(names[arg], UNSET))
+
+                elif op == JUMP_IF_SET:
+                    if stack[-1] is UNSET:
+                        pop()
+                    else:
+                        pc = arg
+
+                elif op == STORE_LOCAL:
+                    scope.slots[arg] = pop()
+
+                elif op == ASSIGN_LOCAL:
+                    target = scope
+                    depth = arg >> SLOT_BITS
+                    while depth:
+                        target = target.parent
+                        depth -= 1
+                    slot = arg & SLOT_MASK
+                    if target.slots[slot] is UNSET:
+                        node = code.node_at(pc)
+                        scope.assign_at(arg >> SLOT_BITS, slot, pop(), node.name,
+                                        node.fallbacks, node.line, node.column)
+                    else:
+                        target.slots[slot] = pop()
+
+                elif op == ASSIGN_GLOBAL:
+                    name = names[arg]
+                    if name in global_values and name not in global_constants:
+                        global_values[name] = pop()
+                    else:
+                        node = code.node_at(pc)
+                        self.globals.assign(name, pop(), node.line, node.column)
+
+                elif op == ADD:
+                    right = pop()
+                    left = pop()
+                    if type(left) in _NUMBER_TYPES and type(right) in _NUMBER_TYPES:
+                        push(left + right)
+                    else:
+                        push(interp.add(left, right, code.node_at(pc)))
+
+                elif op == SUB:
+                    right = pop()
+                    left = pop()
+                    if type(left) in _NUMBER_TYPES and type(right) in _NUMBER_TYPES:
+                        push(left - right)
+                    else:
+                        interp.check_numbers(left, right, code.node_at(pc))
+                        push(left - right)
+
+                elif op == LT:
+                    right = pop()
+                    push(pop() < right)
+
+                elif op == GT:
+                    right = pop()
+                    push(pop() > right)
+
+                elif op == LE:
+                    right = pop()
+                    push(pop() <= right)
+
+                elif op == GE:
+                    right = pop()
+                    push(pop() >= right)
+
+                elif op == EQ:
+                    right = pop()
+                    push(pop() == right)
+
+                elif op == NE:
+                    right = pop()
+                    push(pop() != right)
+
+                elif op == JUMP_IF_FALSE:
+                    value = pop()
+                    if value is False or (value is not True and not truthy(value)):
+                        pc = arg
+
+                elif op == JUMP_IF_TRUE:
+                    value = pop()
+                    if value is True or (value is not False and truthy(value)):
+                        pc = arg
+
+                elif op == JUMP:
+                    pc = arg
+
+                elif op == CALL:
+                    if arg:
+                        arguments = stack[-arg:]
+                        del stack[-arg:]
+                    else:
+                        arguments = []
+                    callee = pop()
+
+                    if type(callee) is VMSpell:
+                        spell_code = callee.code
+                        if arg != len(spell_code.params):
+                            node = code.node_at(pc)
+                            raise ForbiddenMagic(f"Expected {len(spell_code.params)} arguments but got {arg}",
+                                                 node.line, node.column)
+                        key = None
+                        if callee.cache is not None:
+                            key = callee.cache.key(arguments)
+                            if key is not None:
+                                value = callee.cache.get(key)
+                                if value is not MISSING:
+                                    if callee.is_incantation and value is not None:
+                                        interp.speak(str(value))
+                                    push(value)
+                                    continue
+                        frames.append((code, pc, stack, scope, result, site, callee, key))
+                        if spell_code.nlocals:
+                            scope = Frame(callee.closure, spell_code.nlocals)
+                            scope.slots[:arg] = arguments
+                        else:
+                            scope = callee.closure  # No parameters or locals
+                        code = spell_code
+                        instructions = code.code
+                        consts = code.consts
+                        names = code.names
+                        stack = []
+                        push = stack.append
+                        pop = stack.pop
+                        result = None
+                        site = None
+                        pc = 0
+                        continue
+
+                    if not isinstance(callee, Callable):
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic("Can only invoke spells and incantations", node.line, node.column)
+
+                    arity = callee.arity()
+                    if arity != -1 and arg != arity:
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic(f"Expected {arity} arguments but got {arg}", node.line, node.column)
+
+                    try:
+                        value = callee.call(interp, arguments)
+                    except (SlayerInterrupt, PatrolContinue) as escape:
+                        # The spell broke out of (or continued) the loop this call is in
+                        handler = code.loop_handlers.get(pc - 2)
+                        if handler is None:
+                            (code, pc, stack, scope, result, site, callee, key), handler = self.unwind(frames, escape)
+                            instructions = code.code
+                            consts = code.consts
+                            names = code.names
+                            push = stack.append
+                            pop = stack.pop
+                        exits, height, pc = handler[0 if isinstance(escape, SlayerInterrupt) else 1]
+                        del stack[height:]
+                        while exits:
+                            scope = scope.parent
+                            exits -= 1
+                        continue
+
+                    # If it's an incantation, speak the result
+                    if isinstance(callee, SlayFunction) and callee.is_incantation:
+                        if value is not None:
+                            interp.speak(str(value))
+                    push(value)
+
+                elif op == RETURN:
+                    value = pop()
+                    if not frames:
+                        return value
+                    code, pc, stack, scope, result, site, callee, key = frames.pop()
+                    if key is not None:
+                        callee.cache.put(key, value)
+                    instructions = code.code
+                    consts = code.consts
+                    names = code.names
+                    push = stack.append
+                    pop = stack.pop
+                    # If it's an incantation, speak the result
+                    if callee.is_incantation and value is not None:
+                        interp.speak(str(value))
+                    push(value)
+
+                elif op == TAIL_CALL:
+                    callee = stack[-arg - 1]
+                    if (type(callee) is VMSpell and not callee.is_incantation and callee.cache is None
+                            and arg == len(callee.code.params)):
+                        if arg:
+                            arguments = stack[-arg:]
+                        else:
+                            arguments = []
+                        del stack[-arg - 1:]
+                        site = code.node_at(pc)
+                        code = callee.code
+                        if code.nlocals:
+                            scope = Frame(callee.closure, code.nlocals)
+                            scope.slots[:arg] = arguments
+                        else:
+                            scope = callee.closure
+                        instructions = code.code
+                        consts = code.consts
+                        names = code.names
+                        result = None
+                        pc = 0
+
+                elif op == POP:
+                    pop()
+
+                elif op == STORE_RESULT:
+                    result = pop()
+
+                elif op == ENTER_SCOPE:
+                    scope = Frame(scope, arg)
+
+                elif op == EXIT_SCOPE:
+                    while arg:
+                        scope = scope.parent
+                        arg -= 1
+
+                elif op == RESET_SCOPE:
+                    scope.reset()
+
+                elif op == FOR_ITER:
+                    value = next(stack[-1], _EXHAUSTED)
+                    if value is _EXHAUSTED:
+                        pop()
+                        pc = arg
+                    else:
+                        push(value)
+
+                elif op == GET_ITER:
+                    iterable = pop()
+                    if not hasattr(iterable, '__iter__'):
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic("Cannot hunt through non-iterable", node.line, node.column)
+                    push(iter(iterable))
+
+                elif op == MUL:
+                    right = pop()
+                    left = pop()
+                    if type(left) in _NUMBER_TYPES and type(right) in _NUMBER_TYPES:
+                        push(left * right)
+                    else:
+                        push(interp.multiply(left, right, code.node_at(pc)))
+
+                elif op == DIV:
+                    right = pop()
+                    left = pop()
+                    node = code.node_at(pc)
+                    interp.check_numbers(left, right, node)
+                    if right == 0:
+                        raise ForbiddenMagic("Division by void is forbidden", node.line, node.column)
+                    push(left / right)
+
+                elif op == MOD:
+                    right = pop()
+                    left = pop()
+                    if type(left) not in _NUMBER_TYPES or type(right) not in _NUMBER_TYPES:
+                        interp.check_numbers(left, right, code.node_at(pc))
+                    push(left % right)
+
+                elif op == POW:
+                    right = pop()
+                    left = pop()
+                    interp.check_numbers(left, right, code.node_at(pc))
+                    push(left ** right)
+
+                elif op == TO_CHARM:
+                    value = stack[-1]
+                    if value is not True and value is not False:
+                        stack[-1] = truthy(value)
+
+                elif op == NOT:
+                    push(not truthy(pop()))
+
+                elif op == NEG:
+                    value = pop()
+                    if not isinstance(value, (int, float)):
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic("Negation requires a number", node.line, node.column)
+                    push(-value)
+
+                elif op == INDEX:
+                    index = pop()
+                    push(self.index(pop(), index, code, pc))
+
+                elif op == MEMBER:
+                    obj = pop()
+                    member = names[arg]
+                    if isinstance(obj, dict) and member in obj:
+                        push(obj[member])
+                    else:
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic(f"No such member '{member}'", node.line, node.column)
+
+                elif op == BUILD_TOME:
+                    if arg:
+                        elements = stack[-arg:]
+                        del stack[-arg:]
+                    else:
+                        elements = []
+                    push(elements)
+
+                elif op == BUILD_GRIMOIRE:
+                    grimoire = {}
+                    if arg:
+                        items = stack[-2 * arg:]
+                        del stack[-2 * arg:]
+                        for i in range(0, len(items), 2):
+                            grimoire[items[i]] = items[i + 1]
+                    push(grimoire)
+
+                elif op == DUP:
+                    push(stack[-1])
+
+                elif op == LOAD_RESULT:
+                    push(result)
+
+                elif op == MAKE_SPELL:
+                    spell_code = consts[arg]
+                    kind = VMGenerator if spell_code.declaration.is_generator else VMSpell
+                    push(kind(spell_code, scope, self))
+
+                elif op == DEFINE_GLOBAL:
+                    self.globals.define(names[arg], pop())
+
+                elif op == DEFINE_CONST:
+                    self.globals.define(names[arg], pop(), is_const=True)
+
+                elif op == DELETE_LOCAL:
+                    node = code.node_at(pc)
+                    scope.delete_at(arg >> SLOT_BITS, arg & SLOT_MASK, node.name,
+                                    node.fallbacks, node.line, node.column)
+
+                elif op == DELETE_GLOBAL:
+                    node = code.node_at(pc)
+                    self.globals.delete(names[arg], node.line, node.column)
+
+                elif op == STORE_INDEX:
+                    value = pop()
+                    index = pop()
+                    collection = pop()
+                    if isinstance(collection, list):
+                        if not isinstance(index, int):
+                            node = code.node_at(pc)
+                            raise ForbiddenMagic("Tome index must be a rune (integer)", node.line, node.column)
+                        collection[index] = value
+                    elif isinstance(collection, dict):
+                        collection[index] = value
+                    else:
+                        node = code.node_at(pc)
+                        raise ForbiddenMagic("Cannot index into this type", node.line, node.column)
+                    push(value)
+
+                elif op == CACHE_LOCAL:
+                    target = scope
+                    depth = arg >> SLOT_BITS
+                    while depth:
+                        target = target.parent
+                        depth -= 1
+                    target.slots[arg & SLOT_MASK] = stack[-1]
+
+                elif op == CACHE_GLOBAL:
+                    global_values[names[arg]] = stack[-1]
+
+                elif op == CONST_VIOLATION:
+                    node = code.node_at(pc)
+                    raise ProphecyViolation(consts[arg], node.line, node.column)
+
+                elif op == CAST:
+                    raise SpellReturn(pop())
+
+                elif op == CHECK_HINT:
+                    interp.check_hint(stack[-1], code.node_at(pc))
+
+                elif op == YIELD:
+                    value = pop()
+                    return Suspension(value, pc, stack, scope)
+
+                elif op == CLOSE_ITER:
+                    close_iterator(pop())
+
+                elif op == TRACE_LINE:
+                    interp.hooks.line(arg)
+
+                elif op == CALL_TRACED:
+                    if arg:
+                        arguments = stack[-arg:]
+                        del stack[-arg:]
+                    else:
+                        arguments = []
+                    callee = pop()
+                    try:
+                        value = interp.traced_invoke(callee, arguments, code.node_at(pc))
+                    except (SlayerInterrupt, PatrolContinue) as escape:
+                        handler = code.loop_handlers.get(pc - 2)
+                        if handler is None:
+                            (code, pc, stack, scope, result, site, callee, key), handler = self.unwind(frames, escape)
+                            instructions = code.code
+                            consts = code.consts
+                            names = code.names
+                            push = stack.append
+                            pop = stack.pop
+                        exits, height, pc = handler[0 if isinstance(escape, SlayerInterrupt) else 1]
+                        del stack[height:]
+                        while exits:
+                            scope = scope.parent
+                            exits -= 1
+                        continue
+                    push(value)
+
+                elif op == BREAK or op == CONTINUE:
+                    # Outside any loop of this spell: end the iteration of the
+                    # loop the spell was called from
+                    escape = SlayerInterrupt() if op == BREAK else PatrolContinue()
+                    (code, pc, stack, scope, result, site, callee, key), handler = self.unwind(frames, escape)
+                    instructions = code.code
+                    consts = code.consts
+                    names = code.names
+                    push = stack.append
+                    pop = stack.pop
+                    exits, height, pc = handler[op == CONTINUE]
+                    del stack[height:]
+                    while exits:
+                        scope = scope.parent
+                        exits -= 1
+
+                else:
+                    node = code.node_at(pc)
+                    raise ForbiddenMagic(f"Unknown opcode {op}", node.line, node.column)
+        except SlayScriptError as error:
+            if frames or site is not None or code.inlined:
+                self.add_traceback(error, code, pc, site, frames)
+            raise
+
+    # ============ Helpers ============
+
+    def unwind(self, frames: list, escape: SlayScriptError):
+        """Pop saved callers up to the first whose call sits in a loop.
+
+        Returns that caller's saved state and its (exits, stack height, pc)
+        handlers; re-raises escape if no caller has one.
+        """
+        while frames:
+            record = frames.pop()
+            handler = record[0].loop_handlers.get(record[1] - 2)
+            if handler is not None:
+                return record, handler
+        raise escape
+
+    def add_traceback(self, error: SlayScriptError, code: CodeObject, pc: int, site, frames: list):
+        """Record the spell calls on frames, innermost first, in error's traceback."""
+        self.add_inlined(error, code, pc)
+        if site is not None:
+            error.add_frame(code.name, site.line, site.column)
+        for caller_code, caller_pc, _, _, _, caller_site, callee, _ in reversed(frames):
+            node = caller_code.node_at(caller_pc)
+            error.add_frame(callee.declaration.name, node.line, node.column)
+            self.add_inlined(error, caller_code, caller_pc)
+            if caller_site is not None:
+                error.add_frame(caller_code.name, caller_site.line, caller_site.column)
+
+    def add_inlined(self, error: SlayScriptError, code: CodeObject, pc: int):
+        """Record the inlined spells whose body holds the instruction preceding pc."""
+        index = (pc >> 1) - 1
+        for first, last, node in code.inlined:
+            if first <= index <= last:
+                error.add_frame(node.spell, node.line, node.column)
+
+    def index(self, collection, index, code: CodeObject, pc: int):
+        """Index into a tome, grimoire, scroll or range."""
+        if isinstance(collection, list):
+            if not isinstance(index, int):
+                node = code.node_at(pc)
+                raise ForbiddenMagic("Tome index must be a rune (integer)", node.line, node.column)
+            if index < 0 or index >= len(collection):
+                node = code.node_at(pc)
+                raise ForbiddenMagic(f"Tome index {index} out of range", node.line, node.column)
+            return collection[index]
+
+        if isinstance(collection, dict):
+            if index not in collection:
+                node = code.node_at(pc)
+                raise ForbiddenMagic(f"Key '{index}' not found in grimoire", node.line, node.column)
+            return collection[index]
+
+        if isinstance(collection, str):
+            if not isinstance(index, int):
+                node = code.node_at(pc)
+                raise ForbiddenMagic("Scroll index must be a rune (integer)", node.line, node.column)
+            if index < 0 or index >= len(collection):
+                node = code.node_at(pc)
+                raise ForbiddenMagic(f"Scroll index {index} out of range", node.line, node.column)
+            return collection[index]
+
+        if isinstance(collection, RangeStream):
+            if not isinstance(index, int):
+                node = code.node_at(pc)
+                raise ForbiddenMagic("Range index must be a rune (integer)", node.line, node.column)
+            if index < 0 or index >= len(collection):
+                node = code.node_at(pc)
+                raise ForbiddenMagic(f"Range index {index} out of range", node.line, node.column)
+            return collection[index]
+
+        node = code.node_at(pc)
+        raise ForbiddenMagic("Cannot index into this type", node.line, node.column)
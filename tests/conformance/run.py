@@ -0,0 +1,60 @@
+"""Conformance scripts: the same output on every engine, optimized or not.
+
+Each NAME.slay under this directory is run with every engine (tree,
+compiled, vm), with and without --optimize, and its output must match
+NAME.out exactly. The scoping scripts' .out files were recorded with the
+interpreter the language started from, so a mismatch there means a change
+in behaviour, not just a difference between engines. short_circuit
+records which side effects `and` and `or` skip; optimizer, types and vm
+hold scripts that -O, typed fast paths or the vm once got wrong.
+
+    python tests/conformance/run.py [SCRIPT ...]
+"""
+
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..", "..")
+
+ENGINES = ("tree", "compiled", "vm")
+
+
+def scripts(paths):
+    if paths:
+        return [os.path.abspath(path) for path in paths]
+    found = []
+    for directory, _, names in os.walk(HERE):
+        found.extend(os.path.join(directory, name) for name in names if name.endswith(".slay"))
+    return sorted(found)
+
+
+def run(script: str, engine: str, optimize: bool) -> str:
+    command = [sys.executable, "-m", "slayscript", "--no-cache", "--engine", engine]
+    if optimize:
+        command.append("-O")
+    result = subprocess.run(command + [script], cwd=ROOT, capture_output=True,
+                            text=True, encoding="utf-8")
+    return result.stdout
+
+
+def main():
+    failures = 0
+    checked = 0
+    for script in scripts(sys.argv[1:]):
+        with open(script[:-len(".slay")] + ".out", encoding="utf-8") as f:
+            expected = f.read()
+        name = os.path.relpath(script, HERE)
+        for engine in ENGINES:
+            for optimize in (False, True):
+                checked += 1
+                if run(script, engine, optimize) != expected:
+                    failures += 1
+                    print(f"FAIL {name} ({engine}{', -O' if optimize else ''})")
+    print(f"{checked - failures} of {checked} runs match")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()